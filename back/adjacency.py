@@ -0,0 +1,32 @@
+from typing import Dict, Iterable, List, Optional
+from models import Edge, GraphData
+
+
+class Adjacency:
+    """Edge-id → edge and node-id → incident edges maps, built once per graph.
+
+    Incident edges keep the graph's edge order, so neighbor lists come out in
+    the same order as a scan over ``graph_data.edges`` would produce.
+    """
+
+    def __init__(self, edges: Iterable[Edge]):
+        self.edges: Dict[str, Edge] = {}
+        self.incident: Dict[str, List[Edge]] = {}
+        for edge in edges:
+            self.edges[edge.id] = edge
+            self.incident.setdefault(edge.source, []).append(edge)
+            if edge.target != edge.source:
+                self.incident.setdefault(edge.target, []).append(edge)
+
+    @classmethod
+    def from_graph(cls, graph_data: GraphData) -> "Adjacency":
+        return cls(graph_data.edges)
+
+    def edge(self, edge_id: str) -> Optional[Edge]:
+        return self.edges.get(edge_id)
+
+    def incident_edges(self, node_id: str) -> List[Edge]:
+        return self.incident.get(node_id, [])
+
+    def degree(self, node_id: str) -> int:
+        return len(self.incident.get(node_id, ()))
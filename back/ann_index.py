@@ -0,0 +1,442 @@
+import os
+import threading
+import numpy as np
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from vector_store import QuantizedVectors, EMBEDDING_STORE_DTYPE, EMBEDDING_RERANK_FACTOR, SCORE_CHUNK_ROWS
+
+# --- Configuration ---
+# Below this many vectors a query is an exact scan; above it the IVF lists are used.
+ANN_EXACT_THRESHOLD = int(os.getenv("ANN_EXACT_THRESHOLD", "20000"))
+# Number of inverted lists probed per query: the recall/latency knob.
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+# The index is re-clustered once it has grown this much since the last training.
+RETRAIN_GROWTH = 2.0
+# ... or once more than this fraction of its rows are tombstones (replaced or removed vectors).
+RETRAIN_TOMBSTONES = 0.5
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50000
+
+
+class IVFIndex:
+    """Incrementally updatable inverted-file index over entity embeddings.
+
+    Vectors are assigned to the closest of ``nlist`` spherical k-means
+    centroids; a query scores the centroids, then only the vectors in the
+    ``nprobe`` best lists. Raising ``nprobe`` trades latency for recall.
+    Until the index holds ``exact_threshold`` vectors it is not clustered and
+    every query is an exact scan.
+
+    Removed and replaced rows are tombstoned and reclaimed on the next
+    re-clustering, which also runs once they make up half of the rows.
+    Scores are dot products, so results match EmbeddingMatrix.top_k.
+
+    Vectors are stored as ``dtype`` (see QuantizedVectors) and scored in that
+    form. With a lossy dtype and a ``full_precision`` source (entity id to its
+    float32 vector, e.g. from the disk embedding cache), the best
+    ``k * rerank_factor`` candidates are re-scored exactly before the top k
+    are returned.
+
+    With ``auto_train=False``, ``add`` never re-clusters; the owner checks
+    ``needs_training`` and trains a ``training_copy`` without holding up
+    readers and writers, then ``catch_up`` brings the copy up to date.
+    """
+
+    def __init__(self, nprobe: int = ANN_NPROBE, exact_threshold: int = ANN_EXACT_THRESHOLD, seed: int = 0,
+                 dtype: str = EMBEDDING_STORE_DTYPE, rerank_factor: int = EMBEDDING_RERANK_FACTOR,
+                 full_precision: Optional[Callable[[str], Optional[Sequence[float]]]] = None, auto_train: bool = True):
+        self.nprobe = nprobe
+        self.exact_threshold = exact_threshold
+        self.dtype = dtype
+        self.rerank_factor = rerank_factor
+        self.full_precision = full_precision
+        self.auto_train = auto_train
+        self._rng = np.random.default_rng(seed)
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[QuantizedVectors] = None
+        self._active = np.zeros(0, dtype=bool)
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._rows
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the stored vectors."""
+        return self._vectors.nbytes if self._vectors is not None else 0
+
+    def add(self, entity_id: str, vector: Sequence[float]):
+        """Insert or replace the vector stored for entity_id."""
+        vector = np.asarray(vector, dtype=np.float32)
+        self.remove(entity_id)
+        row = len(self._ids)
+        if self._vectors is None:
+            self._vectors = QuantizedVectors(vector.shape[0], self.dtype)
+            self._active = np.zeros(self._vectors.capacity, dtype=bool)
+        elif row == self._vectors.capacity:
+            self._vectors.grow()
+            self._active = np.concatenate([self._active, np.zeros_like(self._active)])
+        self._vectors.set(row, vector)
+        self._active[row] = True
+        self._ids.append(entity_id)
+        self._rows[entity_id] = row
+
+        if self.trained:
+            self._lists[int(np.argmax(self._centroids @ vector))].append(row)
+        if self.auto_train and self.needs_training:
+            self.train()
+
+    def remove(self, entity_id: str):
+        row = self._rows.pop(entity_id, None)
+        if row is not None:
+            self._active[row] = False
+            self._ids[row] = None
+
+    @property
+    def needs_training(self) -> bool:
+        """Whether the index has grown (or filled with tombstones) enough to be compacted and re-clustered."""
+        if len(self._ids) - len(self) > len(self._ids) * RETRAIN_TOMBSTONES:
+            return True
+        if self.trained:
+            return len(self) >= self._trained_size * RETRAIN_GROWTH
+        return len(self) >= self.exact_threshold
+
+    def training_copy(self) -> "IVFIndex":
+        """An index holding the rows stored so far, to train() while this one keeps changing.
+
+        Cheap: the vector storage is shared, which is safe as rows are only
+        ever appended to it, never rewritten.
+        """
+        copy = IVFIndex(self.nprobe, self.exact_threshold, dtype=self.dtype, rerank_factor=self.rerank_factor,
+                        full_precision=self.full_precision, auto_train=self.auto_train)
+        copy._rng = self._rng
+        copy._ids = list(self._ids)
+        copy._rows = dict(self._rows)
+        copy._vectors = self._vectors
+        copy._active = self._active[:len(self._ids)].copy()
+        return copy
+
+    def catch_up(self, source: "IVFIndex", rows: int):
+        """Replay what changed in source since a training_copy of its first rows was taken."""
+        for entity_id in [entity_id for entity_id in self._rows if source._rows.get(entity_id, rows) >= rows]:
+            self.remove(entity_id)
+        added = [row for row in range(rows, len(source._ids)) if source._active[row]]
+        if added:
+            vectors = source._vectors.dequantize(np.array(added))
+            for row, vector in zip(added, vectors):
+                self.add(source._ids[row], vector)
+
+    def train(self):
+        """Compact the storage and re-cluster all live vectors into inverted lists."""
+        live = np.flatnonzero(self._active[:len(self._ids)])
+        self._ids = [self._ids[row] for row in live]
+        self._rows = {entity_id: row for row, entity_id in enumerate(self._ids)}
+        self._vectors = self._vectors.take(live) if len(live) else None
+        self._active = np.ones(len(live), dtype=bool)
+        if len(live) < self.exact_threshold:
+            self._centroids = None
+            self._lists = []
+            return
+
+        nlist = max(1, int(4 * np.sqrt(len(live))))
+        if len(live) > KMEANS_SAMPLE:
+            sample = self._vectors.dequantize(self._rng.choice(len(live), KMEANS_SAMPLE, replace=False))
+        else:
+            sample = self._vectors.dequantize()
+        centroids = sample[self._rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for list_id in range(nlist):
+                members = sample[assignment == list_id]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[list_id] = centroid / norm if norm else centroid
+
+        # Assigned a chunk at a time, so quantized vectors are never all expanded at once
+        assignment = np.concatenate([
+            np.argmax(self._vectors.dequantize(np.arange(start, min(start + SCORE_CHUNK_ROWS, len(live)))) @ centroids.T, axis=1)
+            for start in range(0, len(live), SCORE_CHUNK_ROWS)
+        ])
+        self._centroids = centroids
+        self._lists = [[] for _ in range(nlist)]
+        for row, list_id in enumerate(assignment):
+            self._lists[list_id].append(row)
+        self._trained_size = len(live)
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        if not self.trained:
+            return np.flatnonzero(self._active[:len(self._ids)])
+        nprobe = min(self.nprobe, len(self._lists))
+        probed = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.fromiter((row for list_id in probed for row in self._lists[list_id]), dtype=np.int64)
+        return rows[self._active[rows]]
+
+    def top_k(self, query: Sequence[float], k: int, min_threshold: float) -> List[Tuple[str, float]]:
+        """Return up to k (id, score) pairs above min_threshold, best first."""
+        if len(self) == 0 or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        rows = self._candidates(query)
+        if len(rows) == 0:
+            return []
+        return self._rank(rows, query, k, min_threshold)
+
+    def top_k_among(self, query: Sequence[float], ids: Iterable[str], k: int, min_threshold: float) -> List[Tuple[str, float]]:
+        """Exact top_k over just the given ids (e.g. the edges around a node), bypassing the lists."""
+        rows = np.sort(np.fromiter((self._rows[entity_id] for entity_id in ids if entity_id in self._rows), dtype=np.int64))
+        if len(rows) == 0 or k <= 0:
+            return []
+        return self._rank(rows, np.asarray(query, dtype=np.float32), k, min_threshold)
+
+    def _rank(self, rows: np.ndarray, query: np.ndarray, k: int, min_threshold: float) -> List[Tuple[str, float]]:
+        scores = self._vectors.scores(rows, query)
+        if self._vectors.lossy and self.rerank_factor > 0 and self.full_precision is not None:
+            rows, scores = self._rerank(rows, scores, query, k)
+        if k < len(scores):
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.lexsort((rows[best], -scores[best]))]
+        return [(self._ids[rows[i]], float(scores[i])) for i in best if scores[i] > min_threshold]
+
+    def _rerank(self, rows: np.ndarray, scores: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-score the best k * rerank_factor quantized candidates with full-precision vectors."""
+        keep = min(len(rows), k * self.rerank_factor)
+        if keep < len(rows):
+            best = np.argpartition(-scores, keep - 1)[:keep]
+            rows, scores = rows[best], scores[best]
+        for i, row in enumerate(rows):
+            # Candidates without a full-precision vector keep their quantized score
+            vector = self.full_precision(self._ids[row])
+            if vector is not None:
+                scores[i] = np.dot(np.asarray(vector, dtype=np.float32), query)
+        return rows, scores
+
+    def best_match(self, query: Sequence[float], min_threshold: float) -> Tuple[Optional[str], float]:
+        matches = self.top_k(query, 1, min_threshold)
+        return matches[0] if matches else (None, 0)
+
+
+class LockedScorer:
+    """EntityScorer view of an IVFIndex that reads it under the owner's lock.
+
+    ``index`` is called under the lock before every read and returns the
+    index to read, so a view outlives the owner applying queued changes or
+    swapping in a retrained index.
+    """
+
+    def __init__(self, index: Callable[[], IVFIndex], lock: threading.Lock):
+        self._index = index
+        self._lock = lock
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._index())
+
+    def top_k(self, query: Sequence[float], k: int, min_threshold: float) -> List[Tuple[str, float]]:
+        with self._lock:
+            return self._index().top_k(query, k, min_threshold)
+
+    def top_k_among(self, query: Sequence[float], ids: Iterable[str], k: int, min_threshold: float) -> List[Tuple[str, float]]:
+        with self._lock:
+            return self._index().top_k_among(query, ids, k, min_threshold)
+
+    def best_match(self, query: Sequence[float], min_threshold: float) -> Tuple[Optional[str], float]:
+        with self._lock:
+            return self._index().best_match(query, min_threshold)
+
+
+# (kind, entity id, text) of a queued embedding
+PendingItem = Tuple[str, str, str]
+
+
+class GraphSearchIndex:
+    """Node, edge and definition IVF indexes for the server graph, kept in step with its mutations.
+
+    Mutations only record the text each entity should be embedded as; the
+    embeddings for new or changed texts are fetched outside the lock (by the
+    background IndexWorker, or a search via ``apply_pending``) and inserted
+    with ``insert``. ``definitions`` holds the allValues definitions that
+    /search ranks. ``on_pending`` is called whenever new work is queued.
+
+    The mutation methods (``set_*``, ``remove_*``, ``reset``) are called on
+    the event loop, so they never wait for the lock: they append to a queue
+    that is applied under the lock by the next insert, query or read of the
+    queue. ``pending_count`` and ``progress`` are lock-free approximations.
+    An index that needs re-clustering is trained on a copy in the inserting
+    thread and swapped in afterwards, so queries and inserts carry on meanwhile.
+    """
+
+    KINDS = ("node", "edge", "definition")
+
+    def __init__(self, full_precision: Optional[Callable[[str], Optional[Sequence[float]]]] = None, **index_options):
+        """full_precision maps an embedded text to its float32 vector, for re-ranking quantized indexes."""
+        self._full_precision = full_precision
+        self._index_options = {**index_options, "auto_train": False}
+        self._lock = threading.Lock()
+        self._training = threading.Lock()
+        # (kind, entity id, text or None) and ("reset", None, texts by kind), oldest first
+        self._changes: deque = deque()
+        self.on_pending: Optional[Callable[[], None]] = None
+        self._reset({})
+
+    @property
+    def nodes(self) -> IVFIndex:
+        return self._indexes["node"]
+
+    @property
+    def edges(self) -> IVFIndex:
+        return self._indexes["edge"]
+
+    @property
+    def definitions(self) -> IVFIndex:
+        return self._indexes["definition"]
+
+    def reset(self, node_texts: Optional[Dict[str, str]] = None, edge_texts: Optional[Dict[str, str]] = None,
+              definition_texts: Optional[Dict[str, str]] = None):
+        """Drop everything and queue the given texts for indexing."""
+        self._changes.append(("reset", None, {"node": node_texts, "edge": edge_texts, "definition": definition_texts}))
+        self._notify()
+
+    def _reset(self, texts: Dict[str, Optional[Dict[str, str]]]):
+        self._indexes = {kind: IVFIndex(full_precision=self._lookup(kind) if self._full_precision else None, **self._index_options)
+                         for kind in self.KINDS}
+        self._texts = {kind: {} for kind in self.KINDS}
+        self._pending = {kind: dict(texts.get(kind) or {}) for kind in self.KINDS}
+
+    def set_node(self, node_id: str, text: Optional[str]):
+        self._set("node", node_id, text)
+
+    def set_edge(self, edge_id: str, text: Optional[str]):
+        self._set("edge", edge_id, text)
+
+    def set_definition(self, entity_id: str, text: Optional[str]):
+        self._set("definition", entity_id, text)
+
+    def remove_node(self, node_id: str):
+        self._set("node", node_id, None)
+
+    def remove_edge(self, edge_id: str):
+        self._set("edge", edge_id, None)
+
+    def remove_definition(self, entity_id: str):
+        self._set("definition", entity_id, None)
+
+    def _set(self, kind: str, entity_id: str, text: Optional[str]):
+        self._changes.append((kind, entity_id, text))
+        self._notify()
+
+    def _apply_changes(self):
+        """Apply the queued mutations; called with self._lock held."""
+        while self._changes:
+            kind, entity_id, text = self._changes.popleft()
+            if kind == "reset":
+                self._reset(text)
+            elif text is None:
+                self._pending[kind].pop(entity_id, None)
+                self._texts[kind].pop(entity_id, None)
+                self._indexes[kind].remove(entity_id)
+            elif self._texts[kind].get(entity_id) == text:
+                self._pending[kind].pop(entity_id, None)
+            else:
+                self._pending[kind][entity_id] = text
+
+    def _lookup(self, kind: str) -> Callable[[str], Optional[Sequence[float]]]:
+        # Called from IVFIndex queries, i.e. with self._lock held
+        def full_precision(entity_id: str) -> Optional[Sequence[float]]:
+            text = self._texts[kind].get(entity_id)
+            return self._full_precision(text) if text is not None else None
+        return full_precision
+
+    def _notify(self):
+        if self.on_pending is not None:
+            self.on_pending()
+
+    def scorer(self, kind: str) -> LockedScorer:
+        """Thread-safe scorer over one of the indexes, for use while indexing continues."""
+        def current() -> IVFIndex:
+            self._apply_changes()
+            return self._indexes[kind]
+        return LockedScorer(current, self._lock)
+
+    def pending_count(self) -> int:
+        """Texts waiting to be embedded, counting queued mutations as one each."""
+        return sum(len(pending) for pending in self._pending.values()) + len(self._changes)
+
+    def pending_texts(self) -> List[str]:
+        with self._lock:
+            self._apply_changes()
+            return [text for kind in self.KINDS for text in self._pending[kind].values()]
+
+    def progress(self) -> Dict[str, int]:
+        indexes = self._indexes
+        progress = {f"indexed_{kind}s": len(indexes[kind]) for kind in self.KINDS}
+        progress["pending"] = self.pending_count()
+        return progress
+
+    def vector_bytes(self) -> Dict[str, int]:
+        """Memory held by each index's vectors."""
+        indexes = self._indexes
+        return {kind: indexes[kind].nbytes for kind in self.KINDS}
+
+    def take_pending(self, limit: Optional[int] = None) -> List[PendingItem]:
+        """Up to limit queued items; they stay queued until inserted."""
+        items = []
+        with self._lock:
+            self._apply_changes()
+            for kind in self.KINDS:
+                for entity_id, text in self._pending[kind].items():
+                    if limit is not None and len(items) >= limit:
+                        return items
+                    items.append((kind, entity_id, text))
+        return items
+
+    def insert(self, items: List[PendingItem], embeddings: List[Sequence[float]]):
+        """Add embedded items, skipping any that were changed or removed meanwhile, then retrain indexes that need it."""
+        with self._lock:
+            self._apply_changes()
+            for (kind, entity_id, text), embedding in zip(items, embeddings):
+                if self._pending[kind].get(entity_id) != text:
+                    continue
+                self._indexes[kind].add(entity_id, embedding)
+                self._texts[kind][entity_id] = text
+                del self._pending[kind][entity_id]
+            stale = [kind for kind in self.KINDS if self._indexes[kind].needs_training]
+        for kind in stale:
+            self._retrain(kind)
+
+    def _retrain(self, kind: str):
+        """Train a copy of the index without the lock, then swap it in up to date."""
+        if not self._training.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                index = self._indexes[kind]
+                if not index.needs_training:
+                    return
+                trained, rows = index.training_copy(), len(index._ids)
+            trained.train()
+            with self._lock:
+                # A reset meanwhile replaced the index; the copy is of a graph that is gone
+                if self._indexes[kind] is index:
+                    trained.catch_up(index, rows)
+                    self._indexes[kind] = trained
+        finally:
+            self._training.release()
+
+    def apply_pending(self, embed_many: Callable[[List[str]], List[List[float]]]):
+        """Embed every queued text and insert the vectors into the indexes."""
+        items = self.take_pending()
+        if items:
+            self.insert(items, embed_many([text for _, _, text in items]))
@@ -0,0 +1 @@
+"""Reproducible performance benchmarks for the backend; see benchmarks/run.py."""
@@ -0,0 +1,46 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_STAT = "median_s"
+
+
+def load_results(path: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    with open(path, "rb") as f:
+        report = json.load(f)
+    return {(result["name"], result["size"]): result for result in report["results"]}
+
+
+def compare(baseline: Dict[Tuple[str, str], Dict[str, Any]], current: Dict[Tuple[str, str], Dict[str, Any]],
+            stat: str = DEFAULT_STAT, threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """One row per benchmark present in both runs; ``regression`` marks slowdowns beyond threshold."""
+    rows = []
+    for key in baseline:
+        if key not in current:
+            continue
+        before, after = baseline[key][stat], current[key][stat]
+        ratio = after / before if before > 0 else float("inf") if after > 0 else 1.0
+        rows.append({"name": key[0], "size": key[1], "baseline": before, "current": after,
+                     "ratio": ratio, "regression": ratio > 1 + threshold})
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files; exits 1 on a regression.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--stat", default=DEFAULT_STAT, help="statistic to compare, e.g. median_s, p95_s or min_s")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    rows = compare(load_results(args.baseline), load_results(args.current), args.stat, args.threshold)
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['size']:>6} {row['name']:<28} {row['baseline'] * 1000:10.3f} ms -> {row['current'] * 1000:10.3f} ms  x{row['ratio']:.2f}{flag}")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
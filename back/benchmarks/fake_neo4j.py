@@ -0,0 +1,90 @@
+import asyncio
+import random
+from typing import Any, Dict, List
+
+from connectors import neo4j as connector
+
+
+class FakeResult:
+    """Async record stream that pays ``latency`` once per ``fetch_size`` records, like a Bolt PULL."""
+
+    def __init__(self, records: List[Dict[str, Any]], fetch_size: int, latency: float):
+        self._records = records
+        self._fetch_size = max(1, fetch_size)
+        self._latency = latency
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for index, record in enumerate(self._records):
+            if index % self._fetch_size == 0:
+                await asyncio.sleep(self._latency)
+            yield record
+
+    async def single(self):
+        return self._records[0] if self._records else None
+
+
+class FakeSession:
+    def __init__(self, driver: "FakeNeo4jDriver", fetch_size: int):
+        self.driver = driver
+        self.fetch_size = fetch_size
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, **parameters):
+        return FakeResult(self.driver.records(query), self.fetch_size, self.driver.latency)
+
+
+class FakeNeo4jDriver:
+    """Serves a generated graph as the records of the connector's projected queries.
+
+    Install it with ``connector._driver = FakeNeo4jDriver(graph)``; ``mutate``
+    changes a fraction of the entities so incremental syncs have a delta to find.
+    """
+
+    def __init__(self, graph: Dict[str, Any], latency: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self._rng = random.Random(seed)
+        self._revision = 0
+        self.nodes = [{"element_id": f"4:bench:{i}", "node_id": node["id"], "name": node["label"], "labels": ["Entity"],
+                       "properties": dict(graph["allValues"].get(node["id"], {}))}
+                      for i, node in enumerate(graph["nodes"])]
+        self.relationships = [{"element_id": edge["id"], "type": edge["label"], "source": edge["source"], "target": edge["target"],
+                               "properties": dict(graph["allValues"].get(edge["id"], {}))}
+                              for edge in graph["edges"]]
+
+    def session(self, fetch_size: int = connector.NEO4J_SYNC_CHUNK_SIZE):
+        return FakeSession(self, fetch_size)
+
+    async def verify_connectivity(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def records(self, query: str) -> List[Dict[str, Any]]:
+        if query == connector.NODES_QUERY:
+            return self.nodes
+        if query == connector.RELATIONSHIPS_QUERY:
+            return self.relationships
+        if query == connector.NODE_IDS_QUERY:
+            return [{"id": record["node_id"]} for record in self.nodes]
+        if query == connector.RELATIONSHIP_IDS_QUERY:
+            return [{"id": record["element_id"]} for record in self.relationships]
+        raise ValueError(f"Fake Neo4j driver does not serve query: {query}")
+
+    def mutate(self, fraction: float) -> int:
+        """Change the properties of a fraction of nodes and relationships; returns how many."""
+        self._revision += 1
+        changed = 0
+        for records in (self.nodes, self.relationships):
+            for record in self._rng.sample(records, int(len(records) * fraction)):
+                record["properties"] = {**record["properties"], "revision": self._revision}
+                changed += 1
+        return changed
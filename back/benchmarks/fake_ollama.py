@@ -0,0 +1,119 @@
+import argparse
+import hashlib
+import json
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import numpy as np
+
+
+@lru_cache(maxsize=65536)
+def _word_vector(word: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha1(word.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dim)
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Deterministic unit vector for text: the normalized sum of its word vectors.
+
+    Texts sharing words get similar vectors, so matching results are as stable
+    and meaningful as with a real model, without its cost.
+    """
+    vector = np.zeros(dim)
+    for word in text.lower().split():
+        vector += _word_vector(word, dim)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0], norm = 1.0, 1.0
+    return (vector / norm).tolist()
+
+
+class FakeOllamaServer:
+    """Local stand-in for Ollama's ``/api/embed``, served from a background thread.
+
+    Every request sleeps ``latency`` seconds plus ``latency_per_text`` per input,
+    modelling the round trip and the model's throughput.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, dim: int = 64,
+                 latency: float = 0.0, latency_per_text: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.requests = 0
+        self.texts = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != "/api/embed":
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                texts = body.get("input", [])
+                if isinstance(texts, str):
+                    texts = [texts]
+                server.requests += 1
+                server.texts += len(texts)
+                delay = server.latency + server.latency_per_text * len(texts)
+                if delay > 0:
+                    time.sleep(delay)
+                payload = json.dumps({"model": body.get("model"), "embeddings": [fake_embedding(text, server.dim) for text in texts]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve deterministic fake embeddings on /api/embed.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--latency-per-text", type=float, default=0.0, help="seconds added per embedded text")
+    args = parser.parse_args()
+    server = FakeOllamaServer(args.host, args.port, args.dim, args.latency, args.latency_per_text)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
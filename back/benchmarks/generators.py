@@ -0,0 +1,55 @@
+import random
+from typing import Any, Dict, List, Tuple
+
+# Named sizes are total elements (nodes + edges)
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+EDGES_PER_NODE = 1.5
+DEFINITION_RATIO = 0.5
+WORDS = ("graph", "node", "edge", "entity", "relation", "process", "system", "value", "rule", "state",
+         "object", "class", "event", "user", "order", "item", "account", "policy", "service", "record")
+EDGE_TYPES = ("RELATES_TO", "PART_OF", "DEPENDS_ON", "OWNS", "CALLS")
+
+
+def parse_size(size: str) -> int:
+    return SIZES[size] if size in SIZES else int(size)
+
+
+def _definition(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 10)))
+
+
+def generate_graph(elements: int, seed: int = 0) -> Dict[str, Any]:
+    """A random graph of about ``elements`` nodes plus edges in the GraphData wire format.
+
+    Edge endpoints follow a skewed distribution so a few hubs have high degree;
+    about half of the nodes and edges carry a definition.
+    """
+    rng = random.Random(seed)
+    node_count = max(2, int(elements / (1 + EDGES_PER_NODE)))
+    edge_count = max(1, elements - node_count)
+    nodes = [{"id": f"n{i}", "label": f"Node {i}"} for i in range(node_count)]
+    edges = []
+    for i in range(edge_count):
+        source = int(node_count * rng.random() ** 2)
+        target = rng.randrange(node_count)
+        edges.append({"source": f"n{source}", "target": f"n{target}", "label": rng.choice(EDGE_TYPES), "id": f"e{i}"})
+    all_values = {}
+    for entity in nodes + edges:
+        if rng.random() < DEFINITION_RATIO:
+            all_values[entity["id"]] = {"definition": _definition(rng)}
+    return {"nodes": nodes, "edges": edges, "allValues": all_values}
+
+
+def generate_query(graph: Dict[str, Any], objects: int = 5, relations: int = 3, seed: int = 1) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Query objects and relations whose definitions resemble entities of graph."""
+    rng = random.Random(seed)
+    defined_nodes = [node for node in graph["nodes"] if node["id"] in graph["allValues"]] or graph["nodes"]
+    query_objects = []
+    for node in rng.sample(defined_nodes, min(objects, len(defined_nodes))):
+        definition = graph["allValues"].get(node["id"], {}).get("definition", "")
+        query_objects.append({"name": node["id"], "type": "object", "attributes": {}, "definition": definition, "context": ""})
+    query_relations = []
+    for edge in rng.sample(graph["edges"], min(relations, len(graph["edges"]))):
+        definition = graph["allValues"].get(edge["id"], {}).get("definition", "")
+        query_relations.append({"type": edge["label"], "source": edge["source"], "target": edge["target"], "definition": definition, "context": ""})
+    return query_objects, query_relations
@@ -0,0 +1,273 @@
+import argparse
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.generators import generate_graph, generate_query, parse_size
+
+DEFAULT_SIZES = "1k,10k"
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "n": len(ordered),
+        "min_s": ordered[0],
+        "median_s": statistics.median(ordered),
+        "mean_s": statistics.fmean(ordered),
+        "p95_s": p95,
+        "max_s": ordered[-1],
+        "stdev_s": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+class Recorder:
+    """Collects timings as one result per (benchmark, graph size)."""
+
+    def __init__(self, verbose: bool = True):
+        self.results: List[Dict[str, Any]] = []
+        self.verbose = verbose
+
+    def add(self, name: str, size: str, samples: List[float], **extra):
+        result = {"name": name, "size": size, **summarize(samples), **extra}
+        self.results.append(result)
+        if self.verbose:
+            print(f"{size:>6} {name:<28} median {result['median_s'] * 1000:10.3f} ms   p95 {result['p95_s'] * 1000:10.3f} ms   n={result['n']}", flush=True)
+
+    def time(self, name: str, size: str, fn: Callable[[], Any], repeat: int, warmup: int = 0,
+             between: Optional[Callable[[], Any]] = None, **extra):
+        """Time fn repeat times after warmup untimed calls; between runs untimed after each call."""
+        for _ in range(warmup):
+            fn()
+            if between is not None:
+                between()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+            if between is not None:
+                between()
+        self.add(name, size, samples, **extra)
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args):
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def expect(response, status: int):
+    if response.status_code != status:
+        raise RuntimeError(f"{response.request.method} {response.request.url} returned {response.status_code}: {response.text[:200]}")
+    return response
+
+
+def run_size(app, client, connector, label: str, args, recorder: Recorder):
+    from json_codec import dumps
+    from graph_matching import get_neighbors
+    from benchmarks.fake_neo4j import FakeNeo4jDriver
+
+    graph = generate_graph(parse_size(label), seed=args.seed)
+    body = dumps(graph)
+
+    def wait_for_index():
+        deadline = time.perf_counter() + args.index_timeout
+        while not (app.index_worker.complete and app.index_worker.state == "idle"):
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"Search index not complete after {args.index_timeout}s: {app.index_worker.status()}")
+            time.sleep(0.002)
+
+    def load():
+        expect(client.post("/load-graph", content=body, headers={"Content-Type": "application/json"}), 200)
+
+    # Loading and indexing: the first build misses the embedding cache, later ones hit it
+    recorder.time("index_build_cold", label, lambda: (load(), wait_for_index()), repeat=1)
+    recorder.time("load_graph", label, load, repeat=args.repeat, between=wait_for_index)
+    recorder.time("index_build_warm", label, lambda: (load(), wait_for_index()), repeat=args.repeat)
+    recorder.time("get_graph", label, lambda: expect(client.get("/graph"), 200), repeat=args.repeat, warmup=1)
+
+    # Matching against the server graph, and against a graph sent with the request
+    objects, relations = generate_query(graph, args.query_objects, args.query_relations, seed=args.seed + 1)
+    query = {"objects": objects, "relations": relations}
+    recorder.time("search", label, lambda: expect(client.post("/search", json={"query": objects[0]["definition"]}), 200),
+                  repeat=args.repeat, warmup=1)
+    recorder.time("search_all", label, lambda: expect(client.post("/searchAll", json={"query": query}), 200),
+                  repeat=args.repeat, warmup=1)
+    recorder.time("search_all_top_k", label, lambda: expect(client.post("/searchAll", json={"query": query, "top_k": 5}), 200),
+                  repeat=args.repeat, warmup=1)
+    if parse_size(label) <= parse_size(args.inline_max):
+        recorder.time("search_all_inline_graph", label,
+                      lambda: expect(client.post("/searchAll", json={"graph_data": graph, "query": query}), 200),
+                      repeat=args.repeat, warmup=1)
+
+    # Neighbor lookups on the cached view of the server graph, reported per lookup
+    view = client.portal.call(app.server_graph_view, None)
+    edge_ids = set(app.graph_store.edges)
+    rng = random.Random(args.seed)
+    sample = rng.sample(graph["nodes"], min(1000, len(graph["nodes"]))) + rng.sample(graph["edges"], min(1000, len(graph["edges"])))
+    sample_ids = [entity["id"] for entity in sample]
+    samples = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for entity_id in sample_ids:
+            get_neighbors(entity_id, view.graph, set(), view.node_ids, edge_ids, adjacency=view.adjacency)
+        samples.append((time.perf_counter() - start) / len(sample_ids))
+    recorder.add("get_neighbors", label, samples)
+
+    # Single-entity CRUD endpoints, each followed by its graph_patch broadcast
+    def crud_timings():
+        timings = {name: [] for name in ("create_node", "update_node", "create_edge", "update_edge", "delete_edge", "delete_node")}
+        anchor = graph["nodes"][0]["id"]
+        for i in range(args.repeat):
+            node = {"id": f"bench-node-{i}", "label": "bench node"}
+            edge = {"id": f"bench-edge-{i}", "source": node["id"], "target": anchor, "label": "BENCH"}
+            steps = [
+                ("create_node", lambda: expect(client.post("/nodes", json=node), 201)),
+                ("update_node", lambda: expect(client.put(f"/nodes/{node['id']}", json={**node, "label": "renamed"}), 200)),
+                ("create_edge", lambda: expect(client.post("/edges", json=edge), 201)),
+                ("update_edge", lambda: expect(client.put(f"/edges/{edge['id']}", json={**edge, "label": "RENAMED"}), 200)),
+                ("delete_edge", lambda: expect(client.delete(f"/edges/{edge['id']}"), 204)),
+                ("delete_node", lambda: expect(client.delete(f"/nodes/{node['id']}"), 204)),
+            ]
+            for name, step in steps:
+                start = time.perf_counter()
+                step()
+                timings[name].append(time.perf_counter() - start)
+        return timings
+
+    for name, samples in crud_timings().items():
+        recorder.add(name, label, samples)
+
+    def batch():
+        operations = [{"op": "create", "entity": "node", "node": {"id": f"bench-batch-{i}", "label": "batch node"}}
+                      for i in range(args.batch_size)]
+        operations += [{"op": "delete", "entity": "node", "id": f"bench-batch-{i}"} for i in range(args.batch_size)]
+        expect(client.post("/batch", json={"operations": operations}), 200)
+
+    recorder.time("batch", label, batch, repeat=args.repeat, operations=2 * args.batch_size)
+    wait_for_index()
+
+    # Snapshot fan-out to idle SSE subscribers; the first encode per version is the cold one
+    subscribers = [client.portal.call(_subscribe, app) for _ in range(args.subscribers)]
+    recorder.time("graph_snapshot_encode", label, app.graph_snapshot, repeat=args.repeat)
+    recorder.time("broadcast_graph_update", label, lambda: client.portal.call(app.broadcast_graph_update),
+                  repeat=args.repeat, warmup=1, subscribers=args.subscribers)
+    for subscriber in subscribers:
+        client.portal.call(_unsubscribe, app, subscriber)
+
+    # Neo4j sync against a fake driver serving the same graph
+    driver = FakeNeo4jDriver(graph, latency=args.neo4j_latency, seed=args.seed)
+    connector._driver = driver
+    recorder.time("sync_neo4j_full", label, lambda: expect(client.post("/sync-neo4j"), 200),
+                  repeat=args.repeat, between=wait_for_index)
+    samples = []
+    for _ in range(args.repeat):
+        driver.mutate(args.change_fraction)
+        start = time.perf_counter()
+        expect(client.post("/sync-neo4j", params={"incremental": "true"}), 200)
+        samples.append(time.perf_counter() - start)
+        wait_for_index()
+    recorder.add("sync_neo4j_incremental", label, samples, change_fraction=args.change_fraction)
+
+
+async def _subscribe(app):
+    return app.sse_broadcaster.subscribe()
+
+
+async def _unsubscribe(app, subscriber):
+    app.sse_broadcaster.unsubscribe(subscriber)
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark matching, mutations, broadcasts and Neo4j sync on synthetic graphs.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated graph sizes in elements: 1k, 10k, 100k, 1M or a number")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=64, help="dimension of the fake embeddings")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds the fake Ollama adds per request")
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.0, help="seconds the fake Ollama adds per text")
+    parser.add_argument("--neo4j-latency", type=float, default=0.0, help="seconds the fake Neo4j adds per fetched chunk")
+    parser.add_argument("--query-objects", type=int, default=5)
+    parser.add_argument("--query-relations", type=int, default=3)
+    parser.add_argument("--inline-max", default="10k", help="largest size also searched with the graph sent inline")
+    parser.add_argument("--batch-size", type=int, default=100, help="nodes created and deleted per /batch request")
+    parser.add_argument("--subscribers", type=int, default=100, help="SSE subscribers for the broadcast benchmark")
+    parser.add_argument("--change-fraction", type=float, default=0.01, help="share of entities changed before each incremental sync")
+    parser.add_argument("--index-timeout", type=float, default=600.0)
+    parser.add_argument("--quiet", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    for size in sizes:
+        parse_size(size)
+
+    with FakeOllamaServer(dim=args.dim, latency=args.embed_latency, latency_per_text=args.embed_latency_per_text) as ollama, \
+            tempfile.TemporaryDirectory(prefix="bench-embeddings-") as cache_dir:
+        # The backend reads its configuration at import time
+        os.environ["OLLAMA_URL"] = ollama.url
+        os.environ["EMBEDDING_CACHE_DIR"] = cache_dir
+        os.environ["NEO4J_SYNC_INTERVAL"] = "0"
+        from fastapi.testclient import TestClient
+        from connectors import neo4j as connector
+        import main as app
+
+        # Startup would otherwise try to reach a real Neo4j server
+        connector._driver = _IdleDriver()
+        recorder = Recorder(verbose=not args.quiet)
+        started = datetime.now(timezone.utc)
+        with TestClient(app.app) as client:
+            for size in sizes:
+                run_size(app, client, connector, size, args, recorder)
+        connector._driver = None
+
+        report = {
+            "meta": {
+                **git_revision(),
+                "started_at": started.isoformat(),
+                "duration_s": (datetime.now(timezone.utc) - started).total_seconds(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "config": {**vars(args), "sizes": sizes},
+                "embedding_requests": ollama.requests,
+                "embedded_texts": ollama.texts,
+            },
+            "results": recorder.results,
+        }
+
+    if args.output:
+        from json_codec import dumps
+        with open(args.output, "wb") as f:
+            f.write(dumps(report))
+        if not args.quiet:
+            print(f"Wrote {len(recorder.results)} results to {args.output}")
+    return report
+
+
+class _IdleDriver:
+    async def verify_connectivity(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+if __name__ == "__main__":
+    main()
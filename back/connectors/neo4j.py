@@ -1,7 +1,14 @@
 import os
+import json
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
 from neo4j import AsyncGraphDatabase
 from dotenv import load_dotenv
 
+from metrics import REGISTRY
+
 # --- Configuration ---
 # Load .env file for credentials
 load_dotenv()
@@ -15,19 +22,63 @@ NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password_not_set")
 NEO4J_ID_PROPERTY = os.getenv("NEO4J_ID_PROPERTY", "uuid")
 NEO4J_LABEL_PROPERTY = os.getenv("NEO4J_LABEL_PROPERTY", "name")
 
+# Records pulled from the server per round trip, and per chunk handed to the caller
+NEO4J_SYNC_CHUNK_SIZE = int(os.getenv("NEO4J_SYNC_CHUNK_SIZE", "5000"))
+
+# Optional last-modified property (e.g. updatedAt) maintained on every node and
+# relationship. When set, incremental syncs only read entities changed since the
+# previous sync; otherwise they compare content hashes of a full scan.
+NEO4J_UPDATED_AT_PROPERTY = os.getenv("NEO4J_UPDATED_AT_PROPERTY", "")
+# Seconds between automatic incremental syncs; 0 disables them.
+NEO4J_SYNC_INTERVAL = float(os.getenv("NEO4J_SYNC_INTERVAL", "0"))
+
+# Only the fields the graph needs are projected; relationships carry their
+# endpoint ids instead of whole node objects.
+NODE_RETURN = """
+RETURN elementId(n) AS element_id, n[$id_property] AS node_id, n[$label_property] AS name,
+       labels(n) AS labels, properties(n) AS properties
+"""
+RELATIONSHIP_RETURN = """
+RETURN elementId(r) AS element_id, type(r) AS type, properties(r) AS properties,
+       coalesce(s[$id_property], elementId(s)) AS source, coalesce(t[$id_property], elementId(t)) AS target
+"""
+NODES_QUERY = "MATCH (n)" + NODE_RETURN
+RELATIONSHIPS_QUERY = "MATCH (s)-[r]->(t)" + RELATIONSHIP_RETURN
+CHANGED_NODES_QUERY = "MATCH (n) WHERE n[$updated_at] >= $since" + NODE_RETURN
+CHANGED_RELATIONSHIPS_QUERY = "MATCH (s)-[r]->(t) WHERE r[$updated_at] >= $since" + RELATIONSHIP_RETURN
+NODE_IDS_QUERY = "MATCH (n) RETURN coalesce(n[$id_property], elementId(n)) AS id"
+RELATIONSHIP_IDS_QUERY = "MATCH ()-[r]->() RETURN elementId(r) AS id"
+NODES_MARK_QUERY = "MATCH (n) RETURN max(n[$updated_at]) AS value"
+RELATIONSHIPS_MARK_QUERY = "MATCH ()-[r]->() RETURN max(r[$updated_at]) AS value"
+
+# Label of each query in the neo4j_query_seconds histogram
+QUERY_NAMES = {
+    NODES_QUERY: "nodes", RELATIONSHIPS_QUERY: "relationships",
+    CHANGED_NODES_QUERY: "changed_nodes", CHANGED_RELATIONSHIPS_QUERY: "changed_relationships",
+    NODE_IDS_QUERY: "node_ids", RELATIONSHIP_IDS_QUERY: "relationship_ids",
+    NODES_MARK_QUERY: "nodes_mark", RELATIONSHIPS_MARK_QUERY: "relationships_mark",
+}
+NEO4J_QUERY_SECONDS = REGISTRY.histogram("neo4j_query_seconds", "Time from running a Neo4j query to reading its last record", ("query",))
+NEO4J_RECORDS = REGISTRY.counter("neo4j_records_total", "Records read from Neo4j", ("query",))
+
+Chunk = Tuple[List[Dict[str, Any]], Dict[str, Any]]
+
 _driver = None
+_driver_lock = asyncio.Lock()
 
 async def get_driver():
     global _driver
-    if _driver is None:
-        try:
-            _driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-            await _driver.verify_connectivity()
-            print("Successfully connected to Neo4j.")
-        except Exception as e:
-            print(f"Failed to connect to Neo4j: {e}")
-            _driver = None
-            raise
+    # Concurrent readers must share one driver (and its connection pool)
+    async with _driver_lock:
+        if _driver is None:
+            try:
+                _driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+                await _driver.verify_connectivity()
+                print("Successfully connected to Neo4j.")
+            except Exception as e:
+                print(f"Failed to connect to Neo4j: {e}")
+                _driver = None
+                raise
     return _driver
 
 async def close_driver():
@@ -37,66 +88,200 @@ async def close_driver():
         _driver = None
         print("Neo4j connection closed.")
 
-async def get_all_nodes_async():
-    """Fetches all nodes and transforms them into the application's data structure."""
+def transform_node(record) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Map a NODES_QUERY record to the application's node and its allValues."""
+    node_id = record["node_id"]
+    if node_id is None:
+        node_id = record["element_id"]
+
+    node_label = record["name"]
+    if not node_label:
+        labels = record["labels"]
+        node_label = labels[0] if labels else "DefaultNodeLabel"
+    return {"id": str(node_id), "label": str(node_label)}, record["properties"]
+
+def transform_relationship(record) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Map a RELATIONSHIPS_QUERY record to the application's edge and its allValues."""
+    edge = {
+        "id": str(record["element_id"]),
+        "source": str(record["source"]),
+        "target": str(record["target"]),
+        "label": record["type"]
+    }
+    return edge, record["properties"]
+
+async def _stream(query: str, transform, chunk_size: int, **parameters) -> AsyncIterator[Chunk]:
     driver = await get_driver()
-    if not driver: return [], {}
+    name = QUERY_NAMES.get(query, "other")
+    # Excludes the time the caller spends on each yielded chunk
+    elapsed, count = 0.0, 0
+    started = time.perf_counter()
+    async with driver.session(fetch_size=chunk_size) as session:
+        result = await session.run(query, id_property=NEO4J_ID_PROPERTY, label_property=NEO4J_LABEL_PROPERTY, **parameters)
+        items, all_values = [], {}
+        async for record in result:
+            item, properties = transform(record)
+            items.append(item)
+            all_values[item["id"]] = properties
+            count += 1
+            if len(items) >= chunk_size:
+                elapsed += time.perf_counter() - started
+                yield items, all_values
+                started = time.perf_counter()
+                items, all_values = [], {}
+        elapsed += time.perf_counter() - started
+        NEO4J_QUERY_SECONDS.observe(elapsed, query=name)
+        NEO4J_RECORDS.inc(count, query=name)
+        if items:
+            yield items, all_values
 
-    transformed_nodes = []
-    node_all_values = {}
-    try:
-        async with driver.session() as session:
-            result = await session.run("MATCH (n) RETURN n")
-            records = await result.values()
-            for record in records:
-                node = record[0]
-                properties = dict(node.items())
-
-                # ID Mapping
-                node_id = properties.get(NEO4J_ID_PROPERTY, node.element_id)
-
-                # Label Mapping
-                node_label = properties.get(NEO4J_LABEL_PROPERTY)
-                if not node_label:
-                    labels = list(node.labels)
-                    node_label = labels[0] if labels else "DefaultNodeLabel"
-                
-                transformed_nodes.append({"id": str(node_id), "label": str(node_label)})
-                node_all_values[str(node_id)] = properties
+def stream_nodes(chunk_size: int = NEO4J_SYNC_CHUNK_SIZE) -> AsyncIterator[Chunk]:
+    """Yields (nodes, allValues) chunks of at most chunk_size nodes.
+
+    Records are pulled from the server chunk_size at a time, so only one chunk
+    of the result is held by the driver at once.
+    """
+    return _stream(NODES_QUERY, transform_node, chunk_size)
 
+def stream_relationships(chunk_size: int = NEO4J_SYNC_CHUNK_SIZE) -> AsyncIterator[Chunk]:
+    """Yields (edges, allValues) chunks of at most chunk_size relationships."""
+    return _stream(RELATIONSHIPS_QUERY, transform_relationship, chunk_size)
+
+async def _collect(chunks: AsyncIterator[Chunk], label: str) -> Chunk:
+    items, all_values = [], {}
+    try:
+        async for chunk_items, chunk_values in chunks:
+            items.extend(chunk_items)
+            all_values.update(chunk_values)
     except Exception as e:
-        print(f"Error querying Neo4j nodes: {e}")
+        print(f"Error querying Neo4j {label}: {e}")
         raise
-    return transformed_nodes, node_all_values
+    return items, all_values
 
-async def get_all_relationships_async():
+async def get_all_nodes_async(chunk_size: int = NEO4J_SYNC_CHUNK_SIZE) -> Chunk:
+    """Fetches all nodes and transforms them into the application's data structure."""
+    return await _collect(stream_nodes(chunk_size), "nodes")
+
+async def get_all_relationships_async(chunk_size: int = NEO4J_SYNC_CHUNK_SIZE) -> Chunk:
     """Fetches all relationships and transforms them into the application's data structure."""
-    driver = await get_driver()
-    if not driver: return [], {}
+    return await _collect(stream_relationships(chunk_size), "relationships")
 
-    transformed_edges = []
-    edge_all_values = {}
-    try:
+async def get_graph_async(chunk_size: int = NEO4J_SYNC_CHUNK_SIZE) -> Tuple[Chunk, Chunk]:
+    """Reads nodes and relationships concurrently, each on its own pooled session."""
+    return await asyncio.gather(get_all_nodes_async(chunk_size), get_all_relationships_async(chunk_size))
+
+
+def content_hash(item: Dict[str, Any], properties: Dict[str, Any]) -> str:
+    """Stable digest of an entity and its properties, used to detect changes."""
+    encoded = json.dumps([item, properties], sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+async def _single_value(query: str, **parameters) -> Any:
+    driver = await get_driver()
+    with NEO4J_QUERY_SECONDS.time(query=QUERY_NAMES.get(query, "other")):
         async with driver.session() as session:
-            result = await session.run("MATCH (n)-[r]->(m) RETURN n, r, m")
-            async for record in result:
-                source_node, rel, target_node = record["n"], record["r"], record["m"]
-
-                # Use the same ID mapping logic for source and target nodes
-                source_id = source_node.get(NEO4J_ID_PROPERTY, source_node.element_id)
-                target_id = target_node.get(NEO4J_ID_PROPERTY, target_node.element_id)
-                rel_id = rel.element_id
-                properties = dict(rel.items())
-
-                transformed_edges.append({
-                    "id": str(rel_id),
-                    "source": str(source_id),
-                    "target": str(target_id),
-                    "label": rel.type
-                })
-                edge_all_values[str(rel_id)] = properties
+            result = await session.run(query, **parameters)
+            record = await result.single()
+    return record["value"] if record else None
 
-    except Exception as e:
-        print(f"Error querying Neo4j relationships: {e}")
-        raise
-    return transformed_edges, edge_all_values
+async def _ids(query: str, chunk_size: int) -> Set[str]:
+    driver = await get_driver()
+    name = QUERY_NAMES.get(query, "other")
+    with NEO4J_QUERY_SECONDS.time(query=name):
+        async with driver.session(fetch_size=chunk_size) as session:
+            result = await session.run(query, id_property=NEO4J_ID_PROPERTY)
+            ids = {str(record["id"]) async for record in result}
+    NEO4J_RECORDS.inc(len(ids), query=name)
+    return ids
+
+# Per entity kind: full query, changed-since query, id-only query, high-water mark query, transform
+_KINDS = {
+    "nodes": (NODES_QUERY, CHANGED_NODES_QUERY, NODE_IDS_QUERY, NODES_MARK_QUERY, transform_node),
+    "edges": (RELATIONSHIPS_QUERY, CHANGED_RELATIONSHIPS_QUERY, RELATIONSHIP_IDS_QUERY, RELATIONSHIPS_MARK_QUERY, transform_relationship),
+}
+
+class IncrementalSync:
+    """Remembers what the last sync read from Neo4j so the next one can fetch a delta.
+
+    Every synced node and edge id maps to a content hash; with
+    NEO4J_UPDATED_AT_PROPERTY set, the largest timestamp seen is kept as a
+    high-water mark and only entities at or above it are read, plus the bare
+    ids to detect deletions. Entities that do not maintain the property are
+    then only picked up by a full sync.
+
+    ``changes()`` does not modify the state; ``commit(delta)`` does, once the
+    delta has been applied, so a failed merge is retried by the next sync.
+    """
+
+    def __init__(self, updated_at_property: str = NEO4J_UPDATED_AT_PROPERTY):
+        self.updated_at_property = updated_at_property
+        self.reset()
+
+    def reset(self):
+        """Forget the previous sync; the next one has to be a full sync."""
+        self.hashes: Optional[Dict[str, Dict[str, str]]] = None
+        self.high_water: Dict[str, Any] = {}
+
+    @property
+    def seeded(self) -> bool:
+        return self.hashes is not None
+
+    def seed(self, nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]], all_values: Dict[str, Any]):
+        """Record the result of a full sync."""
+        self.hashes = {
+            "nodes": {node["id"]: content_hash(node, all_values.get(node["id"], {})) for node in nodes},
+            "edges": {edge["id"]: content_hash(edge, all_values.get(edge["id"], {})) for edge in edges},
+        }
+        self.high_water = {}
+
+    async def changes(self, chunk_size: int = NEO4J_SYNC_CHUNK_SIZE) -> Dict[str, Any]:
+        """Entities created, changed or deleted in Neo4j since the last sync.
+
+        Returns ``{"nodes", "edges"}`` each holding the changed items, their
+        ``values`` (allValues), the ``removed`` ids, the new ``hashes`` and the
+        new high-water ``mark``.
+        """
+        if not self.seeded:
+            raise RuntimeError("Incremental sync needs a full sync first")
+        nodes, edges = await asyncio.gather(self._kind_changes("nodes", chunk_size), self._kind_changes("edges", chunk_size))
+        return {"nodes": nodes, "edges": edges}
+
+    async def _kind_changes(self, kind: str, chunk_size: int) -> Dict[str, Any]:
+        full_query, changed_query, ids_query, mark_query, transform = _KINDS[kind]
+        known = self.hashes[kind]
+        since = self.high_water.get(kind)
+        mark = None
+        if self.updated_at_property:
+            # Read the mark first: anything written meanwhile is at or above it
+            mark = await _single_value(mark_query, updated_at=self.updated_at_property)
+
+        if self.updated_at_property and since is not None:
+            chunks = _stream(changed_query, transform, chunk_size, updated_at=self.updated_at_property, since=since)
+            live_ids = await _ids(ids_query, chunk_size)
+        else:
+            chunks = _stream(full_query, transform, chunk_size)
+            live_ids = None
+
+        changed, values, hashes, seen = [], {}, {}, set()
+        async for items, chunk_values in chunks:
+            for item in items:
+                seen.add(item["id"])
+                digest = content_hash(item, chunk_values[item["id"]])
+                if known.get(item["id"]) != digest:
+                    changed.append(item)
+                    values[item["id"]] = chunk_values[item["id"]]
+                    hashes[item["id"]] = digest
+        if live_ids is None:
+            live_ids = seen
+        removed = [entity_id for entity_id in known if entity_id not in live_ids]
+        return {"items": changed, "values": values, "removed": removed, "hashes": hashes, "mark": mark}
+
+    def commit(self, delta: Dict[str, Any]):
+        """Make delta the new baseline."""
+        for kind in ("nodes", "edges"):
+            known = self.hashes[kind]
+            for entity_id in delta[kind]["removed"]:
+                known.pop(entity_id, None)
+            known.update(delta[kind]["hashes"])
+            if delta[kind]["mark"] is not None:
+                self.high_water[kind] = delta[kind]["mark"]
@@ -0,0 +1,309 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks (Windows): the cache is then only safe within one process
+    fcntl = None
+
+from metrics import REGISTRY, Counter, Gauge, Metric
+
+# --- Configuration ---
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_cache"))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# After an eviction the cache is compacted down to this fraction of the size limit,
+# so that a full cache does not rewrite its files on every insert.
+EVICTION_LOW_WATER = 0.8
+
+KEY_SIZE = hashlib.sha256().digest_size
+VECTOR_DTYPE = np.float32
+# Kind of vector the cache holds, part of every key: unit-length /api/embed
+# output. Entries from before (raw /api/embeddings vectors) then never match
+# and age out through eviction.
+VECTOR_KIND = "api/embed:unit"
+
+
+def cache_key(model: str, text: str) -> bytes:
+    """Content hash identifying an embedding of text produced by model."""
+    return hashlib.sha256(f"{VECTOR_KIND}\n{model}\n{text}".encode("utf-8")).digest()
+
+
+class DiskEmbeddingCache:
+    """Append-only on-disk embedding store for a single model.
+
+    Vectors live in ``<model>.vec`` as raw float32 rows and are memory-mapped on
+    load; ``<model>.keys`` holds the matching 32-byte content hashes in row order.
+    When the vector file grows past ``max_bytes`` the least recently used rows
+    are dropped and both files are rewritten.
+
+    Several processes (e.g. uvicorn workers) can share one cache: writes hold
+    an exclusive lock on ``<model>.lock``, and before a lookup reads a row a
+    process checks the keys file under a shared lock, picking up rows the
+    others appended or reloading after another one compacted the files.
+    """
+
+    def __init__(self, directory: str, model: str, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.model = model
+        self.max_bytes = max_bytes
+        base = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model))
+        self._keys_path = base + ".keys"
+        self._vectors_path = base + ".vec"
+        self._meta_path = base + ".meta"
+        self._lock_path = base + ".lock"
+        self._lock = threading.Lock()
+        # Identity, length and mtime of the keys file as last read, to notice writes by other processes
+        self._keys_file: Optional[tuple] = None
+        self._rows: Dict[bytes, int] = {}
+        self._last_used: Dict[int, int] = {}
+        self._clock = 0
+        self._dim: Optional[int] = None
+        self._mapped: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        with self._file_lock():
+            self._load()
+            self._truncate_torn_rows()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, text: str) -> bool:
+        return cache_key(self.model, text) in self._rows
+
+    @property
+    def size_bytes(self) -> int:
+        if self._dim is None:
+            return 0
+        return len(self._rows) * self._dim * np.dtype(VECTOR_DTYPE).itemsize
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool = True):
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stat_keys(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self._keys_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _load(self):
+        self._rows, self._last_used = {}, {}
+        self._keys_file = None
+        if not os.path.exists(self._meta_path):
+            self._remap(0)
+            return
+        with open(self._meta_path) as f:
+            self._dim = json.load(f)["dim"]
+        self._read_rows(0)
+
+    def _read_rows(self, start: int):
+        """Index the rows of the files from row start on."""
+        with open(self._keys_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            f.seek(start * KEY_SIZE)
+            keys = f.read()
+        row_bytes = self._dim * np.dtype(VECTOR_DTYPE).itemsize
+        vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        # A crash between the two appends can leave one file a row ahead; trust the shorter one.
+        count = min(start + len(keys) // KEY_SIZE, vector_rows)
+        for row in range(start, count):
+            offset = (row - start) * KEY_SIZE
+            self._rows[keys[offset:offset + KEY_SIZE]] = row
+            self._last_used[row] = 0
+        # A torn key stays out of the index but counts towards the size seen
+        self._keys_file = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        self._remap(count)
+
+    def _truncate_torn_rows(self):
+        """Cut both files back to the indexed rows, dropping a row a crashed append left in only one of them.
+
+        Appends go to the end of the files while their rows are numbered from
+        the index, so a stray row would shift every later vector. Needs the
+        exclusive file lock.
+        """
+        if self._dim is None:
+            return
+        count = len(self._rows)
+        row_bytes = self._dim * np.dtype(VECTOR_DTYPE).itemsize
+        for path, size in ((self._vectors_path, count * row_bytes), (self._keys_path, count * KEY_SIZE)):
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+        self._keys_file = self._stat_keys()
+
+    def _refresh(self):
+        """Catch up with rows other processes appended, or reload after they compacted."""
+        current = self._stat_keys()
+        if current == self._keys_file or current is None:
+            return
+        if (self._keys_file is None or self._dim is None or current[0] != self._keys_file[0]
+                or current[1] < self._keys_file[1] or not self._rows_in_place()):
+            self._load()
+        else:
+            self._read_rows(len(self._rows))
+
+    def _rows_in_place(self) -> bool:
+        """Whether the last indexed key is still at its row, i.e. the file was only appended to.
+
+        Compaction keeps the order of the rows it keeps, so this also catches
+        one whose new keys file reused the inode and grew past the old size.
+        """
+        if not self._rows:
+            return True
+        key, row = next(reversed(self._rows.items()))
+        with open(self._keys_path, "rb") as f:
+            f.seek(row * KEY_SIZE)
+            return f.read(KEY_SIZE) == key
+
+    def _remap(self, count: int):
+        self._mapped = None
+        if count:
+            self._mapped = np.memmap(self._vectors_path, dtype=VECTOR_DTYPE, mode="r", shape=(count, self._dim))
+
+    def _current_row(self, key: bytes) -> Optional[int]:
+        """Row of key in the files as they are now, mapped and ready to read. Needs self._lock."""
+        if self._stat_keys() != self._keys_file:
+            with self._file_lock(exclusive=False):
+                self._refresh()
+        row = self._rows.get(key)
+        if row is not None and (self._mapped is None or row >= self._mapped.shape[0]):
+            # A row this process appended: map it, unless another one rewrote the files since
+            with self._file_lock(exclusive=False):
+                self._refresh()
+                row = self._rows.get(key)
+                if row is not None:
+                    self._remap(len(self._rows))
+        return row
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached vector for text, or None."""
+        key = cache_key(self.model, text)
+        with self._lock:
+            row = self._current_row(key)
+            if row is None:
+                self.misses += 1
+                return None
+            self._clock += 1
+            self._last_used[row] = self._clock
+            self.hits += 1
+            return np.array(self._mapped[row])
+
+    def peek(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached vector for text, or None.
+
+        Unlike get, a peek is not counted as a hit or miss and does not make
+        the entry recently used.
+        """
+        key = cache_key(self.model, text)
+        with self._lock:
+            row = self._current_row(key)
+            if row is None:
+                return None
+            return np.array(self._mapped[row])
+
+    def put(self, text: str, vector: Sequence[float]):
+        """Store the vector for text, evicting old entries if over the size limit."""
+        key = cache_key(self.model, text)
+        vector = np.asarray(vector, dtype=VECTOR_DTYPE)
+        with self._lock, self._file_lock():
+            self._refresh()
+            if key in self._rows:
+                return
+            if self._dim is None:
+                self._dim = int(vector.shape[0])
+                with open(self._meta_path, "w") as f:
+                    json.dump({"model": self.model, "dim": self._dim}, f)
+            elif vector.shape[0] != self._dim:
+                raise ValueError(f"Embedding has dimension {vector.shape[0]}, cache expects {self._dim}")
+            self._truncate_torn_rows()
+            with open(self._vectors_path, "ab") as f:
+                f.write(vector.tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(key)
+            row = len(self._rows)
+            self._rows[key] = row
+            self._keys_file = self._stat_keys()
+            self._clock += 1
+            self._last_used[row] = self._clock
+            if self.size_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Rewrite both files keeping only the most recently used rows."""
+        row_bytes = self._dim * np.dtype(VECTOR_DTYPE).itemsize
+        keep_count = int(self.max_bytes * EVICTION_LOW_WATER) // row_bytes
+        by_recency = sorted(self._rows.items(), key=lambda item: self._last_used[item[1]], reverse=True)
+        kept = sorted(by_recency[:keep_count], key=lambda item: item[1])
+
+        self._remap(len(self._rows))
+        vectors = np.array(self._mapped[[row for _, row in kept]]) if kept else np.empty((0, self._dim), dtype=VECTOR_DTYPE)
+        self._mapped = None
+        with open(self._vectors_path + ".tmp", "wb") as f:
+            f.write(vectors.tobytes())
+        with open(self._keys_path + ".tmp", "wb") as f:
+            f.write(b"".join(key for key, _ in kept))
+        os.replace(self._vectors_path + ".tmp", self._vectors_path)
+        os.replace(self._keys_path + ".tmp", self._keys_path)
+
+        last_used = self._last_used
+        self._rows = {key: new_row for new_row, (key, _) in enumerate(kept)}
+        self._last_used = {new_row: last_used[old_row] for new_row, (_, old_row) in enumerate(kept)}
+        self._keys_file = self._stat_keys()
+        self._remap(len(self._rows))
+
+
+_caches: Dict[str, DiskEmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model: str) -> DiskEmbeddingCache:
+    """Return the process-wide disk cache for model, loading it on first use."""
+    with _caches_lock:
+        cache = _caches.get(model)
+        if cache is None:
+            cache = DiskEmbeddingCache(EMBEDDING_CACHE_DIR, model)
+            _caches[model] = cache
+        return cache
+
+
+def cache_counts() -> Dict[str, int]:
+    """Hits and misses summed over the loaded caches."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {"embedding_cache_hits": sum(cache.hits for cache in caches),
+            "embedding_cache_misses": sum(cache.misses for cache in caches)}
+
+
+@REGISTRY.collector
+def cache_metrics() -> List[Metric]:
+    """Hit/miss counters and sizes of the loaded caches, read at scrape time."""
+    hits = Counter("embedding_cache_hits_total", "Embedding cache lookups served from disk", ("model",))
+    misses = Counter("embedding_cache_misses_total", "Embedding cache lookups that needed the embedding service", ("model",))
+    entries = Gauge("embedding_cache_entries", "Embeddings held by the cache", ("model",))
+    size = Gauge("embedding_cache_bytes", "Size of the cached vectors", ("model",))
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        hits.inc(cache.hits, model=cache.model)
+        misses.inc(cache.misses, model=cache.model)
+        entries.set(len(cache), model=cache.model)
+        size.set(cache.size_bytes, model=cache.model)
+    return [hits, misses, entries, size]
@@ -0,0 +1,149 @@
+import os
+import asyncio
+import httpx
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from requests.adapters import HTTPAdapter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from embedding_cache import DiskEmbeddingCache, get_embedding_cache
+from metrics import REGISTRY
+
+# --- Configuration ---
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+EMBEDDING_MODEL = os.getenv("MODEL_NAME", "nomic-embed-text")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+EMBEDDING_REQUEST_SECONDS = REGISTRY.histogram("embedding_request_seconds", "Latency of one batched /api/embed request", ("client",))
+EMBEDDED_TEXTS = REGISTRY.counter("embedding_texts_total", "Texts sent to the embedding service", ("client",))
+
+
+class EmbeddingClient:
+    """Ollama embedding client with a pooled HTTP session and batched requests.
+
+    Texts are looked up in the disk cache first; the misses are de-duplicated,
+    split into batches of ``batch_size`` and sent to ``/api/embed`` with up to
+    ``concurrency`` requests in flight. ``/api/embed`` returns unit-length
+    vectors, so dot products between them are cosine similarities.
+
+    ``aembed_many`` is the asyncio counterpart used by the request handlers: it
+    shares the cache but sends batches through an ``httpx.AsyncClient``, with a
+    semaphore bounding the requests in flight across all concurrent searches.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_URL, model: str = EMBEDDING_MODEL,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, concurrency: int = EMBEDDING_CONCURRENCY,
+                 cache: Optional[DiskEmbeddingCache] = None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.cache = cache if cache is not None else get_embedding_cache(model)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _post_batch(self, texts: List[str]) -> List[List[float]]:
+        EMBEDDED_TEXTS.inc(len(texts), client="sync")
+        with EMBEDDING_REQUEST_SECONDS.time(client="sync"):
+            response = self.session.post(f"{self.base_url}/api/embed", json={"model": self.model, "input": texts})
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code,
+                                detail="Error calculating embedding")
+        return self._embeddings_from(response.json(), texts)
+
+    def _embeddings_from(self, body: Dict, texts: List[str]) -> List[List[float]]:
+        embeddings = body.get("embeddings", [])
+        if len(embeddings) != len(texts):
+            raise HTTPException(status_code=502,
+                                detail="Embedding service returned an unexpected number of vectors")
+        return embeddings
+
+    async def _apost_batch(self, texts: List[str]) -> List[List[float]]:
+        if self._async_client is None:
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=None)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            EMBEDDED_TEXTS.inc(len(texts), client="async")
+            with EMBEDDING_REQUEST_SECONDS.time(client="async"):
+                response = await self._async_client.post("/api/embed", json={"model": self.model, "input": texts})
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code,
+                                detail="Error calculating embedding")
+        return self._embeddings_from(response.json(), texts)
+
+    def lookup(self, texts: Sequence[str]) -> Tuple[Dict[str, List[float]], List[List[str]]]:
+        """Split texts into cached embeddings and request-sized batches of misses."""
+        found = {}
+        misses = []
+        for text in dict.fromkeys(texts):
+            cached = self.cache.get(text)
+            if cached is None:
+                misses.append(text)
+            else:
+                found[text] = cached.tolist()
+        return found, [misses[i:i + self.batch_size] for i in range(0, len(misses), self.batch_size)]
+
+    def store(self, found: Dict[str, List[float]], texts: List[str], embeddings: List[List[float]]):
+        for text, embedding in zip(texts, embeddings):
+            self.cache.put(text, embedding)
+            found[text] = embedding
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Return embeddings for texts in order, fetching only uncached ones."""
+        found, batches = self.lookup(texts)
+        if len(batches) == 1:
+            self.store(found, batches[0], self._post_batch(batches[0]))
+        elif batches:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+                for batch, embeddings in zip(batches, executor.map(self._post_batch, batches)):
+                    self.store(found, batch, embeddings)
+        return [found[text] for text in texts]
+
+    async def aembed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Async embed_many; cache I/O runs in a worker thread, requests on the event loop."""
+        found, batches = await asyncio.to_thread(self.lookup, texts)
+        if batches:
+            results = await asyncio.gather(*(self._apost_batch(batch) for batch in batches))
+            await asyncio.to_thread(self._store_batches, found, batches, results)
+        return [found[text] for text in texts]
+
+    def _store_batches(self, found: Dict[str, List[float]], batches: List[List[str]], results: List[List[List[float]]]):
+        for batch, embeddings in zip(batches, results):
+            self.store(found, batch, embeddings)
+
+    async def aclose(self):
+        """Close the pooled HTTP connections."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        self.session.close()
+
+    def embed(self, text: str) -> Dict:
+        """Embed a single text, returning it in the ``{"embedding": [...]}`` shape."""
+        return {"embedding": self.embed_many([text])[0]}
+
+
+_client: Optional[EmbeddingClient] = None
+
+
+def get_embedding_client() -> EmbeddingClient:
+    """Return the process-wide embedding client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = EmbeddingClient()
+    return _client
+
+
+async def close_embedding_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
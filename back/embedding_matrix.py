@@ -0,0 +1,91 @@
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Protocol, Sequence, Tuple
+
+
+class EntityScorer(Protocol):
+    """Anything that can rank entity ids against a query embedding."""
+
+    def __len__(self) -> int: ...
+
+    def top_k(self, query: Sequence[float], k: int, min_threshold: float) -> List[Tuple[str, float]]: ...
+
+    def top_k_among(self, query: Sequence[float], ids: Iterable[str], k: int, min_threshold: float) -> List[Tuple[str, float]]: ...
+
+
+class EmbeddingMatrix:
+    """Dense matrix of entity embeddings, one row per entity id.
+
+    Rows are scored against one or more query vectors with a single
+    matrix-vector (or matrix-matrix) product instead of a Python loop.
+    """
+
+    def __init__(self, ids: List[str], vectors: np.ndarray):
+        if vectors.ndim != 2 or vectors.shape[0] != len(ids):
+            raise ValueError("vectors must be a 2-D array with one row per id")
+        self.ids = ids
+        self.vectors = vectors
+        self._rows: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_embeddings(cls, items: Iterable[Tuple[str, Sequence[float]]]) -> "EmbeddingMatrix":
+        """Build a matrix from (entity_id, embedding) pairs."""
+        ids = []
+        rows = []
+        for entity_id, embedding in items:
+            ids.append(entity_id)
+            rows.append(embedding)
+        if not rows:
+            return cls([], np.empty((0, 0), dtype=np.float64))
+        return cls(ids, np.asarray(rows, dtype=np.float64))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Dot-product scores of every row against the given query vector(s)."""
+        queries = np.asarray(queries, dtype=self.vectors.dtype)
+        if queries.ndim == 1:
+            return self.vectors @ queries
+        return queries @ self.vectors.T
+
+    def best_match(self, query: Sequence[float], min_threshold: float) -> Tuple[Optional[str], float]:
+        """Return the highest scoring id above min_threshold, or (None, 0)."""
+        matches = self.top_k(query, 1, min_threshold)
+        return matches[0] if matches else (None, 0)
+
+    def best_matches(self, queries: Sequence[Sequence[float]], min_threshold: float) -> List[Tuple[Optional[str], float]]:
+        """Return best_match for every query using one matrix-matrix product."""
+        if len(queries) == 0:
+            return []
+        if len(self) == 0:
+            return [(None, 0) for _ in queries]
+        scores = self.scores(np.asarray(queries))
+        best = np.argmax(scores, axis=1)
+        results = []
+        for row, index in enumerate(best):
+            score = float(scores[row, index])
+            if score > min_threshold:
+                results.append((self.ids[index], score))
+            else:
+                results.append((None, 0))
+        return results
+
+    def top_k(self, query: Sequence[float], k: int, min_threshold: float) -> List[Tuple[str, float]]:
+        """Return up to k (id, score) pairs above min_threshold, best first."""
+        if len(self) == 0 or k <= 0:
+            return []
+        scores = self.scores(query)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        # Stable sort keeps the first row on ties, like the original linear scan.
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(self.ids[i], float(scores[i])) for i in candidates if scores[i] > min_threshold]
+
+    def top_k_among(self, query: Sequence[float], ids: Iterable[str], k: int, min_threshold: float) -> List[Tuple[str, float]]:
+        """top_k over just the rows of ids (e.g. the edges around a node); ids without a row are skipped."""
+        if self._rows is None:
+            self._rows = {entity_id: row for row, entity_id in enumerate(self.ids)}
+        rows = np.sort(np.fromiter((self._rows[entity_id] for entity_id in ids if entity_id in self._rows), dtype=np.int64))
+        return EmbeddingMatrix([self.ids[row] for row in rows], self.vectors[rows]).top_k(query, k, min_threshold)
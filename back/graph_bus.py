@@ -0,0 +1,332 @@
+import os
+import struct
+import hashlib
+import asyncio
+import itertools
+import tempfile
+import multiprocessing
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from json_codec import dumps, loads
+from graph_store import GraphStoreError, EntityNotFoundError, DuplicateIdError, InvalidOperationError
+
+# --- Configuration ---
+# Unix socket the uvicorn workers of one host coordinate over. Empty keeps
+# everything in one process. It defaults to a socket in the temp directory,
+# named after the app's directory and working directory so that separate
+# deployments on a host do not meet, whenever this process is one of several
+# workers: a child of uvicorn's --workers / --reload supervisor (which does
+# not export WEB_CONCURRENCY), or WEB_CONCURRENCY > 1 (gunicorn and others).
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+def _default_socket() -> str:
+    if WEB_CONCURRENCY <= 1 and multiprocessing.parent_process() is None:
+        return ""
+    deployment = f"{os.path.dirname(os.path.abspath(__file__))}\n{os.getcwd()}"
+    return os.path.join(tempfile.gettempdir(), f"graph-bus-{hashlib.sha256(deployment.encode()).hexdigest()[:12]}.sock")
+
+
+GRAPH_BUS_SOCKET = os.getenv("GRAPH_BUS_SOCKET", _default_socket())
+# Seconds between attempts to reach (or become) the hub.
+GRAPH_BUS_RETRY_SECONDS = float(os.getenv("GRAPH_BUS_RETRY_SECONDS", "0.2"))
+
+_HEADER = struct.Struct("!I")
+# Graph store errors a hub reports back, re-raised as the same type in the submitting worker
+_ERRORS = {cls.__name__: cls for cls in (EntityNotFoundError, DuplicateIdError, InvalidOperationError, GraphStoreError)}
+
+
+class GraphBusError(RuntimeError):
+    """Raised when the hub can not be reached, or a call failed on it."""
+
+
+def _frame(message: Dict[str, Any]) -> bytes:
+    payload = dumps(message)
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    header = await reader.readexactly(_HEADER.size)
+    return loads(await reader.readexactly(_HEADER.unpack(header)[0]))
+
+
+class GraphBus:
+    """Orders graph mutations across the worker processes of one host.
+
+    Mutations are submitted as ``submit(method, *args)`` and run through
+    ``appliers[method]``, which changes the local graph and does the local
+    follow-up work (search index, SSE). Without a socket that is all. With
+    one, the worker holding ``<socket>.lock`` is the hub: it applies commands
+    one at a time, rejects invalid ones, and forwards accepted ones to every
+    other worker, which applies them to its replica in the same order, so
+    versions agree everywhere. A joining worker is sent a snapshot first;
+    a hub that finds a worker ahead of itself (e.g. a fresh process won the
+    lock after the previous hub died) adopts that worker's replica instead.
+
+    ``publish`` fans an SSE-only message out to all workers; ``call`` runs a
+    handler registered in ``handlers`` once, on the hub (e.g. Neo4j syncs).
+
+    Two optional hooks run on the hub only: ``on_hub`` when a worker becomes
+    the hub (or its graph was replaced by a follower's), before it serves
+    anyone, and ``on_commit(method, args)`` after every applied mutation,
+    before it is forwarded or acknowledged (e.g. to persist it). If on_commit
+    fails the mutation is still forwarded, as the hub has applied it, but
+    the submitter gets a GraphBusError instead of the result.
+    """
+
+    def __init__(self, appliers: Dict[str, Callable[..., Awaitable[Any]]],
+                 publish_local: Callable[[Dict[str, Any]], Awaitable[None]],
+                 snapshot: Callable[[], Dict[str, Any]], restore: Callable[[Dict[str, Any]], Awaitable[None]],
+                 version: Callable[[], int], socket_path: str = GRAPH_BUS_SOCKET, retry_seconds: float = GRAPH_BUS_RETRY_SECONDS,
+                 on_hub: Optional[Callable[[], Awaitable[None]]] = None, on_commit: Optional[Callable[[str, list], Awaitable[None]]] = None):
+        self.appliers = appliers
+        self.publish_local = publish_local
+        self.snapshot = snapshot
+        self.restore = restore
+        self.version = version
+        self.on_hub = on_hub
+        self.on_commit = on_commit
+        self.handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self.socket_path = socket_path
+        self.retry_seconds = retry_seconds
+        self.is_hub = not socket_path
+        self._lock = asyncio.Lock()
+        self._ids = itertools.count(1)
+        self._followers: Dict[int, asyncio.StreamWriter] = {}
+        self._hub: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._lock_file = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def role(self) -> str:
+        if not self.socket_path:
+            return "single"
+        return "hub" if self.is_hub else "follower"
+
+    async def start(self):
+        """Join the workers of this host; returns once the local graph is in sync."""
+        if not self.socket_path:
+            if self.on_hub is not None:
+                await self.on_hub()
+            return
+        if self._task is not None:
+            return
+        joined = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(joined))
+        await joined
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            for writer in self._followers.values():
+                writer.close()
+            self._followers.clear()
+            self._server = None
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self.is_hub = not self.socket_path
+
+    async def submit(self, method: str, *args) -> Any:
+        """Apply a mutation on every worker; returns what the local applier returned."""
+        if self.is_hub:
+            return await self._commit(method, list(args))
+        return await self._request({"type": "submit", "method": method, "args": list(args)})
+
+    async def publish(self, message: Dict[str, Any]):
+        """Hand message to publish_local on every worker."""
+        if self.is_hub:
+            self._fan_out(_frame({"type": "publish", "message": message}))
+            await self.publish_local(message)
+        elif self._hub is not None:
+            # The hub echoes it back to this worker too
+            self._hub.write(_frame({"type": "publish", "message": message}))
+        else:
+            raise GraphBusError("Not connected to the graph hub")
+
+    async def call(self, name: str, **kwargs) -> Any:
+        """Run handlers[name] on the hub and return its result."""
+        if self.is_hub:
+            return await self.handlers[name](**kwargs)
+        return await self._request({"type": "call", "name": name, "kwargs": kwargs})
+
+    # --- Hub side ---
+
+    async def _commit(self, method: str, args: list, origin: Optional[Tuple[int, int]] = None) -> Any:
+        async with self._lock:
+            result = await self.appliers[method](*args)
+            failure = None
+            if self.on_commit is not None:
+                try:
+                    await self.on_commit(method, args)
+                except Exception as e:
+                    failure = e
+            if self._followers:
+                self._fan_out(_frame({"type": "commit", "method": method, "args": args}))
+                if failure is None and origin is not None and origin[0] in self._followers:
+                    self._followers[origin[0]].write(_frame({"type": "ack", "id": origin[1]}))
+            if failure is not None:
+                raise GraphBusError(f"{method} was applied but could not be committed: {failure}") from failure
+            return result
+
+    def _fan_out(self, frame: bytes):
+        for writer in self._followers.values():
+            writer.write(frame)
+
+    def _try_lock(self) -> bool:
+        import fcntl
+        lock_file = open(self.socket_path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _become_hub(self):
+        # Holding the lock, any socket file left over belongs to a dead hub
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        if self.on_hub is not None:
+            await self.on_hub()
+        self._server = await asyncio.start_unix_server(self._serve, path=self.socket_path)
+        self.is_hub = True
+        print(f"Graph bus: this worker (pid {os.getpid()}) is the hub on {self.socket_path}")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn_id = next(self._ids)
+        try:
+            hello = await _read_frame(reader)
+            async with self._lock:
+                if hello.get("version", 0) > self.version():
+                    # This worker is ahead of the hub: take over its graph and resync the others
+                    writer.write(_frame({"type": "snapshot_request"}))
+                    await self.restore((await _read_frame(reader))["state"])
+                    if self.on_hub is not None:
+                        await self.on_hub()
+                    self._fan_out(_frame({"type": "snapshot", "state": self.snapshot()}))
+                    writer.write(_frame({"type": "snapshot", "state": None}))
+                else:
+                    writer.write(_frame({"type": "snapshot", "state": self.snapshot()}))
+                self._followers[conn_id] = writer
+            while True:
+                message = await _read_frame(reader)
+                kind = message["type"]
+                if kind == "submit":
+                    try:
+                        await self._commit(message["method"], message["args"], origin=(conn_id, message["id"]))
+                    except Exception as e:
+                        writer.write(_frame({"type": "error", "id": message["id"], "error": type(e).__name__, "message": str(e.args[0]) if e.args else str(e)}))
+                elif kind == "publish":
+                    await self.publish(message["message"])
+                elif kind == "call":
+                    # Calls can take long (a full sync); keep reading meanwhile
+                    asyncio.create_task(self._answer_call(writer, message))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._followers.pop(conn_id, None)
+            writer.close()
+
+    async def _answer_call(self, writer: asyncio.StreamWriter, message: Dict[str, Any]):
+        try:
+            value = await self.handlers[message["name"]](**message["kwargs"])
+            reply = {"type": "result", "id": message["id"], "value": value}
+        except Exception as e:
+            reply = {"type": "error", "id": message["id"], "error": "GraphBusError", "message": str(e)}
+        if not writer.is_closing():
+            writer.write(_frame(reply))
+
+    # --- Follower side ---
+
+    async def _run(self, joined: asyncio.Future):
+        while True:
+            if self._try_lock():
+                await self._become_hub()
+                if not joined.done():
+                    joined.set_result(None)
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(self.retry_seconds)
+                continue
+            try:
+                writer.write(_frame({"type": "hello", "version": self.version()}))
+                await self._follow(reader, writer, joined)
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                print(f"Graph bus: lost the hub ({e!r}); reconnecting")
+            finally:
+                self._hub = None
+                writer.close()
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(GraphBusError("Lost the connection to the graph hub"))
+                self._pending.clear()
+
+    async def _follow(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, joined: asyncio.Future):
+        message = await _read_frame(reader)
+        if message["type"] == "snapshot_request":
+            writer.write(_frame({"type": "state", "state": self.snapshot()}))
+            message = await _read_frame(reader)
+        if message["state"] is not None:
+            await self.restore(message["state"])
+        self._hub = writer
+        if not joined.done():
+            joined.set_result(None)
+
+        last_result = None
+        while True:
+            message = await _read_frame(reader)
+            kind = message["type"]
+            if kind == "commit":
+                try:
+                    last_result = await self.appliers[message["method"]](*message["args"])
+                except Exception as e:
+                    # The replica diverged; reconnecting fetches a fresh snapshot
+                    raise ConnectionError(f"Could not apply {message['method']}: {e!r}")
+            elif kind == "ack":
+                self._resolve(message["id"], last_result)
+            elif kind == "result":
+                self._resolve(message["id"], message["value"])
+            elif kind == "error":
+                error = _ERRORS.get(message["error"], GraphBusError)
+                self._resolve(message["id"], error=error(message["message"]))
+            elif kind == "publish":
+                await self.publish_local(message["message"])
+            elif kind == "snapshot":
+                await self.restore(message["state"])
+
+    def _resolve(self, request_id: int, value: Any = None, error: Optional[Exception] = None):
+        future = self._pending.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    async def _request(self, message: Dict[str, Any]) -> Any:
+        if self._hub is None:
+            raise GraphBusError("Not connected to the graph hub")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._hub.write(_frame({**message, "id": request_id}))
+        return await future
@@ -1,166 +1,324 @@
-import requests
-from fastapi import HTTPException
-from typing import List, Dict, Any, Set, Tuple, Optional
-from functools import lru_cache
-from models import GraphData, Object, Relation
+import os
+import time
+from typing import List, Dict, Any, Set, Tuple, Optional, Iterable, Iterator, Callable
+from models import GraphData, Edge, Object, Relation
+from embedding_matrix import EmbeddingMatrix, EntityScorer
+from adjacency import Adjacency
+from embedding_client import get_embedding_client
+from metrics import REGISTRY
 
-# Minimum dot product threshold for considering a match
-MIN_DOT_PRODUCT_THRESHOLD = 200
+# Minimum dot product threshold for considering a match.
+# Embeddings from /api/embed are unit-length, so this is a cosine similarity.
+MIN_DOT_PRODUCT_THRESHOLD = float(os.getenv("MIN_DOT_PRODUCT_THRESHOLD", "0.5"))
 
-# In-memory cache for string embeddings
-@lru_cache(maxsize=1000)
-def cached_calculate_embedding(text: str) -> Dict:
-    """Calculate embedding for a given text using the embeddings API with caching."""
-    url = "http://localhost:11434/api/embeddings" # replace to localhost to debug
-    payload = {
-        "model": "nomic-embed-text",
-        "prompt": text
-    }
-    headers = {
-        "Content-Type": "application/json"
-    }
+# Relations whose source or target object was matched to a node are only
+# scored against the edges within this many hops of those nodes (1: the edges
+# touching them); 0 always scores every edge in the graph.
+RELATION_CANDIDATE_HOPS = int(os.getenv("RELATION_CANDIDATE_HOPS", "1"))
 
-    response = requests.post(url, json=payload, headers=headers)
+# /searchAll/stream?highlight=true sends the ids matched so far at most this
+# often (seconds), and once more when the search ends.
+SEARCH_STREAM_HIGHLIGHT_SECONDS = float(os.getenv("SEARCH_STREAM_HIGHLIGHT_SECONDS", "0.25"))
 
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise HTTPException(status_code=response.status_code,
-                            detail="Error calculating embedding")
+# Time per search_all phase: "embedding" (observed by the endpoint), "matrix"
+# (embedding matrices of an inline graph), "scoring" and "neighbors"
+SEARCH_PHASE_SECONDS = REGISTRY.histogram("search_phase_seconds", "Time spent per search_all phase", ("phase",))
+
+def _field(entity: Any, name: str, default: Any = "") -> Any:
+    """Read a field from a query item that may be a plain dict or a pydantic model."""
+    if isinstance(entity, dict):
+        return entity.get(name, default)
+    return getattr(entity, name, default)
+
+def cached_calculate_embedding(text: str) -> Dict:
+    """Calculate embedding for a given text using the shared embedding client and its disk cache."""
+    return get_embedding_client().embed(text)
+
+def embedding_text(entity_id: str, definition: str) -> Optional[str]:
+    """Text embedded for an entity, or None if it has no definition."""
+    if not definition:
+        return None
+    return f"{entity_id}: {definition}"
 
 def calculate_string_embedding(entity_id: str, definition: str) -> Dict:
     """Create a string embedding from an entity ID and its definition with caching."""
-    if not definition:
+    text = embedding_text(entity_id, definition)
+    if text is None:
         return {}
-
-    # Create a string combining ID and definition
-    text = f"{entity_id}: {definition}"    
     return cached_calculate_embedding(text)
 
-def find_best_match_for_object(obj: Object, graph_data: GraphData, min_threshold: float = MIN_DOT_PRODUCT_THRESHOLD) -> Tuple[Optional[str], float]:
-    """Find the best matching node for a given object."""
-    # Calculate embedding for the object
-    assert obj.get("name", "") != "" or obj.get("definition", "") != ""
-    obj_embedding = calculate_string_embedding(obj.get("name", ""), obj.get("definition", ""))
+def query_embedding_texts(objects: List[Object], relations: List[Relation]) -> List[str]:
+    """Texts embedded for the query objects and relations themselves."""
+    texts = [embedding_text(_field(obj, "name"), _field(obj, "definition")) for obj in objects or []]
+    texts += [embedding_text(f"{_field(relation, 'source')}-{_field(relation, 'target')}", _field(relation, "definition")) for relation in relations or []]
+    return [text for text in texts if text is not None]
 
-    best_match_id = None
-    highest_score = -1
+def edge_embedding_text(edge: Edge, graph_data: GraphData) -> Optional[str]:
+    return embedding_text(f"{edge.source}-{edge.target}", graph_data.allValues.get(edge.id, {}).get("definition", ""))
 
-    for node_id, node_data in graph_data.allValues.items():
-        # Calculate embedding for this node
-        node_embedding = calculate_string_embedding(node_id, node_data.get("definition", ""))
+def search_embedding_texts(graph_data: GraphData, objects: List[Object], relations: List[Relation], relation_hops: int = RELATION_CANDIDATE_HOPS) -> List[str]:
+    """Texts search_all will embed, so they can be fetched in batches beforehand.
 
-        # Calculate similarity score
-        if "embedding" in obj_embedding and "embedding" in node_embedding:
-            score = sum(a * b for a, b in zip(obj_embedding["embedding"], node_embedding["embedding"]))
+    With relation_hops set, edge texts are left out: which edges a relation is
+    scored against is only known once the objects are matched, so search_all
+    fetches them itself (see its prefetch argument).
+    """
+    texts = query_embedding_texts(objects, relations)
+    if objects:
+        texts += [embedding_text(node.id, graph_data.allValues.get(node.id, {}).get("definition", "")) for node in graph_data.nodes]
+    if relations and relation_hops <= 0:
+        texts += [edge_embedding_text(edge, graph_data) for edge in graph_data.edges]
+    return [text for text in texts if text is not None]
 
-            # Update best match if this score is higher and above threshold
-            if score > highest_score and score > min_threshold:
-                highest_score = score
-                best_match_id = node_id
+def build_node_matrix(graph_data: GraphData) -> EmbeddingMatrix:
+    """Embed every node that has a definition and stack the vectors into a matrix."""
+    def items():
+        for node in graph_data.nodes:
+            node_embedding = calculate_string_embedding(node.id, graph_data.allValues.get(node.id, {}).get("definition", ""))
+            if "embedding" in node_embedding:
+                yield node.id, node_embedding["embedding"]
+    return EmbeddingMatrix.from_embeddings(items())
 
-    return best_match_id, 0 if best_match_id is None else highest_score
+def build_edge_matrix(graph_data: GraphData, edges: Optional[Iterable[Edge]] = None) -> EmbeddingMatrix:
+    """Embed every edge (or just the given edges) that has a definition and stack the vectors into a matrix."""
+    def items():
+        for edge in graph_data.edges if edges is None else edges:
+            edge_embedding = calculate_string_embedding(f"{edge.source}-{edge.target}", graph_data.allValues.get(edge.id, {}).get("definition", ""))
+            if "embedding" in edge_embedding:
+                yield edge.id, edge_embedding["embedding"]
+    return EmbeddingMatrix.from_embeddings(items())
 
-def find_best_match_for_relation(relation: Relation, graph_data: GraphData, min_threshold: float = MIN_DOT_PRODUCT_THRESHOLD) -> Tuple[Optional[str], float]:
-    """Find the best matching edge for a given relation."""
-    # Calculate embedding for the relation
-    source = relation.get("source", "")
-    target = relation.get("target", "")
-    definition = relation.get("definition", "")
+def _object_embedding(obj: Object) -> Dict:
+    name = _field(obj, "name")
+    definition = _field(obj, "definition")
+    assert name != "" or definition != ""
+    return calculate_string_embedding(name, definition)
+
+def _relation_embedding(relation: Relation) -> Dict:
+    source = _field(relation, "source")
+    target = _field(relation, "target")
     assert source != "" and target != ""
-    relation_embedding = calculate_string_embedding(f"{source}-{target}", definition)
+    return calculate_string_embedding(f"{source}-{target}", _field(relation, "definition"))
 
-    best_match_id = None
-    highest_score = -1
+def find_top_matches_for_object(obj: Object, graph_data: GraphData, k: int, min_threshold: float = MIN_DOT_PRODUCT_THRESHOLD, node_matrix: Optional[EntityScorer] = None) -> List[Tuple[str, float]]:
+    """Find up to k best matching nodes for a given object, best first."""
+    obj_embedding = _object_embedding(obj)
+    if node_matrix is None:
+        node_matrix = build_node_matrix(graph_data)
+    if "embedding" not in obj_embedding:
+        return []
+    return node_matrix.top_k(obj_embedding["embedding"], k, min_threshold)
 
-    for edge in graph_data.edges:
-        # Calculate embedding for this edge
-        edge_embedding = calculate_string_embedding(f"{edge.source}-{edge.target}", graph_data.allValues.get(edge.id, {}).get("definition", ""))
+def find_top_matches_for_relation(relation: Relation, graph_data: GraphData, k: int, min_threshold: float = MIN_DOT_PRODUCT_THRESHOLD, edge_matrix: Optional[EntityScorer] = None, candidate_ids: Optional[List[str]] = None) -> List[Tuple[str, float]]:
+    """Find up to k best matching edges for a given relation, best first.
 
-        # Calculate similarity score
-        if "embedding" in relation_embedding and "embedding" in edge_embedding:
-            score = sum(a * b for a, b in zip(relation_embedding["embedding"], edge_embedding["embedding"]))
+    With candidate_ids (see relation_candidate_edges) only those edges are scored.
+    """
+    relation_embedding = _relation_embedding(relation)
+    if edge_matrix is None:
+        if candidate_ids is None:
+            edge_matrix = build_edge_matrix(graph_data)
+        else:
+            wanted = set(candidate_ids)
+            edge_matrix = build_edge_matrix(graph_data, [edge for edge in graph_data.edges if edge.id in wanted])
+    if "embedding" not in relation_embedding:
+        return []
+    if candidate_ids is not None:
+        return edge_matrix.top_k_among(relation_embedding["embedding"], candidate_ids, k, min_threshold)
+    return edge_matrix.top_k(relation_embedding["embedding"], k, min_threshold)
+
+def find_best_match_for_object(obj: Object, graph_data: GraphData, min_threshold: float = MIN_DOT_PRODUCT_THRESHOLD, node_matrix: Optional[EntityScorer] = None) -> Tuple[Optional[str], float]:
+    """Find the best matching node for a given object."""
+    matches = find_top_matches_for_object(obj, graph_data, 1, min_threshold, node_matrix)
+    return matches[0] if matches else (None, 0)
 
-            # Update best match if this score is higher and above threshold
-            if score > highest_score and score > min_threshold:
-                highest_score = score
-                best_match_id = edge.id
+def find_best_match_for_relation(relation: Relation, graph_data: GraphData, min_threshold: float = MIN_DOT_PRODUCT_THRESHOLD, edge_matrix: Optional[EntityScorer] = None, candidate_ids: Optional[List[str]] = None) -> Tuple[Optional[str], float]:
+    """Find the best matching edge for a given relation."""
+    matches = find_top_matches_for_relation(relation, graph_data, 1, min_threshold, edge_matrix, candidate_ids)
+    return matches[0] if matches else (None, 0)
 
-    return best_match_id, 0 if best_match_id is None else highest_score
+def resolve_relation_endpoints(relation: Relation, object_matches: Dict[str, str], node_ids: Set[str]) -> List[str]:
+    """Node ids of a relation's source and target: the nodes their query objects matched, or nodes with that id."""
+    endpoints = []
+    for name in (_field(relation, "source"), _field(relation, "target")):
+        node_id = object_matches.get(name) or (name if name in node_ids else None)
+        if node_id is not None and node_id not in endpoints:
+            endpoints.append(node_id)
+    return endpoints
 
-def get_neighbors(entity_id: str, graph_data: GraphData, matched_entities: Set[str], node_ids: Set[str], edge_ids: Set[str]) -> List[str]:
-    """Get direct neighbors (only IDs) for a given entity (node or edge)."""
-    neighbors = []
+def relation_candidate_edges(endpoint_ids: List[str], adjacency: Adjacency, hops: int = RELATION_CANDIDATE_HOPS) -> List[str]:
+    """Ids of the edges within hops hops of the endpoint nodes; one hop is the edges touching them.
+
+    This is O(degree) for one hop, against O(E) for scoring the whole graph.
+    """
+    candidates: Dict[str, None] = {}
+    seen = set(endpoint_ids)
+    frontier = list(endpoint_ids)
+    for _ in range(hops):
+        next_frontier = []
+        for node_id in frontier:
+            for edge in adjacency.incident_edges(node_id):
+                if edge.id in candidates:
+                    continue
+                candidates[edge.id] = None
+                for other in (edge.source, edge.target):
+                    if other not in seen:
+                        seen.add(other)
+                        next_frontier.append(other)
+        frontier = next_frontier
+    return list(candidates)
+
+def get_neighbors(entity_id: str, graph_data: GraphData, matched_entities: Set[str], node_ids: Set[str], edge_ids: Set[str], adjacency: Optional[Adjacency] = None) -> List[str]:
+    """Get direct neighbors (only IDs) for a given entity (node or edge).
+
+    Pass a prebuilt Adjacency to make the lookup O(degree) instead of O(E).
+    """
+    if adjacency is None:
+        adjacency = Adjacency.from_graph(graph_data)
+
+    # Keys of a dict keep insertion order and make de-duplication O(1)
+    neighbors: Dict[str, None] = {}
 
     if entity_id in edge_ids:
         # This is an edge, return its source and target if not already matched
-        for edge in graph_data.edges:
-            if edge.id == entity_id:
-                if edge.source not in matched_entities:
-                    neighbors.append(edge.source)
-                if edge.target not in matched_entities:
-                    neighbors.append(edge.target)
-                break
+        edge = adjacency.edge(entity_id)
+        if edge is not None:
+            if edge.source not in matched_entities:
+                neighbors[edge.source] = None
+            if edge.target not in matched_entities:
+                neighbors[edge.target] = None
     elif entity_id in node_ids:
-        # This is a node, find all edges connected to it
-        for edge in graph_data.edges:
+        # This is a node, return the other end of every edge connected to it
+        for edge in adjacency.incident_edges(entity_id):
             if edge.source == entity_id and edge.target not in matched_entities:
-                neighbors.append(edge.target)
-                if edge not in neighbors:
-                    neighbors.append(edge)
+                neighbors[edge.target] = None
             elif edge.target == entity_id and edge.source not in matched_entities:
-                neighbors.append(edge.source)
-                if edge not in neighbors:
-                    neighbors.append(edge)
+                neighbors[edge.source] = None
 
-    return neighbors
+    return list(neighbors)
 
-def search_all(graph_data: GraphData, objects: List[Object], relations: List[Relation], min_threshold: float = MIN_DOT_PRODUCT_THRESHOLD) -> Dict[str, Any]:
-    """Search the graph for all relevant nodes and edges based on the query objects and relations."""
+def iter_search_all(graph_data: GraphData, objects: List[Object], relations: List[Relation], min_threshold: float = MIN_DOT_PRODUCT_THRESHOLD, top_k: Optional[int] = None, node_matrix: Optional[EntityScorer] = None, edge_matrix: Optional[EntityScorer] = None, adjacency: Optional[Adjacency] = None, node_ids: Optional[Set[str]] = None, relation_hops: int = RELATION_CANDIDATE_HOPS, prefetch: Optional[Callable[[List[str]], Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Match the query objects, then relations, against the graph, yielding one link per match as it is scored.
+
+    When top_k is set, every link also carries up to top_k scored candidates.
+    Prebuilt node/edge scorers (e.g. the server graph's ANN indexes), adjacency
+    and node id set are used instead of deriving them from the graph when given.
+
+    Objects are matched first. A relation whose source or target names a
+    matched object (or a node id) is then only scored against the edges within
+    relation_hops hops of those nodes; the others, or all relations with
+    relation_hops=0, are scored against every edge. Without an edge scorer,
+    only the edges some relation needs are embedded, fetched through
+    prefetch (e.g. a batched embed_many) first when given.
+    """
     # Create optimized lookup structures once
-    node_ids = {node.id for node in graph_data.nodes}
-    edge_ids = {edge.id for edge in graph_data.edges}
+    if node_ids is None:
+        node_ids = {node.id for node in graph_data.nodes}
+    if adjacency is None:
+        adjacency = Adjacency.from_graph(graph_data)
+    edge_ids = adjacency.edges.keys()
     
-    # If no query objects or relations are provided, return empty results
+    # If no query objects or relations are provided, there is nothing to match
     if not objects and not relations:
-        return {"nodes": [], "edges": [], "links": []}
+        return
+
+    # Embed the nodes once per search; every query is then a single matrix-vector product
+    if objects and node_matrix is None:
+        with SEARCH_PHASE_SECONDS.time(phase="matrix"):
+            node_matrix = build_node_matrix(graph_data)
     
     # Initialize variables to track matched entities
     matched_nodes: Set[str] = set()
     matched_edges: Set[str] = set()
-    links = []
+    # Query object name -> the node it matched, to anchor relations
+    object_matches: Dict[str, str] = {}
+    scoring_seconds = neighbor_seconds = 0.0
 
     # Process each object in the query
     for obj in objects:
-        result = find_best_match_for_object(obj, graph_data, min_threshold)
+        started = time.perf_counter()
+        candidates = None
+        if top_k:
+            candidates = find_top_matches_for_object(obj, graph_data, top_k, min_threshold, node_matrix)
+            result = candidates[0] if candidates else (None, 0)
+        else:
+            result = find_best_match_for_object(obj, graph_data, min_threshold, node_matrix)
         if isinstance(result, tuple) and len(result) == 2:
             best_match_id, _ = result
         else:
             best_match_id = result
+        scored = time.perf_counter()
+        scoring_seconds += scored - started
 
         # If we found a match, add it to the results
         if best_match_id:
             matched_nodes.add(best_match_id)
+            object_matches.setdefault(_field(obj, "name"), best_match_id)
 
             # Add direct neighbors (only IDs)
-            neighbors = get_neighbors(best_match_id, graph_data, matched_nodes, node_ids, edge_ids)
-            links.append({"node": best_match_id, "neighbors": neighbors})
+            neighbors = get_neighbors(best_match_id, graph_data, matched_nodes, node_ids, edge_ids, adjacency)
+            neighbor_seconds += time.perf_counter() - scored
+            link = {"node": best_match_id, "neighbors": neighbors}
+            if candidates is not None:
+                link["candidates"] = [{"id": match_id, "score": score} for match_id, score in candidates]
+            yield link
 
-    # Process each relation in the query
+    # Edges each relation is scored against; None means the whole graph
+    candidate_edges: List[Optional[List[str]]] = []
     for relation in relations:
-        result = find_best_match_for_relation(relation, graph_data, min_threshold)
+        endpoints = resolve_relation_endpoints(relation, object_matches, node_ids) if relation_hops > 0 else []
+        candidate_edges.append(relation_candidate_edges(endpoints, adjacency, relation_hops) if endpoints else None)
+
+    if relations and edge_matrix is None:
+        with SEARCH_PHASE_SECONDS.time(phase="matrix"):
+            if any(candidate_ids is None for candidate_ids in candidate_edges):
+                needed = graph_data.edges
+            else:
+                needed = [adjacency.edge(edge_id) for edge_id in dict.fromkeys(edge_id for candidate_ids in candidate_edges for edge_id in candidate_ids)]
+            if prefetch is not None:
+                prefetch([text for text in (edge_embedding_text(edge, graph_data) for edge in needed) if text is not None])
+            edge_matrix = build_edge_matrix(graph_data, needed)
+
+    # Process each relation in the query
+    for relation, candidate_ids in zip(relations, candidate_edges):
+        started = time.perf_counter()
+        candidates = None
+        if top_k:
+            candidates = find_top_matches_for_relation(relation, graph_data, top_k, min_threshold, edge_matrix, candidate_ids)
+            result = candidates[0] if candidates else (None, 0)
+        else:
+            result = find_best_match_for_relation(relation, graph_data, min_threshold, edge_matrix, candidate_ids)
         if isinstance(result, tuple) and len(result) == 2:
             best_match_id, _ = result
         else:
             best_match_id = result
+        scored = time.perf_counter()
+        scoring_seconds += scored - started
 
         # If we found a match, add it to the results
         if best_match_id:
             matched_edges.add(best_match_id)
 
             # Add direct neighbors (only IDs)
-            neighbors = get_neighbors(best_match_id, graph_data, matched_edges, node_ids, edge_ids)
-            links.append({"edge": best_match_id, "neighbors": neighbors})
+            neighbors = get_neighbors(best_match_id, graph_data, matched_edges, node_ids, edge_ids, adjacency)
+            neighbor_seconds += time.perf_counter() - scored
+            link = {"edge": best_match_id, "neighbors": neighbors}
+            if candidates is not None:
+                link["candidates"] = [{"id": match_id, "score": score} for match_id, score in candidates]
+            yield link
+
+    SEARCH_PHASE_SECONDS.observe(scoring_seconds, phase="scoring")
+    SEARCH_PHASE_SECONDS.observe(neighbor_seconds, phase="neighbors")
+
+def search_all(graph_data: GraphData, objects: List[Object], relations: List[Relation], **options) -> Dict[str, Any]:
+    """Search the graph for all relevant nodes and edges based on the query objects and relations.
+
+    Takes the options of iter_search_all and returns its links together with
+    the matched nodes and edges.
+    """
+    links = list(iter_search_all(graph_data, objects, relations, **options))
+    matched_nodes = {link["node"] for link in links if "node" in link}
+    matched_edges = {link["edge"] for link in links if "edge" in link}
 
     # Prepare the response with matched nodes, edges, and links
     return {
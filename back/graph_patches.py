@@ -0,0 +1,93 @@
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+# --- Configuration ---
+# Number of recent patches kept for clients that reconnect with Last-Event-ID.
+PATCH_LOG_SIZE = int(os.getenv("PATCH_LOG_SIZE", "1000"))
+
+
+def graph_patch(base_version: int, version: int,
+                added_nodes: Iterable[Dict[str, Any]] = (), updated_nodes: Iterable[Dict[str, Any]] = (), removed_nodes: Iterable[str] = (),
+                added_edges: Iterable[Dict[str, Any]] = (), updated_edges: Iterable[Dict[str, Any]] = (), removed_edges: Iterable[str] = (),
+                all_values: Optional[Dict[str, Any]] = None, removed_values: Iterable[str] = ()) -> Dict[str, Any]:
+    """Build the payload of a ``graph_patch`` SSE event taking base_version to version.
+
+    Added and updated entities are sent whole (they are small), removals as ids.
+    ``allValues`` carries the full new values of entities whose values changed,
+    and clients replace their entry with it rather than merge it, so keys the
+    server dropped disappear too; ``removed.allValues`` lists the ids whose
+    values were deleted.
+    """
+    patch = {
+        "base_version": base_version,
+        "version": version,
+        "added": {"nodes": list(added_nodes), "edges": list(added_edges)},
+        "updated": {"nodes": list(updated_nodes), "edges": list(updated_edges)},
+        "removed": {"nodes": list(removed_nodes), "edges": list(removed_edges)},
+    }
+    removed_values = list(removed_values)
+    if removed_values:
+        patch["removed"]["allValues"] = removed_values
+    if all_values:
+        patch["allValues"] = all_values
+    return patch
+
+
+def batch_patch(base_version: int, version: int, touched: Dict[str, Dict[str, bool]],
+                nodes: Dict[str, Dict[str, Any]], edges: Dict[str, Dict[str, Any]], all_values: Dict[str, Any]) -> Dict[str, Any]:
+    """Net graph_patch of a batch, from the ids it touched and the resulting graph.
+
+    ``touched`` maps every id to whether it existed before the batch, so an
+    entity created and deleted within the same batch does not appear at all.
+    """
+    def split(touched_ids: Dict[str, bool], current: Dict[str, Any]):
+        added, updated, removed = [], [], []
+        for entity_id, existed in touched_ids.items():
+            if entity_id in current:
+                (updated if existed else added).append(entity_id)
+            elif existed:
+                removed.append(entity_id)
+        return added, updated, removed
+
+    added_nodes, updated_nodes, removed_nodes = split(touched["nodes"], nodes)
+    added_edges, updated_edges, removed_edges = split(touched["edges"], edges)
+    added_values, updated_values, removed_values = split(touched["allValues"], all_values)
+    return graph_patch(
+        base_version, version,
+        added_nodes=[nodes[i] for i in added_nodes], updated_nodes=[nodes[i] for i in updated_nodes], removed_nodes=removed_nodes,
+        added_edges=[edges[i] for i in added_edges], updated_edges=[edges[i] for i in updated_edges], removed_edges=removed_edges,
+        all_values={i: all_values[i] for i in added_values + updated_values}, removed_values=removed_values
+    )
+
+
+class PatchLog:
+    """Bounded history of graph patches, used to catch up reconnecting clients."""
+
+    def __init__(self, maxlen: int = PATCH_LOG_SIZE):
+        self._patches: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+
+    def __len__(self) -> int:
+        return len(self._patches)
+
+    def append(self, patch: Dict[str, Any]):
+        if self._patches and self._patches[-1]["version"] != patch["base_version"]:
+            # A gap can not be replayed across; start a new history
+            self._patches.clear()
+        self._patches.append(patch)
+
+    def clear(self):
+        """Forget all history, e.g. after the whole graph was replaced."""
+        self._patches.clear()
+
+    def since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """Patches that take a client from version to the latest one.
+
+        Returns None when the history does not reach back to version, in which
+        case the client needs a full snapshot.
+        """
+        if not self._patches or version < self._patches[0]["base_version"]:
+            return None
+        if version > self._patches[-1]["version"]:
+            return None
+        return [patch for patch in self._patches if patch["version"] > version]
@@ -0,0 +1,258 @@
+import os
+import mmap
+import zlib
+import struct
+import asyncio
+from sys import intern
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from json_codec import dumps, loads
+from graph_records import NodeRecord, EdgeRecord, gc_paused
+from metrics import REGISTRY
+
+# --- Configuration ---
+# Directory the server graph is persisted to as a snapshot plus a log of the
+# mutations since; empty keeps the graph in memory only.
+GRAPH_PERSIST_DIR = os.getenv("GRAPH_PERSIST_DIR", "")
+# A new snapshot is written, and the log restarted, once the log holds this
+# many mutations or bytes.
+GRAPH_SNAPSHOT_EVERY = int(os.getenv("GRAPH_SNAPSHOT_EVERY", "50000"))
+GRAPH_LOG_MAX_BYTES = int(os.getenv("GRAPH_LOG_MAX_BYTES", str(64 * 1024 * 1024)))
+# fsync every log append (survives power loss) instead of only handing it to the OS (survives crashes).
+GRAPH_LOG_FSYNC = os.getenv("GRAPH_LOG_FSYNC", "false").lower() in ("1", "true", "yes")
+
+SNAPSHOT_FILE = "graph.snap"
+SNAPSHOT_MAGIC = b"LGSNAP01"
+_U32 = struct.Struct("<I")
+# Log entry header: payload length and CRC32 of the payload
+_ENTRY = struct.Struct("<II")
+
+GRAPH_SNAPSHOT_SECONDS = REGISTRY.histogram("graph_snapshot_seconds", "Time to write a snapshot of the server graph")
+GRAPH_LOG_ENTRIES = REGISTRY.counter("graph_log_entries", "Mutations appended to the graph log")
+
+# (version after the mutation, graph bus method, its arguments)
+LogEntry = Tuple[int, str, List[Any]]
+# (version, nodes, edges, allValues)
+GraphState = Tuple[int, List[NodeRecord], List[EdgeRecord], Dict[str, Any]]
+
+
+class GraphPersistenceError(RuntimeError):
+    """Raised for a snapshot that can not be read or written."""
+
+
+def _pack_strings(strings: Sequence[str]) -> Tuple[bytes, bytes]:
+    """Character offsets (int64) and the UTF-8 text of strings laid end to end."""
+    offsets = np.zeros(len(strings) + 1, dtype="<i8")
+    np.cumsum(np.fromiter(map(len, strings), dtype=np.int64, count=len(strings)), out=offsets[1:])
+    return offsets.tobytes(), "".join(strings).encode("utf-8")
+
+
+def _unpack_strings(offsets: np.ndarray, text: str) -> List[str]:
+    bounds = offsets.tolist()
+    return list(map(text.__getitem__, map(slice, bounds[:-1], bounds[1:])))
+
+
+def write_snapshot(path: str, state: GraphState):
+    """Write state as a binary snapshot: a JSON header, then string tables and index arrays.
+
+    Node ids are stored once; edge endpoints are uint32 indexes into them.
+    The file is written next to path and renamed over it, so a crash leaves
+    the previous snapshot in place.
+    """
+    version, nodes, edges, all_values = state
+    names = [node.id for node in nodes]
+    index = {name: i for i, name in enumerate(names)}
+    for edge in edges:
+        # Endpoints without a node of their own still get a name
+        for end in (edge.source, edge.target):
+            if end not in index:
+                index[end] = len(names)
+                names.append(end)
+
+    sections: Dict[str, bytes] = {}
+    sections["names_offsets"], sections["names"] = _pack_strings(names)
+    sections["node_labels_offsets"], sections["node_labels"] = _pack_strings([node.label for node in nodes])
+    sections["edge_ids_offsets"], sections["edge_ids"] = _pack_strings([edge.id for edge in edges])
+    sections["edge_labels_offsets"], sections["edge_labels"] = _pack_strings([edge.label for edge in edges])
+    ends = np.fromiter((index[end] for edge in edges for end in (edge.source, edge.target)), dtype="<u4", count=2 * len(edges))
+    sections["edge_ends"] = ends.tobytes()
+    sections["all_values"] = dumps(all_values)
+
+    layout = {}
+    offset = 0
+    for name, data in sections.items():
+        layout[name] = [offset, len(data)]
+        offset += len(data)
+    header = dumps({"version": version, "nodes": len(nodes), "edges": len(edges), "names": len(names), "sections": layout})
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + _U32.pack(len(header)) + header)
+        for data in sections.values():
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Optional[GraphState]:
+    """Memory-map a snapshot written by write_snapshot and rebuild its records; None if there is none."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    # Millions of new objects; the cycle collector would only rescan them
+    with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, gc_paused():
+        if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise GraphPersistenceError(f"{path} is not a graph snapshot")
+        start = len(SNAPSHOT_MAGIC) + _U32.size
+        header_size = _U32.unpack_from(mapped, len(SNAPSHOT_MAGIC))[0]
+        header = loads(mapped[start:start + header_size])
+        base = start + header_size
+
+        def section(name: str) -> bytes:
+            offset, size = header["sections"][name]
+            return mapped[base + offset:base + offset + size]
+
+        def strings(name: str, count: int) -> List[str]:
+            offsets = np.frombuffer(section(name + "_offsets"), dtype="<i8", count=count + 1)
+            return _unpack_strings(offsets, section(name).decode("utf-8"))
+
+        names = [intern(name) for name in strings("names", header["names"])]
+        node_labels = strings("node_labels", header["nodes"])
+        edge_ids = strings("edge_ids", header["edges"])
+        edge_labels = strings("edge_labels", header["edges"])
+        ends = np.frombuffer(section("edge_ends"), dtype="<u4", count=2 * header["edges"]).tolist()
+        all_values = loads(section("all_values"))
+
+        nodes = list(map(NodeRecord, names[:header["nodes"]], map(intern, node_labels)))
+        edges = [EdgeRecord(names[ends[2 * i]], names[ends[2 * i + 1]], intern(edge_labels[i]), intern(edge_ids[i])) for i in range(header["edges"])]
+    return header["version"], nodes, edges, all_values
+
+
+class GraphPersistence:
+    """Durable copy of the server graph: a binary snapshot plus a log of later mutations.
+
+    Every committed graph bus mutation is appended to the current log file
+    (``log-<version>.bin``, named after the version it starts from) before
+    it is acknowledged. Once the log reaches ``snapshot_every`` entries or
+    ``max_log_bytes``, a snapshot of the graph is written in a worker thread
+    while new mutations go to a fresh log; when the snapshot is in place the
+    older logs are deleted. Loading the whole graph is not logged, it is
+    checkpointed straight away.
+
+    If an append fails the log has a gap, so nothing more is appended until
+    a snapshot covering the graph has been written (``log_damaged``).
+
+    Recovery memory-maps the snapshot and replays the log entries after its
+    version. A torn entry at the end of a log (a crash mid-append) ends the
+    replay of that log.
+    """
+
+    def __init__(self, directory: str, snapshot_every: int = GRAPH_SNAPSHOT_EVERY,
+                 max_log_bytes: int = GRAPH_LOG_MAX_BYTES, fsync: bool = GRAPH_LOG_FSYNC):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.max_log_bytes = max_log_bytes
+        self.fsync = fsync
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self._log = None
+        self._log_path: Optional[str] = None
+        self._log_entries = 0
+        self.log_damaged = False
+        self._checkpoint: Optional[asyncio.Task] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _log_files(self) -> List[str]:
+        names = [name for name in os.listdir(self.directory) if name.startswith("log-") and name.endswith(".bin")]
+        return [os.path.join(self.directory, name) for name in sorted(names, key=lambda name: int(name[4:-4]))]
+
+    def read_snapshot(self) -> Optional[GraphState]:
+        return read_snapshot(self.snapshot_path)
+
+    def read_log(self, after_version: int) -> Iterator[LogEntry]:
+        """Logged mutations that produced versions above after_version, oldest first."""
+        for path in self._log_files():
+            with open(path, "rb") as f:
+                data = f.read()
+            offset = 0
+            while offset + _ENTRY.size <= len(data):
+                size, checksum = _ENTRY.unpack_from(data, offset)
+                payload = data[offset + _ENTRY.size:offset + _ENTRY.size + size]
+                if len(payload) < size or zlib.crc32(payload) != checksum:
+                    print(f"Graph persistence: ignoring a torn entry at byte {offset} of {path}")
+                    break
+                offset += _ENTRY.size + size
+                entry = loads(payload)
+                if entry["v"] > after_version:
+                    yield entry["v"], entry["m"], entry["a"]
+
+    def open_log(self, version: int):
+        """Start a new log for the mutations after version."""
+        if self._log is not None:
+            self._log.close()
+        self._log_path = os.path.join(self.directory, f"log-{version}.bin")
+        # Anything already in a log starting here was never applied to this graph
+        self._log = open(self._log_path, "wb")
+        self._log_entries = 0
+
+    def append(self, version: int, method: str, args: List[Any]):
+        """Log the mutation that produced version."""
+        payload = dumps({"v": version, "m": method, "a": args})
+        try:
+            self._log.write(_ENTRY.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+        except Exception:
+            self.log_damaged = True
+            raise
+        self._log_entries += 1
+        GRAPH_LOG_ENTRIES.inc()
+
+    @property
+    def needs_checkpoint(self) -> bool:
+        if self.log_damaged or self._log_entries >= self.snapshot_every:
+            return True
+        return self._log is not None and self._log.tell() >= self.max_log_bytes
+
+    @property
+    def checkpointing(self) -> bool:
+        return self._checkpoint is not None and not self._checkpoint.done()
+
+    async def checkpoint(self, state: GraphState, wait: bool = True):
+        """Snapshot state and restart the log from its version.
+
+        state must be a copy the caller will not mutate. Only one snapshot is
+        written at a time; with wait=False the write runs in the background,
+        with wait=True a failed write raises GraphPersistenceError.
+        """
+        if self.checkpointing:
+            await self._checkpoint
+        self.open_log(state[0])
+        self._checkpoint = asyncio.create_task(self._write_checkpoint(state, self._log_path))
+        if wait:
+            if not await self._checkpoint:
+                raise GraphPersistenceError(f"Could not write a snapshot of version {state[0]}")
+            self.log_damaged = False
+
+    async def _write_checkpoint(self, state: GraphState, current_log: str) -> bool:
+        try:
+            with GRAPH_SNAPSHOT_SECONDS.time():
+                await asyncio.to_thread(write_snapshot, self.snapshot_path, state)
+        except Exception as e:
+            print(f"Graph persistence: writing the snapshot failed, keeping the previous one and its logs: {e}")
+            return False
+        for path in self._log_files():
+            if path != current_log:
+                os.remove(path)
+        return True
+
+    async def close(self):
+        if self.checkpointing:
+            await self._checkpoint
+        if self._log is not None:
+            self._log.close()
+            self._log = None
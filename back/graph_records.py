@@ -0,0 +1,159 @@
+import gc
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from sys import intern
+from typing import Any, Dict, List, Tuple
+
+
+@dataclass(slots=True)
+class NodeRecord:
+    """Server-side node: two interned strings, no per-instance dict."""
+    id: str
+    label: str
+
+    @classmethod
+    def from_dict(cls, node: Dict[str, Any]) -> "NodeRecord":
+        return cls(intern(node["id"]), intern(node["label"]))
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"id": self.id, "label": self.label}
+
+
+@dataclass(slots=True)
+class EdgeRecord:
+    """Server-side edge. Endpoints are interned, so they share the node id strings."""
+    source: str
+    target: str
+    label: str
+    id: str
+
+    @classmethod
+    def from_dict(cls, edge: Dict[str, Any]) -> "EdgeRecord":
+        return cls(intern(edge["source"]), intern(edge["target"]), intern(edge["label"]), intern(edge["id"]))
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"source": self.source, "target": self.target, "label": self.label, "id": self.id}
+
+
+class CompactGraph:
+    """GraphData-shaped view over records, read by graph_matching without pydantic models."""
+
+    __slots__ = ("nodes", "edges", "allValues")
+
+    def __init__(self, nodes: List[NodeRecord], edges: List[EdgeRecord], all_values: Dict[str, Any]):
+        self.nodes = nodes
+        self.edges = edges
+        self.allValues = all_values
+
+
+class GraphPayloadError(ValueError):
+    """Raised by parse_graph_payload; ``errors`` uses pydantic's error layout."""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} validation error(s)")
+        self.errors = errors
+
+
+_gc_pause_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+
+@contextmanager
+def gc_paused():
+    """Skip cyclic GC passes while allocating many records; none of them form cycles.
+
+    GC is process-wide and loads run in worker threads, so pauses are counted:
+    it is re-enabled when the last overlapping one ends.
+    """
+    global _gc_pauses, _gc_was_enabled
+    with _gc_pause_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_pause_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+
+NODE_FIELDS = ("id", "label")
+EDGE_FIELDS = ("source", "target", "label", "id")
+MAX_REPORTED_ERRORS = 20
+_MISSING = object()
+
+
+def parse_graph_payload(payload: Any) -> Tuple[List[NodeRecord], List[EdgeRecord], Dict[str, Any]]:
+    """Validate a decoded GraphData body and build records straight from it.
+
+    Applies the same rules as the GraphData model (required string fields,
+    extra keys ignored) with plain type checks, skipping the per-element
+    pydantic instances and the ``.dict()`` round trip.
+    """
+    try:
+        # Well-formed payloads: intern() only accepts exact str, so building
+        # the records is the type check
+        with gc_paused():
+            nodes = [NodeRecord.from_dict(node) for node in payload["nodes"]]
+            edges = [EdgeRecord.from_dict(edge) for edge in payload["edges"]]
+        all_values = payload["allValues"]
+        if isinstance(all_values, dict) and isinstance(payload["nodes"], list) and isinstance(payload["edges"], list):
+            return nodes, edges, {intern(key): value for key, value in all_values.items()}
+    except (KeyError, TypeError):
+        pass
+    return _parse_with_errors(payload)
+
+
+def _parse_with_errors(payload: Any) -> Tuple[List[NodeRecord], List[EdgeRecord], Dict[str, Any]]:
+    """Slow path of parse_graph_payload that collects every error it finds."""
+    errors = []
+
+    def error(loc, msg, kind):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"loc": ["body", *loc], "msg": msg, "type": kind})
+
+    if not isinstance(payload, dict):
+        raise GraphPayloadError([{"loc": ["body"], "msg": "Input should be a valid dictionary", "type": "dict_type"}])
+
+    def records(key, fields, build):
+        items = payload.get(key)
+        if items is None:
+            error([key], "Field required", "missing")
+            return []
+        if not isinstance(items, list):
+            error([key], "Input should be a valid list", "list_type")
+            return []
+        result = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                error([key, index], "Input should be a valid dictionary", "dict_type")
+                continue
+            valid = True
+            for field in fields:
+                value = item.get(field, _MISSING)
+                if value is _MISSING:
+                    error([key, index, field], "Field required", "missing")
+                    valid = False
+                elif type(value) is not str:
+                    error([key, index, field], "Input should be a valid string", "string_type")
+                    valid = False
+            if valid:
+                result.append(build(item))
+        return result
+
+    nodes = records("nodes", NODE_FIELDS, NodeRecord.from_dict)
+    edges = records("edges", EDGE_FIELDS, EdgeRecord.from_dict)
+    all_values = payload.get("allValues")
+    if all_values is None:
+        error(["allValues"], "Field required", "missing")
+    elif not isinstance(all_values, dict):
+        error(["allValues"], "Input should be a valid dictionary", "dict_type")
+    if errors:
+        raise GraphPayloadError(errors)
+    # Interned keys share their string with the node or edge id
+    return nodes, edges, {intern(key): value for key, value in all_values.items()}
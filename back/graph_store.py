@@ -0,0 +1,340 @@
+import secrets
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from graph_records import NodeRecord, EdgeRecord
+
+
+class GraphStoreError(Exception):
+    """Base class for graph store errors."""
+
+
+class EntityNotFoundError(GraphStoreError, KeyError):
+    """Raised when a node or edge id does not exist."""
+
+
+class DuplicateIdError(GraphStoreError, ValueError):
+    """Raised when creating a node or edge whose id is already taken."""
+
+
+class InvalidOperationError(GraphStoreError, ValueError):
+    """Raised for a batch operation that is not understood."""
+
+
+class GraphStore:
+    """Indexed in-memory graph held by the server.
+
+    Nodes and edges are slotted records keyed by interned id (insertion
+    ordered, so the list view keeps creation order), every node id maps to the
+    ids of its incident edges, and ``version`` increases by one on every
+    mutation. Versions restart at 0 with the process, so ``epoch`` (random per
+    store) tells the versions of one run from another's. Mutations take
+    wire-format dicts. Single-entity changes are O(1); deleting a node is
+    O(degree).
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, NodeRecord] = {}
+        self.edges: Dict[str, EdgeRecord] = {}
+        self.all_values: Dict[str, Any] = {}
+        self.incident: Dict[str, Set[str]] = {}
+        self.version = 0
+        self.epoch = secrets.token_hex(4)
+
+    def _bump(self) -> int:
+        self.version += 1
+        return self.version
+
+    def _link(self, edge: EdgeRecord):
+        self.incident.setdefault(edge.source, set()).add(edge.id)
+        self.incident.setdefault(edge.target, set()).add(edge.id)
+
+    def _unlink(self, edge: EdgeRecord):
+        for node_id in (edge.source, edge.target):
+            edge_ids = self.incident.get(node_id)
+            if edge_ids is not None:
+                edge_ids.discard(edge.id)
+                if not edge_ids:
+                    del self.incident[node_id]
+
+    def load(self, nodes: Iterable[Dict[str, Any]], edges: Iterable[Dict[str, Any]], all_values: Dict[str, Any]) -> int:
+        """Replace the whole graph. Later duplicates of an id overwrite earlier ones."""
+        return self.load_records(
+            [NodeRecord.from_dict(node) for node in nodes],
+            [EdgeRecord.from_dict(edge) for edge in edges],
+            all_values
+        )
+
+    def load_records(self, nodes: Iterable[NodeRecord], edges: Iterable[EdgeRecord], all_values: Dict[str, Any], version: Optional[int] = None,
+                     epoch: Optional[str] = None) -> int:
+        """Replace the whole graph with already built records (see graph_records.parse_graph_payload).
+
+        ``version`` restores a replica at the version of the snapshot it was
+        taken from, instead of counting the load as a new mutation, and
+        ``epoch`` the run that version belongs to.
+        """
+        self.nodes = {node.id: node for node in nodes}
+        self.edges = {edge.id: edge for edge in edges}
+        self.all_values = all_values
+        incident: Dict[str, Set[str]] = {}
+        for edge in self.edges.values():
+            incident.setdefault(edge.source, set()).add(edge.id)
+            incident.setdefault(edge.target, set()).add(edge.id)
+        self.incident = incident
+        if epoch is not None:
+            self.epoch = epoch
+        if version is not None:
+            self.version = version
+            return version
+        return self._bump()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The graph in the ``{"nodes", "edges", "allValues"}`` wire format, as plain dicts."""
+        return {
+            "nodes": [node.to_dict() for node in self.nodes.values()],
+            "edges": [edge.to_dict() for edge in self.edges.values()],
+            "allValues": self.all_values
+        }
+
+    def incident_edges(self, node_id: str) -> List[EdgeRecord]:
+        return [self.edges[edge_id] for edge_id in self.incident.get(node_id, ())]
+
+    def add_node(self, node: Dict[str, Any]) -> int:
+        self._add_node(node)
+        return self._bump()
+
+    def update_node(self, node_id: str, node: Dict[str, Any]) -> int:
+        self._update_node(node_id, node)
+        return self._bump()
+
+    def delete_node(self, node_id: str) -> Tuple[int, List[str]]:
+        """Delete a node and its incident edges; returns the new version and removed edge ids."""
+        removed_edges = self._delete_node(node_id)
+        return self._bump(), removed_edges
+
+    def add_edge(self, edge: Dict[str, Any]) -> int:
+        self._add_edge(edge)
+        return self._bump()
+
+    def update_edge(self, edge_id: str, edge: Dict[str, Any]) -> int:
+        self._update_edge(edge_id, edge)
+        return self._bump()
+
+    def delete_edge(self, edge_id: str) -> int:
+        self._delete_edge(edge_id)
+        return self._bump()
+
+    def apply_batch(self, operations: List[Dict[str, Any]]) -> Tuple[int, Dict[str, Dict[str, bool]]]:
+        """Apply mixed node, edge and allValues operations atomically.
+
+        Every operation is a dict with ``op`` (create/update/delete), ``entity``
+        (node/edge/allValues), ``id`` (the target of update/delete) and ``data``.
+        The whole batch is validated against a staged overlay first, so the
+        store is untouched if any operation fails, and the version is bumped
+        once. Returns the new version and, per entity kind, every touched id
+        mapped to whether it existed before the batch.
+        """
+        staged = _StagedGraph(self)
+        for index, operation in enumerate(operations):
+            try:
+                staged.apply(operation)
+            except GraphStoreError as e:
+                raise type(e)(f"Operation {index}: {e.args[0]}") from e
+        for operation in operations:
+            self._apply(operation)
+        return self._bump(), staged.touched
+
+    def _apply(self, operation: Dict[str, Any]):
+        op, entity, entity_id, data = operation["op"], operation["entity"], operation.get("id"), operation.get("data")
+        if entity == "node":
+            if op == "create":
+                self._add_node(data)
+            elif op == "update":
+                self._update_node(entity_id, data)
+            else:
+                self._delete_node(entity_id)
+        elif entity == "edge":
+            if op == "create":
+                self._add_edge(data)
+            elif op == "update":
+                self._update_edge(entity_id, data)
+            else:
+                self._delete_edge(entity_id)
+        else:
+            if op == "create":
+                self.all_values[entity_id] = data
+            elif op == "update":
+                self.all_values[entity_id] = {**self.all_values[entity_id], **data}
+            else:
+                del self.all_values[entity_id]
+
+    def _add_node(self, node: Dict[str, Any]):
+        if node["id"] in self.nodes:
+            raise DuplicateIdError(f"Node {node['id']} already exists")
+        record = NodeRecord.from_dict(node)
+        self.nodes[record.id] = record
+
+    def _update_node(self, node_id: str, node: Dict[str, Any]):
+        if node_id not in self.nodes:
+            raise EntityNotFoundError(f"Node {node_id} not found")
+        if node["id"] != node_id:
+            if node["id"] in self.nodes:
+                raise DuplicateIdError(f"Node {node['id']} already exists")
+            del self.nodes[node_id]
+        record = NodeRecord.from_dict(node)
+        self.nodes[record.id] = record
+
+    def _delete_node(self, node_id: str) -> List[str]:
+        if node_id not in self.nodes:
+            raise EntityNotFoundError(f"Node {node_id} not found")
+        del self.nodes[node_id]
+        removed_edges = list(self.incident.get(node_id, ()))
+        for edge_id in removed_edges:
+            self._unlink(self.edges.pop(edge_id))
+        return removed_edges
+
+    def _add_edge(self, edge: Dict[str, Any]):
+        if edge["id"] in self.edges:
+            raise DuplicateIdError(f"Edge {edge['id']} already exists")
+        record = EdgeRecord.from_dict(edge)
+        self.edges[record.id] = record
+        self._link(record)
+
+    def _update_edge(self, edge_id: str, edge: Dict[str, Any]):
+        if edge_id not in self.edges:
+            raise EntityNotFoundError(f"Edge {edge_id} not found")
+        if edge["id"] != edge_id and edge["id"] in self.edges:
+            raise DuplicateIdError(f"Edge {edge['id']} already exists")
+        self._unlink(self.edges[edge_id])
+        if edge["id"] != edge_id:
+            del self.edges[edge_id]
+        record = EdgeRecord.from_dict(edge)
+        self.edges[record.id] = record
+        self._link(record)
+
+    def _delete_edge(self, edge_id: str):
+        if edge_id not in self.edges:
+            raise EntityNotFoundError(f"Edge {edge_id} not found")
+        self._unlink(self.edges.pop(edge_id))
+
+
+# Fields a node or edge needs to become a record
+_RECORD_FIELDS = {"node": ("id", "label"), "edge": ("id", "source", "target", "label")}
+
+
+class _StagedGraph:
+    """Overlay that replays a batch against a GraphStore without modifying it.
+
+    Only ids touched by the batch are tracked, so validation is O(batch) plus
+    the degree of deleted nodes.
+    """
+
+    def __init__(self, store: GraphStore):
+        self.store = store
+        self.nodes: Dict[str, bool] = {}
+        self.edges: Dict[str, Optional[Tuple[str, str]]] = {}
+        self.values: Dict[str, bool] = {}
+        # Whether the staged allValues of an id are a dict, which updates merge into
+        self.value_dicts: Dict[str, bool] = {}
+        self.touched: Dict[str, Dict[str, bool]] = {"nodes": {}, "edges": {}, "allValues": {}}
+
+    def has_node(self, node_id: str) -> bool:
+        return self.nodes[node_id] if node_id in self.nodes else node_id in self.store.nodes
+
+    def edge_ends(self, edge_id: str) -> Optional[Tuple[str, str]]:
+        if edge_id in self.edges:
+            return self.edges[edge_id]
+        edge = self.store.edges.get(edge_id)
+        return (edge.source, edge.target) if edge is not None else None
+
+    def has_values(self, entity_id: str) -> bool:
+        return self.values[entity_id] if entity_id in self.values else entity_id in self.store.all_values
+
+    def values_are_dict(self, entity_id: str) -> bool:
+        if entity_id in self.value_dicts:
+            return self.value_dicts[entity_id]
+        return isinstance(self.store.all_values.get(entity_id), dict)
+
+    def _set_node(self, node_id: str, present: bool):
+        self.touched["nodes"].setdefault(node_id, node_id in self.store.nodes)
+        self.nodes[node_id] = present
+
+    def _set_edge(self, edge_id: str, ends: Optional[Tuple[str, str]]):
+        self.touched["edges"].setdefault(edge_id, edge_id in self.store.edges)
+        self.edges[edge_id] = ends
+
+    def _set_values(self, entity_id: str, present: bool):
+        self.touched["allValues"].setdefault(entity_id, entity_id in self.store.all_values)
+        self.values[entity_id] = present
+
+    def apply(self, operation: Dict[str, Any]):
+        op, entity, entity_id, data = operation.get("op"), operation.get("entity"), operation.get("id"), operation.get("data")
+        if op not in ("create", "update", "delete") or entity not in ("node", "edge", "allValues"):
+            raise InvalidOperationError(f"Unsupported operation {op!r} on {entity!r}")
+        if (op != "create" or entity == "allValues") and entity_id is None:
+            raise InvalidOperationError(f"{op} needs an id")
+        if op != "delete" and data is None:
+            raise InvalidOperationError(f"{op} needs data")
+        if op != "delete" and entity != "allValues":
+            missing = [field for field in _RECORD_FIELDS[entity] if not isinstance(data.get(field), str)]
+            if missing:
+                raise InvalidOperationError(f"{op} of a {entity} needs {', '.join(missing)}")
+        if op == "create" and entity != "allValues":
+            entity_id = data["id"]
+        if entity == "node":
+            self._apply_node(op, entity_id, data)
+        elif entity == "edge":
+            self._apply_edge(op, entity_id, data)
+        else:
+            self._apply_values(op, entity_id, data)
+
+    def _apply_node(self, op: str, node_id: str, node: Optional[Dict[str, Any]]):
+        if op == "create":
+            if self.has_node(node_id):
+                raise DuplicateIdError(f"Node {node_id} already exists")
+            self._set_node(node_id, True)
+            return
+        if not self.has_node(node_id):
+            raise EntityNotFoundError(f"Node {node_id} not found")
+        if op == "update":
+            if node["id"] != node_id:
+                if self.has_node(node["id"]):
+                    raise DuplicateIdError(f"Node {node['id']} already exists")
+                self._set_node(node_id, False)
+            self._set_node(node["id"], True)
+            return
+        self._set_node(node_id, False)
+        candidates = set(self.store.incident.get(node_id, ())) | {edge_id for edge_id, ends in self.edges.items() if ends and node_id in ends}
+        for edge_id in candidates:
+            ends = self.edge_ends(edge_id)
+            if ends is not None and node_id in ends:
+                self._set_edge(edge_id, None)
+
+    def _apply_edge(self, op: str, edge_id: str, edge: Optional[Dict[str, Any]]):
+        if op == "create":
+            if self.edge_ends(edge_id) is not None:
+                raise DuplicateIdError(f"Edge {edge_id} already exists")
+            self._set_edge(edge_id, (edge["source"], edge["target"]))
+            return
+        if self.edge_ends(edge_id) is None:
+            raise EntityNotFoundError(f"Edge {edge_id} not found")
+        if op == "update":
+            if edge["id"] != edge_id:
+                if self.edge_ends(edge["id"]) is not None:
+                    raise DuplicateIdError(f"Edge {edge['id']} already exists")
+                self._set_edge(edge_id, None)
+            self._set_edge(edge["id"], (edge["source"], edge["target"]))
+            return
+        self._set_edge(edge_id, None)
+
+    def _apply_values(self, op: str, entity_id: str, values: Any):
+        if op == "create":
+            if self.has_values(entity_id):
+                raise DuplicateIdError(f"Values for {entity_id} already exist")
+            self._set_values(entity_id, True)
+            self.value_dicts[entity_id] = isinstance(values, dict)
+            return
+        if not self.has_values(entity_id):
+            raise EntityNotFoundError(f"Values for {entity_id} not found")
+        if op == "update" and not (isinstance(values, dict) and self.values_are_dict(entity_id)):
+            raise InvalidOperationError(f"update of the values of {entity_id} needs a dict on both sides")
+        self._set_values(entity_id, op == "update")
@@ -0,0 +1,65 @@
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from graph_records import CompactGraph, NodeRecord, EdgeRecord
+from adjacency import Adjacency
+
+
+def graph_etag(epoch: str, version: int) -> str:
+    return f'"{epoch}-{version}"'
+
+
+def parse_graph_ref(graph_ref: Optional[str]) -> Optional[Tuple[Optional[str], int]]:
+    """(epoch, version) named by a graph reference: "current" (None), a version number or an ETag.
+
+    A bare version number names no epoch. Raises ValueError for anything else.
+    """
+    if graph_ref is None or graph_ref == "current":
+        return None
+    ref = graph_ref.strip()
+    if ref.startswith("W/"):
+        ref = ref[2:]
+    epoch, _, version = ref.strip('"').rpartition("-")
+    return epoch or None, int(version)
+
+
+class GraphView:
+    """Read-only structures derived from one version of the server graph.
+
+    Built once per version and shared by every search until the graph
+    changes: a CompactGraph over the store's records, its Adjacency, the
+    node id set and the nodes by id.
+    """
+
+    def __init__(self, epoch: str, version: int, nodes: List[NodeRecord], edges: List[EdgeRecord], all_values: Dict[str, Any]):
+        self.epoch = epoch
+        self.version = version
+        self.graph = CompactGraph(nodes, edges, all_values)
+        self.adjacency = Adjacency.from_graph(self.graph)
+        self.nodes: Dict[str, NodeRecord] = {node.id: node for node in self.graph.nodes}
+        self.node_ids: Set[str] = self.nodes.keys()
+
+    @property
+    def etag(self) -> str:
+        return graph_etag(self.epoch, self.version)
+
+
+class GraphViewCache:
+    """Holds the GraphView of the most recent server graph version."""
+
+    def __init__(self):
+        self._view: Optional[GraphView] = None
+        self._lock = threading.Lock()
+
+    def cached(self, epoch: str, version: int) -> Optional[GraphView]:
+        view = self._view
+        return view if view is not None and view.version == version and view.epoch == epoch else None
+
+    def build(self, epoch: str, version: int, nodes: List[NodeRecord], edges: List[EdgeRecord], all_values: Dict[str, Any]) -> GraphView:
+        """Return the view of version, building it unless a concurrent search already did."""
+        with self._lock:
+            view = self.cached(epoch, version)
+            if view is None:
+                view = GraphView(epoch, version, nodes, edges, all_values)
+                self._view = view
+            return view
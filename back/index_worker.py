@@ -0,0 +1,98 @@
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ann_index import GraphSearchIndex
+from embedding_client import EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY
+
+# --- Configuration ---
+# Texts embedded per step; one step keeps every concurrent embedding request busy.
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", str(EMBEDDING_BATCH_SIZE * EMBEDDING_CONCURRENCY)))
+# Seconds to wait before retrying after the embedding service failed.
+INDEX_RETRY_SECONDS = float(os.getenv("INDEX_RETRY_SECONDS", "5"))
+# Server-graph searches during indexing: "partial" ranks what is indexed so far,
+# "wait" embeds the remaining texts inside the request first.
+SEARCH_DURING_INDEXING = os.getenv("SEARCH_DURING_INDEXING", "partial")
+
+
+class IndexWorker:
+    """Background task that embeds the search index's queued texts.
+
+    ``notify()`` (wired to ``GraphSearchIndex.on_pending``) wakes it whenever
+    the graph changes. Each step embeds up to ``batch_size`` texts, inserts
+    them and reports ``status()`` through ``on_progress``. A failed step is
+    retried after ``retry_seconds``; items changed meanwhile are skipped by
+    ``GraphSearchIndex.insert``.
+    """
+
+    def __init__(self, index: GraphSearchIndex, embed_many: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+                 batch_size: int = INDEX_BATCH_SIZE, retry_seconds: float = INDEX_RETRY_SECONDS):
+        self.index = index
+        self.embed_many = embed_many
+        self.on_progress = on_progress
+        self.batch_size = max(1, batch_size)
+        self.retry_seconds = retry_seconds
+        self.state = "idle"
+        self.last_error: Optional[str] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            if self.index.pending_count():
+                self.notify()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    @property
+    def complete(self) -> bool:
+        return self.index.pending_count() == 0
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "last_error": self.last_error, **self.index.progress()}
+
+    async def _report(self):
+        if self.on_progress is not None:
+            await self.on_progress(self.status())
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self.drain()
+            except Exception as e:
+                self.state = "error"
+                self.last_error = str(e)
+                print(f"Index worker: embedding failed, retrying in {self.retry_seconds}s: {e}")
+                await self._report()
+                await asyncio.sleep(self.retry_seconds)
+                self.notify()
+
+    async def drain(self):
+        """Embed and insert queued texts until nothing is pending."""
+        while True:
+            # The index lock can be held by a search; wait for it off the event loop
+            items = await asyncio.to_thread(self.index.take_pending, self.batch_size)
+            if not items:
+                break
+            self.state = "indexing"
+            embeddings = await self.embed_many([text for _, _, text in items])
+            await asyncio.to_thread(self.index.insert, items, embeddings)
+            await self._report()
+        if self.state != "idle":
+            self.state = "idle"
+            self.last_error = None
+            await self._report()
@@ -0,0 +1,99 @@
+import os
+import json
+from typing import Any, Callable, Optional
+
+# --- Configuration ---
+# "auto" picks the fastest installed encoder: orjson, then msgspec, then the stdlib.
+JSON_ENCODER = os.getenv("JSON_ENCODER", "auto")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Fallback for values the encoders do not know, e.g. Neo4j property types."""
+    # Graph records (orjson and msgspec encode these dataclasses natively)
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    # neo4j.time Date/Time/DateTime/Duration; Duration has no isoformat()
+    if hasattr(obj, "iso_format"):
+        return obj.iso_format()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    # neo4j.spatial points. The stdlib encoder writes these tuple subclasses as
+    # plain coordinate arrays before ever calling this hook.
+    if hasattr(obj, "srid") and isinstance(obj, tuple):
+        return {"srid": obj.srid, **dict(zip("xyz", obj))}
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, default=to_jsonable, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _select_encoder(name: str):
+    if name in ("auto", "orjson") and orjson is not None:
+        options = orjson.OPT_NON_STR_KEYS
+        return "orjson", lambda obj: orjson.dumps(obj, default=to_jsonable, option=options)
+    if name in ("auto", "msgspec") and msgspec is not None:
+        return "msgspec", msgspec.json.Encoder(enc_hook=to_jsonable).encode
+    return "json", _stdlib_dumps
+
+
+JSON_BACKEND, _dumps = _select_encoder(JSON_ENCODER)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode obj as UTF-8 JSON with the configured backend."""
+    return _dumps(obj)
+
+
+def dumps_str(obj: Any) -> str:
+    return _dumps(obj).decode("utf-8")
+
+
+def _select_decoder(backend: str):
+    if backend == "orjson":
+        return orjson.loads
+    if backend == "msgspec":
+        decoder = msgspec.json.Decoder()
+
+        def decode(data):
+            try:
+                return decoder.decode(data)
+            except msgspec.DecodeError as e:
+                raise ValueError(str(e)) from e
+        return decode
+    return json.loads
+
+
+_loads = _select_decoder(JSON_BACKEND)
+
+
+def loads(data) -> Any:
+    """Decode JSON bytes or str; raises ValueError on invalid input."""
+    return _loads(data)
+
+
+class VersionedCache:
+    """Keeps one encoded value and rebuilds it only when the version changes."""
+
+    def __init__(self, build: Callable[[], Any]):
+        self._build = build
+        self._version: Optional[int] = None
+        self._value: Any = None
+
+    def get(self, version: int) -> Any:
+        if self._version != version:
+            self._value = self._build()
+            self._version = version
+        return self._value
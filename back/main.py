@@ -1,16 +1,31 @@
 import asyncio
-import json
-import requests
-from fastapi import FastAPI, HTTPException, Request
+import time
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Dict, Any
-
-from models import GraphData, SearchRequest, SearchAllRequest, Node, Edge, SseMessage, HighlightRequest
-from graph_matching import search_all
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+from models import GraphData, SearchRequest, SearchAllRequest, SubgraphRequest, Node, Edge, SseMessage, HighlightRequest, BatchRequest
+from graph_matching import search_all, iter_search_all, search_embedding_texts, query_embedding_texts, embedding_text, SEARCH_PHASE_SECONDS, SEARCH_STREAM_HIGHLIGHT_SECONDS
+from ann_index import GraphSearchIndex, LockedScorer
+from index_worker import IndexWorker, SEARCH_DURING_INDEXING
+from graph_store import GraphStore, DuplicateIdError, EntityNotFoundError, InvalidOperationError
+from graph_patches import PatchLog, graph_patch, batch_patch
+from json_codec import dumps, dumps_str, loads, VersionedCache
+from graph_records import NodeRecord, EdgeRecord, GraphPayloadError, parse_graph_payload
+from graph_views import GraphView, GraphViewCache, graph_etag, parse_graph_ref
+from sse_fanout import SseBroadcaster
+from subgraph import k_hop_subgraph, SUBGRAPH_MAX_DEPTH, SUBGRAPH_MAX_NODES
+from graph_bus import GraphBus, GraphBusError
+from graph_persistence import GraphPersistence, GRAPH_PERSIST_DIR
+from embedding_client import get_embedding_client, close_embedding_client
+from embedding_matrix import EmbeddingMatrix
+from metrics import REGISTRY, CONTENT_TYPE, Gauge
+from request_profiling import RequestProfiler, annotate, record_counters, record_gauges
+from embedding_cache import cache_counts
 
 # Neo4j specific imports (logic is now in the utility module)
-from connectors.neo4j import get_all_nodes_async, get_all_relationships_async, close_driver, get_driver
+from connectors.neo4j import get_graph_async, close_driver, get_driver, IncrementalSync, NEO4J_SYNC_INTERVAL
 
 app = FastAPI()
 
@@ -20,11 +35,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Graph-Version", "ETag", "X-Profile-Id"],
 )
+# Profiles requests sent with X-Profile or following a slow one; see request_profiling.py
+app.add_middleware(RequestProfiler)
+record_counters(cache_counts)
 
 # Neo4j Driver Lifecycle Management
 @app.on_event("startup")
 async def startup_event():
+    global neo4j_sync_task
     print("FastAPI application startup: attempting to connect to Neo4j.")
     try:
         await get_driver()
@@ -32,142 +52,431 @@ async def startup_event():
     except Exception as e:
         print(f"CRITICAL: Failed to initialize Neo4j driver on startup: {e}")
         print("The application will continue to run, but Neo4j dependent endpoints might fail.")
+    # With several workers, joins the others and syncs the graph before serving
+    await graph_bus.start()
+    index_worker.start()
+    if NEO4J_SYNC_INTERVAL > 0:
+        neo4j_sync_task = asyncio.create_task(periodic_neo4j_sync(NEO4J_SYNC_INTERVAL))
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    global neo4j_sync_task
     print("FastAPI application shutdown: closing Neo4j connection.")
+    if neo4j_sync_task is not None:
+        neo4j_sync_task.cancel()
+        try:
+            await neo4j_sync_task
+        except asyncio.CancelledError:
+            pass
+        neo4j_sync_task = None
+    await index_worker.stop()
+    await graph_bus.stop()
+    if graph_persistence is not None:
+        await graph_persistence.close()
     await close_driver()
+    await close_embedding_client()
 
-graph_data = {
-    "nodes": [],
-    "edges": [],
-    "allValues": {}
-}
+graph_store = GraphStore()
 
-sse_connections = []
 
-def json_serializer(obj):
-    """Custom JSON serializer for objects that are not serializable by default.
-    Handles date/time objects (from Python or Neo4j) and falls back to string conversion.
-    """
-    # If the object has an isoformat() method, use it.
-    if hasattr(obj, 'isoformat'):
-        return obj.isoformat()
-    # For other unserializable types, convert them to a string.
-    return str(obj)
+# Quantized indexes (EMBEDDING_STORE_DTYPE) re-rank against the float32 vectors in the disk cache
+# (peeked, so re-ranking neither counts as cache traffic nor reorders eviction)
+search_index = GraphSearchIndex(full_precision=lambda text: get_embedding_client().cache.peek(text))
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    return await get_embedding_client().aembed_many(texts)
+
+async def broadcast_index_progress(status: Dict[str, Any]):
+    await broadcast_message(SseMessage(data=dumps_str({**status, "version": graph_store.version}), event="index_progress"))
+
+# Embeds new and changed texts in the background whenever the graph changes
+index_worker = IndexWorker(search_index, embed_texts, on_progress=broadcast_index_progress)
+search_index.on_pending = index_worker.notify
+
+# Compact graph and adjacency of the current version, shared by searches
+graph_views = GraphViewCache()
+
+patch_log = PatchLog()
+
+def node_search_text(node: Union[Node, NodeRecord]) -> Optional[str]:
+    return embedding_text(node.id, graph_store.all_values.get(node.id, {}).get("definition", ""))
+
+def edge_search_text(edge: Union[Edge, EdgeRecord]) -> Optional[str]:
+    return embedding_text(f"{edge.source}-{edge.target}", graph_store.all_values.get(edge.id, {}).get("definition", ""))
+
+def definition_search_text(entity_id: str) -> Optional[str]:
+    """Text /search ranks an allValues entry by."""
+    return embedding_text(entity_id, graph_store.all_values.get(entity_id, {}).get("definition", ""))
+
+def reset_search_index():
+    """Queue every node, edge and definition of the server graph for (re)indexing."""
+    node_texts = {node_id: node_search_text(node) for node_id, node in graph_store.nodes.items()}
+    edge_texts = {edge_id: edge_search_text(edge) for edge_id, edge in graph_store.edges.items()}
+    definition_texts = {entity_id: definition_search_text(entity_id) for entity_id in graph_store.all_values}
+    search_index.reset({k: v for k, v in node_texts.items() if v is not None},
+                       {k: v for k, v in edge_texts.items() if v is not None},
+                       {k: v for k, v in definition_texts.items() if v is not None})
+
+def graph_records() -> Dict[str, Any]:
+    """The graph for encoding: records serialize straight to the wire format."""
+    return {"nodes": list(graph_store.nodes.values()), "edges": list(graph_store.edges.values()), "allValues": graph_store.all_values}
+
+def graph_json() -> bytes:
+    return dumps(graph_records())
+
+def graph_snapshot() -> SseMessage:
+    message_data = dumps_str({**graph_records(), "version": graph_store.version})
+    return SseMessage(data=message_data, event="graph_update", id=str(graph_store.version))
+
+# Encoded once per graph version, however many clients read or resync
+graph_json_cache = VersionedCache(graph_json)
+graph_snapshot_cache = VersionedCache(graph_snapshot)
+
+def graph_snapshot_message() -> SseMessage:
+    """A full graph_update event for the current version of the graph."""
+    return graph_snapshot_cache.get(graph_store.version)
+
+def graph_patch_message(patch: Dict[str, Any]) -> SseMessage:
+    return SseMessage(data=dumps_str(patch), event="graph_patch", id=str(patch["version"]))
+
+# Serializes each event once and fans it out to bounded, coalescing per-client buffers
+sse_broadcaster = SseBroadcaster(graph_snapshot_message)
+
+REGISTRY.collector(sse_broadcaster.metrics)
+
+async def broadcast_message(message: SseMessage):
+    sse_broadcaster.publish(message)
 
 async def broadcast_graph_update():
-    """Broadcasts the current graph data to all connected SSE clients."""
-    # Use the custom serializer to handle special types like dates from Neo4j.
-    message_data = json.dumps(graph_data, default=json_serializer)
-    message = SseMessage(data=message_data, event="graph_update")
-    for queue in sse_connections:
-        await queue.put(message)
+    """Broadcasts the whole current graph to all connected SSE clients.
+
+    Used when the graph is replaced wholesale; the patch history can not bridge
+    that, so it is reset.
+    """
+    patch_log.clear()
+    await broadcast_message(graph_snapshot_message())
+
+async def broadcast_graph_patch(patch: Dict[str, Any]):
+    """Broadcasts a graph_patch event describing a single mutation."""
+    patch_log.append(patch)
+    await broadcast_message(graph_patch_message(patch))
+
+def catch_up_messages(last_event_id: Optional[str]) -> List[SseMessage]:
+    """Messages a client reconnecting with Last-Event-ID has missed."""
+    try:
+        version = int(last_event_id)
+    except (TypeError, ValueError):
+        return []
+    if version == graph_store.version:
+        return []
+    patches = patch_log.since(version)
+    if patches is None:
+        return [graph_snapshot_message()]
+    return [graph_patch_message(patch) for patch in patches]
 
 @app.get("/sse")
 async def sse(request: Request):
     """
     Establishes a Server-Sent Events (SSE) connection with a client.
     This endpoint keeps the connection alive and pushes graph updates
-    in real-time.
+    in real-time. A client reconnecting with Last-Event-ID first receives
+    the patches it missed, or a full snapshot if they are no longer kept.
     """
-    queue = asyncio.Queue()
-    sse_connections.append(queue)
+    subscriber = sse_broadcaster.subscribe(catch_up_messages(request.headers.get("last-event-id")))
 
     async def event_generator():
         try:
-            while True:
-                message = await queue.get()
+            async for payload in subscriber:
                 if await request.is_disconnected():
                     break
-                yield f"event: {message.event}\ndata: {message.data}\n\n"
+                yield payload
         except asyncio.CancelledError:
             pass
         finally:
-            sse_connections.remove(queue)
+            sse_broadcaster.unsubscribe(subscriber)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
-def calculate_embedding(text: str) -> Dict:
-    url = "http://ollama:11434/api/embeddings"
-    payload = {
-        "model": "nomic-embed-text",
-        "prompt": text
-    }
-    headers = {
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(url, json=payload, headers=headers)
-
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise HTTPException(status_code=response.status_code,
-                            detail="Error calculating embedding")
-
-def calculate_string_embedding(entity_id: str, definition: str) -> Dict:
-    if not definition:
-        return {}
-
-    text = f"{entity_id}: {definition}"
-    return calculate_embedding(text)
+@REGISTRY.collector
+def graph_metrics() -> List[Gauge]:
+    """Sizes of the server graph and its search index, read at scrape time."""
+    version = Gauge("graph_version", "Version of the server graph")
+    entities = Gauge("graph_entities", "Entities in the server graph", ("kind",))
+    indexed = Gauge("search_index_entities", "Entities embedded in the search index", ("kind",))
+    pending = Gauge("search_index_pending", "Texts waiting to be embedded by the index worker")
+    vector_bytes = Gauge("search_index_vector_bytes", "Memory held by the search index vectors", ("kind",))
+    version.set(graph_store.version)
+    entities.set(len(graph_store.nodes), kind="nodes")
+    entities.set(len(graph_store.edges), kind="edges")
+    entities.set(len(graph_store.all_values), kind="allValues")
+    progress = search_index.progress()
+    for kind in ("nodes", "edges", "definitions"):
+        indexed.set(progress[f"indexed_{kind}"], kind=kind)
+    pending.set(progress["pending"])
+    for kind, size in search_index.vector_bytes().items():
+        vector_bytes.set(size, kind=kind)
+    return [version, entities, indexed, pending, vector_bytes]
+
+@record_gauges
+def graph_state() -> Dict[str, Any]:
+    return {"graph_version": graph_store.version, "nodes": len(graph_store.nodes), "edges": len(graph_store.edges),
+            "all_values": len(graph_store.all_values), "index_pending": search_index.pending_count()}
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of latency histograms, cache, graph and SSE metrics."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
 
 @app.get("/embedding")
 def get_embedding():
     return {"message": "This is an embedding endpoint"}
 
+def score_search(query_embedding: List[float], matrix: Union[EmbeddingMatrix, LockedScorer]) -> Dict[str, Any]:
+    """Pick the entity whose embedding has the highest dot product with the query."""
+    # Scores start at -1 like the original linear scan, so anything above it can win
+    most_relevant_id, highest_score = matrix.best_match(query_embedding, min_threshold=-1)
+    if most_relevant_id is None:
+        highest_score = -1
+
+    return {"most_relevant_id": most_relevant_id, "score": highest_score}
+
+def check_graph_ref(graph_ref: Optional[str]):
+    """Reject a graph_ref that names another version of the server graph than the current one."""
+    try:
+        requested = parse_graph_ref(graph_ref)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid graph reference {graph_ref!r}")
+    if requested is None:
+        return
+    epoch, version = requested
+    if version != graph_store.version or epoch not in (None, graph_store.epoch):
+        current = graph_etag(graph_store.epoch, graph_store.version)
+        raise HTTPException(status_code=412, detail=f"Graph version {graph_ref} is no longer current (now {current})")
+
+async def server_graph_view(graph_ref: Optional[str]) -> GraphView:
+    """The cached view of the server graph, checked against the version graph_ref names."""
+    check_graph_ref(graph_ref)
+    epoch, version = graph_store.epoch, graph_store.version
+    view = graph_views.cached(epoch, version)
+    if view is None:
+        # Snapshot on the event loop, where mutations happen; derive the rest in a thread
+        view = await asyncio.to_thread(graph_views.build, epoch, version, list(graph_store.nodes.values()),
+                                       list(graph_store.edges.values()), dict(graph_store.all_values))
+    return view
+
+async def wait_for_index_if_configured() -> Dict[str, Any]:
+    """Index completeness a server-graph search runs with.
+
+    While the background worker is still embedding, searches either rank only
+    what is indexed so far ("partial", the default, reported as
+    complete=False) or embed the rest inline first ("wait").
+    """
+    if SEARCH_DURING_INDEXING == "wait" and search_index.pending_count():
+        client = get_embedding_client()
+        await client.aembed_many(await asyncio.to_thread(search_index.pending_texts))
+        await asyncio.to_thread(search_index.apply_pending, client.embed_many)
+    pending = search_index.pending_count()
+    return {"complete": pending == 0, "pending": pending}
+
+@app.get("/index-status")
+def index_status():
+    """Progress of the background embedding of the server graph."""
+    return {**index_worker.status(), "version": graph_store.version}
+
 @app.post("/search")
-def search_graph(search_request: SearchRequest) -> Dict[str, Any]:
+async def search_graph(search_request: SearchRequest) -> Dict[str, Any]:
     query = search_request.query
     graph_data = search_request.graph_data
 
     if not query:
         return {"most_relevant_id": None, "score": 0}
 
-    query_embedding = calculate_embedding(query)
-
-    most_relevant_id = None
-    highest_score = -1
+    client = get_embedding_client()
+    if graph_data is None:
+        # Rank the server graph's definitions through the background-built index
+        check_graph_ref(search_request.graph_ref)
+        index_status = await wait_for_index_if_configured()
+        query_embedding = (await client.aembed_many([query]))[0]
+        result = await asyncio.to_thread(score_search, query_embedding, search_index.scorer("definition"))
+        return {**result, "index": index_status}
 
+    entity_texts = {}
     for entity_id, entity_data in graph_data.allValues.items():
         if "definition" in entity_data:
-            entity_embedding = calculate_string_embedding(
-                entity_id, entity_data["definition"])
+            text = embedding_text(entity_id, entity_data["definition"])
+            if text is not None:
+                entity_texts[entity_id] = text
 
-            if "embedding" in entity_embedding and "embedding" in query_embedding:
-                score = sum(
-                    a * b for a, b in zip(entity_embedding["embedding"], query_embedding["embedding"]))
+    # One batched round trip for the query and every uncached definition
+    embeddings = await client.aembed_many([query, *entity_texts.values()])
+    matrix = EmbeddingMatrix.from_embeddings(zip(entity_texts.keys(), embeddings[1:]))
 
-                if score > highest_score:
-                    highest_score = score
-                    most_relevant_id = entity_id
+    # Scoring is CPU bound, keep it off the event loop
+    return await asyncio.to_thread(score_search, embeddings[0], matrix)
 
-    return {"most_relevant_id": most_relevant_id, "score": highest_score}
+# The body is validated by parse_graph_payload instead of GraphData; keep documenting it as GraphData
+GRAPH_DATA_BODY = {
+    "requestBody": {"required": True, "content": {"application/json": {"schema": {"$ref": "#/components/schemas/GraphData"}}}}
+}
 
-@app.post("/load-graph")
-async def load_graph(graph: GraphData):
-    global graph_data
-    graph_data = {
-        "nodes": [node.dict() for node in graph.nodes],
-        "edges": [edge.dict() for edge in graph.edges],
-        "allValues": graph.allValues
-    }
-    await broadcast_graph_update()
+@app.post("/load-graph", openapi_extra=GRAPH_DATA_BODY)
+async def load_graph(request: Request):
+    body = await request.body()
+    try:
+        # Bulk path: decode and build records directly, without per-element pydantic models
+        nodes, edges, all_values = await asyncio.to_thread(lambda: parse_graph_payload(loads(body)))
+    except GraphPayloadError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=[{"loc": ["body"], "msg": f"Invalid JSON: {e}", "type": "json_invalid"}])
+
+    await graph_bus.submit("load", nodes, edges, all_values)
     return {"message": "Graph data loaded successfully"}
 
 @app.get("/graph")
-def get_graph():
-    global graph_data
-    return graph_data
-
-@app.post("/searchAll")
-def search_all_endpoint(search_all_request: SearchAllRequest) -> Dict[str, Any]:
-    graph_data = search_all_request.graph_data
+async def get_graph(request: Request):
+    # async so it runs on the event loop with the mutations: the store can not change
+    # while it is encoded, and the ETag always matches the body.
+    # The version lets SSE clients tell which graph_patch events apply on top of this snapshot
+    version = graph_store.version
+    headers = {"ETag": graph_etag(graph_store.epoch, version), "X-Graph-Version": str(version)}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=graph_json_cache.get(version), media_type="application/json", headers=headers)
+
+async def prepare_search_all(search_all_request: SearchAllRequest, embed_query: bool = True) -> Tuple[GraphData, Dict[str, Any], Dict[str, Any]]:
+    """The graph, search_all options and extra response fields for a /searchAll request.
+
+    Fetches the embeddings the search needs in batches up front; with
+    embed_query=False the query's own texts are left to the search itself.
+    """
     query_objects = search_all_request.query.get("objects", [])
     query_relations = search_all_request.query.get("relations", [])
+    annotate(objects=len(query_objects), relations=len(query_relations), top_k=search_all_request.top_k,
+             graph="server" if search_all_request.graph_data is None else "inline")
+    client = get_embedding_client()
+
+    if search_all_request.graph_data is None:
+        # Search the server graph through its incrementally maintained ANN indexes
+        view = await server_graph_view(search_all_request.graph_ref)
+        index_status = await wait_for_index_if_configured()
+        if embed_query:
+            with SEARCH_PHASE_SECONDS.time(phase="embedding"):
+                await client.aembed_many(query_embedding_texts(query_objects, query_relations))
+        options = {"top_k": search_all_request.top_k, "node_matrix": search_index.scorer("node"), "edge_matrix": search_index.scorer("edge"),
+                   "adjacency": view.adjacency, "node_ids": view.node_ids}
+        return view.graph, options, {"index": index_status}
+
+    request_graph = search_all_request.graph_data
+    annotate(inline_nodes=len(request_graph.nodes), inline_edges=len(request_graph.edges))
+
+    # Fetch every embedding the search needs in a few batched requests up front.
+    # Edges are embedded during the search, in one batch, once the relations' candidates are known.
+    with SEARCH_PHASE_SECONDS.time(phase="embedding"):
+        await client.aembed_many(search_embedding_texts(request_graph, query_objects, query_relations))
+    return request_graph, {"top_k": search_all_request.top_k, "prefetch": client.embed_many}, {}
+
+@app.post("/searchAll")
+async def search_all_endpoint(search_all_request: SearchAllRequest) -> Dict[str, Any]:
+    graph, options, extra = await prepare_search_all(search_all_request)
+    # Matching mostly reads the cache; run it off the event loop
+    result = await asyncio.to_thread(search_all, graph, search_all_request.query.get("objects", []),
+                                     search_all_request.query.get("relations", []), **options)
+    return {**result, **extra}
+
+@app.post("/searchAll/stream")
+async def search_all_stream_endpoint(search_all_request: SearchAllRequest, highlight: bool = False):
+    """
+    Runs the /searchAll search and streams its links as NDJSON, one
+    ``{"link": ...}`` line per matched object or relation as soon as it is
+    scored, then a ``{"done": true, ...}`` line (or ``{"error": ...}``).
+
+    Against the server graph each query text is embedded when it is reached,
+    so the first match arrives after a single embedding call. With
+    ``highlight=true`` the ids matched so far are also sent to all SSE
+    clients as highlight_update events, at most every
+    SEARCH_STREAM_HIGHLIGHT_SECONDS and once at the end.
+    """
+    graph, options, extra = await prepare_search_all(search_all_request, embed_query=False)
+    links = iter_search_all(graph, search_all_request.query.get("objects", []), search_all_request.query.get("relations", []), **options)
+
+    async def stream():
+        # Ordered sets of the ids matched so far
+        highlighted = {"node_ids": {}, "edge_ids": {}}
+        unpublished = False
+        published_at = time.perf_counter()
+
+        async def publish_highlight():
+            nonlocal unpublished, published_at
+            message = {kind: list(ids) for kind, ids in highlighted.items()}
+            await graph_bus.publish({"data": dumps_str(message), "event": "highlight_update"})
+            unpublished, published_at = False, time.perf_counter()
+
+        count = 0
+        try:
+            while True:
+                # Each step scores one object or relation, embedding its text if needed
+                link = await asyncio.to_thread(next, links, None)
+                if link is None:
+                    break
+                count += 1
+                yield dumps({"link": link}) + b"\n"
+                if highlight:
+                    if "node" in link:
+                        highlighted["node_ids"][link["node"]] = True
+                    else:
+                        highlighted["edge_ids"][link["edge"]] = True
+                    unpublished = True
+                    # A lone id would select that element in every client; wait for more or for the end
+                    if (time.perf_counter() - published_at >= SEARCH_STREAM_HIGHLIGHT_SECONDS
+                            and len(highlighted["node_ids"]) + len(highlighted["edge_ids"]) > 1):
+                        await publish_highlight()
+        except Exception as e:
+            print(f"Streaming search failed: {e}")
+            yield dumps({"error": str(e)}) + b"\n"
+            return
+        finally:
+            if unpublished:
+                await publish_highlight()
+        yield dumps({"done": True, "links": count, **extra}) + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
-    return search_all(graph_data, query_objects, query_relations)
+@app.post("/subgraph")
+async def subgraph_endpoint(subgraph_request: SubgraphRequest):
+    """
+    Returns the k-hop neighborhood of the seed nodes and edges in the server
+    graph, in the /graph format plus each node's depth. Seeds are node_ids,
+    edge_ids and the matches of a /searchAll search_result.
+    """
+    if not 0 <= subgraph_request.depth <= SUBGRAPH_MAX_DEPTH:
+        raise HTTPException(status_code=400, detail=f"depth must be between 0 and {SUBGRAPH_MAX_DEPTH}")
+    for limit in ("max_fanout", "max_nodes", "max_edges"):
+        if (getattr(subgraph_request, limit) or 0) < 0:
+            raise HTTPException(status_code=400, detail=f"{limit} must not be negative")
+    node_ids, edge_ids = list(subgraph_request.node_ids), list(subgraph_request.edge_ids)
+    for link in (subgraph_request.search_result or {}).get("links", []):
+        if "node" in link:
+            node_ids.append(link["node"])
+        elif "edge" in link:
+            edge_ids.append(link["edge"])
+    view = await server_graph_view(subgraph_request.graph_ref)
+    annotate(seeds=len(node_ids) + len(edge_ids), depth=subgraph_request.depth)
+
+    def extract() -> bytes:
+        subgraph = k_hop_subgraph(
+            view.adjacency, view.nodes, node_ids, edge_ids, depth=subgraph_request.depth, max_fanout=subgraph_request.max_fanout,
+            max_nodes=min(subgraph_request.max_nodes or SUBGRAPH_MAX_NODES, SUBGRAPH_MAX_NODES), max_edges=subgraph_request.max_edges,
+            node_labels=set(subgraph_request.node_labels) if subgraph_request.node_labels is not None else None,
+            edge_labels=set(subgraph_request.edge_labels) if subgraph_request.edge_labels is not None else None,
+        )
+        all_values = view.graph.allValues
+        included = [*subgraph["depths"], *(edge.id for edge in subgraph["edges"])]
+        subgraph["allValues"] = {entity_id: all_values[entity_id] for entity_id in included if entity_id in all_values}
+        return dumps({**subgraph, "version": view.version})
+
+    headers = {"ETag": view.etag, "X-Graph-Version": str(view.version)}
+    return Response(content=await asyncio.to_thread(extract), media_type="application/json", headers=headers)
 
 @app.post("/highlight")
 async def highlight_elements(highlight_request: HighlightRequest):
@@ -176,127 +485,401 @@ async def highlight_elements(highlight_request: HighlightRequest):
     Broadcasts a highlight_update event to all SSE clients.
     """
     message_data = highlight_request.dict()
-    message = SseMessage(data=json.dumps(message_data), event="highlight_update")
-    for queue in sse_connections:
-        await queue.put(message)
+    await graph_bus.publish({"data": dumps_str(message_data), "event": "highlight_update"})
     return {"message": "Highlight update sent"}
 
 @app.post("/nodes", status_code=201)
 async def create_node(node: Node):
     """
     Creates a new node and adds it to the graph.
-    Broadcasts the updated graph to all SSE clients.
+    Broadcasts the change to all SSE clients as a graph_patch event.
     """
-    global graph_data
-    graph_data["nodes"].append(node.dict())
-    await broadcast_graph_update()
+    try:
+        await graph_bus.submit("add_node", node.dict())
+    except DuplicateIdError:
+        raise HTTPException(status_code=409, detail="Node already exists")
     return node
 
 @app.put("/nodes/{node_id}")
 async def update_node(node_id: str, node: Node):
     """
     Updates an existing node by its ID.
-    Broadcasts the updated graph to all SSE clients.
+    Broadcasts the change to all SSE clients as a graph_patch event.
     """
-    global graph_data
-    for i, n in enumerate(graph_data["nodes"]):
-        if n["id"] == node_id:
-            graph_data["nodes"][i] = node.dict()
-            await broadcast_graph_update()
-            return node
-    raise HTTPException(status_code=404, detail="Node not found")
+    try:
+        await graph_bus.submit("update_node", node_id, node.dict())
+    except EntityNotFoundError:
+        raise HTTPException(status_code=404, detail="Node not found")
+    except DuplicateIdError:
+        raise HTTPException(status_code=409, detail="Node already exists")
+    return node
 
 @app.delete("/nodes/{node_id}", status_code=204)
 async def delete_node(node_id: str):
     """
     Deletes a node by its ID and any connected edges.
-    Broadcasts the updated graph to all SSE clients.
+    Broadcasts the change to all SSE clients as a graph_patch event.
     """
-    global graph_data
-    node_found = any(n["id"] == node_id for n in graph_data["nodes"])
-    if not node_found:
+    try:
+        await graph_bus.submit("delete_node", node_id)
+    except EntityNotFoundError:
         raise HTTPException(status_code=404, detail="Node not found")
-    
-    graph_data["nodes"] = [n for n in graph_data["nodes"] if n["id"] != node_id]
-    graph_data["edges"] = [e for e in graph_data["edges"] if e["source"] != node_id and e["target"] != node_id]
-    
-    await broadcast_graph_update()
     return
 
 @app.post("/edges", status_code=201)
 async def create_edge(edge: Edge):
     """
     Creates a new edge and adds it to the graph.
-    Broadcasts the updated graph to all SSE clients.
+    Broadcasts the change to all SSE clients as a graph_patch event.
     """
-    global graph_data
-    graph_data["edges"].append(edge.dict())
-    await broadcast_graph_update()
+    try:
+        await graph_bus.submit("add_edge", edge.dict())
+    except DuplicateIdError:
+        raise HTTPException(status_code=409, detail="Edge already exists")
     return edge
 
 @app.put("/edges/{edge_id}")
 async def update_edge(edge_id: str, edge: Edge):
     """
     Updates an existing edge by its ID.
-    Broadcasts the updated graph to all SSE clients.
+    Broadcasts the change to all SSE clients as a graph_patch event.
     """
-    global graph_data
-    for i, e in enumerate(graph_data["edges"]):
-        if e["id"] == edge_id:
-            graph_data["edges"][i] = edge.dict()
-            await broadcast_graph_update()
-            return edge
-    raise HTTPException(status_code=404, detail="Edge not found")
+    try:
+        await graph_bus.submit("update_edge", edge_id, edge.dict())
+    except EntityNotFoundError:
+        raise HTTPException(status_code=404, detail="Edge not found")
+    except DuplicateIdError:
+        raise HTTPException(status_code=409, detail="Edge already exists")
+    return edge
 
 @app.delete("/edges/{edge_id}", status_code=204)
 async def delete_edge(edge_id: str):
     """
     Deletes an edge by its ID.
-    Broadcasts the updated graph to all SSE clients.
+    Broadcasts the change to all SSE clients as a graph_patch event.
     """
-    global graph_data
-    edge_found = any(e["id"] == edge_id for e in graph_data["edges"])
-    if not edge_found:
+    try:
+        await graph_bus.submit("delete_edge", edge_id)
+    except EntityNotFoundError:
         raise HTTPException(status_code=404, detail="Edge not found")
+    return
+
 
-    graph_data["edges"] = [e for e in graph_data["edges"] if e["id"] != edge_id]
+@app.post("/batch")
+async def apply_batch(batch: BatchRequest):
+    """
+    Applies mixed create/update/delete operations on nodes, edges and allValues
+    as one transaction: either every operation succeeds or the graph is left
+    unchanged. Broadcasts a single graph_patch for the whole batch.
+    """
+    try:
+        operations = []
+        for operation in batch.operations:
+            if operation.entity == "allValues":
+                data = operation.values
+            else:
+                payload = operation.node if operation.entity == "node" else operation.edge
+                if payload is None and operation.op != "delete":
+                    raise InvalidOperationError(f"{operation.op} of a {operation.entity} needs '{operation.entity}'")
+                data = payload.dict() if payload is not None else None
+            operations.append({"op": operation.op, "entity": operation.entity, "id": operation.id, "data": data})
+        version = await commit_batch(operations)
+    except EntityNotFoundError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except DuplicateIdError as e:
+        raise HTTPException(status_code=409, detail=e.args[0])
+    except InvalidOperationError as e:
+        raise HTTPException(status_code=422, detail=e.args[0])
+    return {"message": f"Applied {len(operations)} operations", "version": version}
+
+async def commit_batch(operations: List[Dict[str, Any]]) -> int:
+    """Applies a batch to the server graph on every worker."""
+    return await graph_bus.submit("batch", operations)
+
+
+# Graph mutations as applied on every worker, in the order the graph bus fixes.
+# Each changes the local graph store, updates the search index and tells this
+# worker's SSE clients; graph store errors leave the graph unchanged.
+
+async def apply_load(nodes: List[Any], edges: List[Any], all_values: Dict[str, Any]) -> int:
+    """Replace the whole graph; nodes and edges are records, or wire-format dicts from another worker."""
+    if (nodes and isinstance(nodes[0], dict)) or (edges and isinstance(edges[0], dict)):
+        version = graph_store.load(nodes, edges, all_values)
+    else:
+        version = graph_store.load_records(nodes, edges, all_values)
+    reset_search_index()
+    # The graph no longer mirrors Neo4j; a sync seeds this again afterwards
+    neo4j_sync.reset()
+    await broadcast_graph_update()
+    return version
+
+async def apply_add_node(node: Dict[str, Any]) -> int:
+    base_version = graph_store.version
+    version = graph_store.add_node(node)
+    search_index.set_node(node["id"], node_search_text(graph_store.nodes[node["id"]]))
+    await broadcast_graph_patch(graph_patch(base_version, version, added_nodes=[node]))
+    return version
+
+async def apply_update_node(node_id: str, node: Dict[str, Any]) -> int:
+    base_version = graph_store.version
+    version = graph_store.update_node(node_id, node)
+    if node["id"] != node_id:
+        search_index.remove_node(node_id)
+        patch = graph_patch(base_version, version, added_nodes=[node], removed_nodes=[node_id])
+    else:
+        patch = graph_patch(base_version, version, updated_nodes=[node])
+    search_index.set_node(node["id"], node_search_text(graph_store.nodes[node["id"]]))
+    await broadcast_graph_patch(patch)
+    return version
+
+async def apply_delete_node(node_id: str) -> int:
+    base_version = graph_store.version
+    version, removed_edges = graph_store.delete_node(node_id)
+    search_index.remove_node(node_id)
+    for edge_id in removed_edges:
+        search_index.remove_edge(edge_id)
+    await broadcast_graph_patch(graph_patch(base_version, version, removed_nodes=[node_id], removed_edges=removed_edges))
+    return version
+
+async def apply_add_edge(edge: Dict[str, Any]) -> int:
+    base_version = graph_store.version
+    version = graph_store.add_edge(edge)
+    search_index.set_edge(edge["id"], edge_search_text(graph_store.edges[edge["id"]]))
+    await broadcast_graph_patch(graph_patch(base_version, version, added_edges=[edge]))
+    return version
+
+async def apply_update_edge(edge_id: str, edge: Dict[str, Any]) -> int:
+    base_version = graph_store.version
+    version = graph_store.update_edge(edge_id, edge)
+    if edge["id"] != edge_id:
+        search_index.remove_edge(edge_id)
+        patch = graph_patch(base_version, version, added_edges=[edge], removed_edges=[edge_id])
+    else:
+        patch = graph_patch(base_version, version, updated_edges=[edge])
+    search_index.set_edge(edge["id"], edge_search_text(graph_store.edges[edge["id"]]))
+    await broadcast_graph_patch(patch)
+    return version
+
+async def apply_delete_edge(edge_id: str) -> int:
+    base_version = graph_store.version
+    version = graph_store.delete_edge(edge_id)
+    search_index.remove_edge(edge_id)
+    await broadcast_graph_patch(graph_patch(base_version, version, removed_edges=[edge_id]))
+    return version
+
+async def apply_batch_operations(operations: List[Dict[str, Any]]) -> int:
+    """Applies a batch, reindexes what it touched and broadcasts one graph_patch."""
+    base_version = graph_store.version
+    version, touched = graph_store.apply_batch(operations)
+
+    for entity_id in touched["allValues"]:
+        search_index.set_definition(entity_id, definition_search_text(entity_id))
+    # allValues changes alter the embedding text of the node or edge they belong to
+    for entity_id in {**touched["nodes"], **touched["allValues"]}:
+        node = graph_store.nodes.get(entity_id)
+        if node is not None:
+            search_index.set_node(entity_id, node_search_text(node))
+        elif entity_id in touched["nodes"]:
+            search_index.remove_node(entity_id)
+    for entity_id in {**touched["edges"], **touched["allValues"]}:
+        edge = graph_store.edges.get(entity_id)
+        if edge is not None:
+            search_index.set_edge(entity_id, edge_search_text(edge))
+        elif entity_id in touched["edges"]:
+            search_index.remove_edge(entity_id)
+
+    await broadcast_graph_patch(batch_patch(base_version, version, touched, graph_store.nodes, graph_store.edges, graph_store.all_values))
+    return version
+
+def graph_bus_state() -> Dict[str, Any]:
+    """Snapshot a joining worker starts from."""
+    return {**graph_records(), "version": graph_store.version, "epoch": graph_store.epoch}
+
+async def restore_graph_state(state: Dict[str, Any]):
+    """Replace the local replica with a snapshot from another worker."""
+    nodes, edges, all_values = await asyncio.to_thread(parse_graph_payload, state)
+    graph_store.load_records(nodes, edges, all_values, version=state["version"], epoch=state.get("epoch"))
+    reset_search_index()
+    neo4j_sync.reset()
     await broadcast_graph_update()
-    return
+
+async def publish_sse_message(message: Dict[str, Any]):
+    await broadcast_message(SseMessage(**message))
+
+# Durable copy of the graph (GRAPH_PERSIST_DIR), written by the graph bus hub; None keeps it in memory only
+graph_persistence = GraphPersistence(GRAPH_PERSIST_DIR) if GRAPH_PERSIST_DIR else None
+
+def graph_state_copy():
+    """The graph as of now, for a snapshot written while mutations continue (records and values are replaced, never changed)."""
+    return graph_store.version, list(graph_store.nodes.values()), list(graph_store.edges.values()), dict(graph_store.all_values)
+
+async def recover_persisted_graph():
+    """Runs when this worker becomes the hub: a fresh one restores the graph from disk, one that already holds it persists it."""
+    if graph_persistence is None:
+        return
+    if graph_store.version > 0:
+        await graph_persistence.checkpoint(graph_state_copy())
+        return
+
+    started = time.perf_counter()
+    state = await asyncio.to_thread(graph_persistence.read_snapshot)
+    if state is not None:
+        version, nodes, edges, all_values = state
+        graph_store.load_records(nodes, edges, all_values, version=version)
+    entries = await asyncio.to_thread(lambda: list(graph_persistence.read_log(graph_store.version)))
+    replayed = 0
+    for version, method, args in entries:
+        try:
+            await graph_bus.appliers[method](*args)
+        except Exception as e:
+            print(f"Graph persistence: stopping the log replay at version {version}: {e!r}")
+            break
+        if graph_store.version != version:
+            print(f"Graph persistence: the log replay reached version {graph_store.version} instead of {version}; stopping there")
+            break
+        replayed += 1
+    reset_search_index()
+    if replayed < len(entries):
+        # The logs go on past this version; new entries must not reuse their versions
+        await graph_persistence.checkpoint(graph_state_copy())
+    else:
+        graph_persistence.open_log(graph_store.version)
+    print(f"Graph persistence: restored version {graph_store.version} ({len(graph_store.nodes)} nodes, {len(graph_store.edges)} edges, "
+          f"{replayed} logged mutations) in {time.perf_counter() - started:.2f}s")
+
+async def persist_mutation(method: str, args: List[Any]):
+    """Log a committed mutation; a whole-graph load is snapshotted instead.
+
+    If the log can not be appended to, a snapshot is written before the
+    mutation is acknowledged; if that fails too, the request fails (503).
+    """
+    if graph_persistence is None:
+        return
+    if method == "load" or graph_persistence.log_damaged:
+        await graph_persistence.checkpoint(graph_state_copy())
+        return
+    try:
+        graph_persistence.append(graph_store.version, method, args)
+    except Exception as e:
+        print(f"Graph persistence: could not log {method} ({e}); writing a snapshot instead")
+        await graph_persistence.checkpoint(graph_state_copy())
+        return
+    if graph_persistence.needs_checkpoint and not graph_persistence.checkpointing:
+        await graph_persistence.checkpoint(graph_state_copy(), wait=False)
+
+# Orders mutations across uvicorn workers (GRAPH_BUS_SOCKET); in one process it applies them directly
+graph_bus = GraphBus(
+    appliers={
+        "load": apply_load, "batch": apply_batch_operations,
+        "add_node": apply_add_node, "update_node": apply_update_node, "delete_node": apply_delete_node,
+        "add_edge": apply_add_edge, "update_edge": apply_update_edge, "delete_edge": apply_delete_edge,
+    },
+    publish_local=publish_sse_message, snapshot=graph_bus_state, restore=restore_graph_state,
+    version=lambda: graph_store.version, on_hub=recover_persisted_graph, on_commit=persist_mutation,
+)
+
+@app.exception_handler(GraphBusError)
+async def graph_bus_error_handler(request: Request, exc: GraphBusError):
+    return JSONResponse(status_code=503, content={"detail": f"Graph coordination failed: {exc}"})
 
 
 # Neo4j Sync Endpoint
+def neo4j_delta_operations(delta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Batch operations that merge an IncrementalSync delta into the server graph."""
+    operations = []
+    for entity, kind in (("edge", "edges"), ("node", "nodes")):
+        existing = graph_store.edges if entity == "edge" else graph_store.nodes
+        for entity_id in delta[kind]["removed"]:
+            if entity_id in existing:
+                operations.append({"op": "delete", "entity": entity, "id": entity_id})
+            if entity_id in graph_store.all_values:
+                operations.append({"op": "delete", "entity": "allValues", "id": entity_id})
+    for entity, kind in (("node", "nodes"), ("edge", "edges")):
+        existing = graph_store.nodes if entity == "node" else graph_store.edges
+        for item in delta[kind]["items"]:
+            op = "update" if item["id"] in existing else "create"
+            operations.append({"op": op, "entity": entity, "id": item["id"], "data": item})
+            # Replace, not merge: properties removed in Neo4j must disappear too.
+            # The batch's graph_patch carries the resulting full value, which
+            # clients apply with replace semantics (graph_patches.graph_patch).
+            if item["id"] in graph_store.all_values:
+                operations.append({"op": "delete", "entity": "allValues", "id": item["id"]})
+            operations.append({"op": "create", "entity": "allValues", "id": item["id"], "data": delta[kind]["values"][item["id"]]})
+    return operations
+
+neo4j_sync = IncrementalSync()
+# The periodic_neo4j_sync loop while it runs (NEO4J_SYNC_INTERVAL > 0)
+neo4j_sync_task: Optional[asyncio.Task] = None
+neo4j_sync_lock = asyncio.Lock()
+NEO4J_SYNC_SECONDS = REGISTRY.histogram("neo4j_sync_seconds", "Duration of a Neo4j sync including the graph update", ("mode",))
+
+async def full_neo4j_sync() -> Dict[str, int]:
+    # Stream nodes and relationships concurrently
+    (transformed_nodes, node_values), (transformed_edges, edge_values) = await get_graph_async()
+
+    # Combine the allValues from both nodes and edges
+    all_values = {**node_values, **edge_values}
+
+    print(f"Neo4j Sync: Processed {len(transformed_nodes)} nodes and {len(transformed_edges)} edges. Broadcasting update.")
+
+    # Replace the server graph on every worker and broadcast it to all connected clients
+    await graph_bus.submit("load", transformed_nodes, transformed_edges, all_values)
+    neo4j_sync.seed(transformed_nodes, transformed_edges, all_values)
+    return {"nodes_synced": len(transformed_nodes), "edges_synced": len(transformed_edges)}
+
+async def incremental_neo4j_sync() -> Dict[str, int]:
+    if not neo4j_sync.seeded:
+        return await full_neo4j_sync()
+    delta = await neo4j_sync.changes()
+    operations = neo4j_delta_operations(delta)
+    if operations:
+        await commit_batch(operations)
+    neo4j_sync.commit(delta)
+    return {
+        "nodes_synced": len(delta["nodes"]["items"]), "edges_synced": len(delta["edges"]["items"]),
+        "nodes_removed": len(delta["nodes"]["removed"]), "edges_removed": len(delta["edges"]["removed"])
+    }
+
+async def run_neo4j_sync(incremental: bool = False, mode: Optional[str] = None) -> Dict[str, int]:
+    """Runs one sync; with several workers only the hub talks to Neo4j (see graph_bus.call)."""
+    async with neo4j_sync_lock:
+        with NEO4J_SYNC_SECONDS.time(mode=mode or ("incremental" if incremental else "full")):
+            return await (incremental_neo4j_sync() if incremental else full_neo4j_sync())
+
+graph_bus.handlers["neo4j_sync"] = run_neo4j_sync
+
+async def periodic_neo4j_sync(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        # Every worker runs this loop; the current hub does the syncing
+        if not graph_bus.is_hub:
+            continue
+        try:
+            await run_neo4j_sync(incremental=True, mode="periodic")
+        except Exception as e:
+            print(f"Neo4j Sync Error: periodic incremental sync failed: {e}")
+
 @app.post("/sync-neo4j", tags=["Neo4j Sync"])
-async def sync_neo4j_data():
+async def sync_neo4j_data(incremental: bool = False):
     """
     Fetches and transforms graph data from Neo4j using dedicated utility functions,
-    updates the global graph_data, and broadcasts it via the existing SSE mechanism.
+    updates the server graph store, and broadcasts it via the existing SSE mechanism.
+
+    With ``incremental=true`` only entities created, changed or deleted since the
+    previous sync are read and merged into the graph as one graph_patch; the
+    first sync is always a full one.
     """
-    global graph_data
-    print("POST /sync-neo4j: Starting Neo4j data synchronization.")
+    print(f"POST /sync-neo4j: Starting {'incremental' if incremental else 'full'} Neo4j data synchronization.")
+    annotate(incremental=incremental)
 
     try:
-        # Fetch and transform data using the refactored utility functions
-        transformed_nodes, node_values = await get_all_nodes_async()
-        transformed_edges, edge_values = await get_all_relationships_async()
-
-        # Combine the allValues from both nodes and edges
-        all_values = {**node_values, **edge_values}
-
-        # Update the global graph_data object
-        graph_data["nodes"] = transformed_nodes
-        graph_data["edges"] = transformed_edges
-        graph_data["allValues"] = all_values
-
-        print(f"Neo4j Sync: Processed {len(transformed_nodes)} nodes and {len(transformed_edges)} edges. Broadcasting update.")
-        
-        # Broadcast the new graph state to all connected clients
-        await broadcast_graph_update()
+        counts = await graph_bus.call("neo4j_sync", incremental=incremental)
 
+        annotate(**counts)
         return JSONResponse(
             content={
-                "message": f"Successfully synced {len(transformed_nodes)} nodes and {len(transformed_edges)} edges from Neo4j. Graph data updated and broadcasted.",
-                "nodes_synced": len(transformed_nodes),
-                "edges_synced": len(transformed_edges)
+                "message": f"Successfully synced {counts['nodes_synced']} nodes and {counts['edges_synced']} edges from Neo4j. Graph data updated and broadcasted.",
+                **counts
             },
             status_code=200
         )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Literal
 
 class Node(BaseModel):
     id: str
@@ -31,17 +31,50 @@ class Relation(BaseModel):
     context: str
 
 class SearchAllRequest(BaseModel):
-    graph_data: GraphData
+    # When omitted, the search runs against the server-held graph
+    graph_data: Optional[GraphData] = None
+    # "current", a version number or an ETag of the server graph; a stale one is rejected
+    graph_ref: Optional[str] = None
     query: Dict[str, Any] = None
     objects: List[Object] = None
     relations: List[Relation] = None
+    top_k: Optional[int] = None
+
+class SubgraphRequest(BaseModel):
+    # "current", a version number or an ETag of the server graph; a stale one is rejected
+    graph_ref: Optional[str] = None
+    node_ids: List[str] = []
+    edge_ids: List[str] = []
+    # A /searchAll response; the nodes and edges its links matched become seeds too
+    search_result: Optional[Dict[str, Any]] = None
+    depth: int = 1
+    max_fanout: Optional[int] = None
+    max_nodes: Optional[int] = None
+    max_edges: Optional[int] = None
+    # Only follow edges, and reach nodes, with these labels
+    node_labels: Optional[List[str]] = None
+    edge_labels: Optional[List[str]] = None
 
 class SearchRequest(BaseModel):
-    graph_data: GraphData
+    graph_data: Optional[GraphData] = None
+    graph_ref: Optional[str] = None
     query: str = None
 class SseMessage(BaseModel):
     data: str
     event: Optional[str] = None
+    id: Optional[str] = None
+
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    entity: Literal["node", "edge", "allValues"]
+    # Target of update/delete, and the owner id for allValues
+    id: Optional[str] = None
+    node: Optional[Node] = None
+    edge: Optional[Edge] = None
+    values: Optional[Dict[str, Any]] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
 
 class HighlightRequest(BaseModel):
     node_ids: List[str]
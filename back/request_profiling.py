@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import cProfile
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+# --- Configuration ---
+# Directory the captures are written to, and how many captures are kept there.
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".profiles"))
+PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", "50"))
+# Requests carrying this header (any value) are profiled, if PROFILE_ALLOW_HEADER is set.
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile").lower()
+PROFILE_ALLOW_HEADER = os.getenv("PROFILE_ALLOW_HEADER", "false").lower() in ("1", "true", "yes")
+# Requests slower than this many seconds are recorded, and the next
+# PROFILE_SLOW_FOLLOWUPS requests to the same path are profiled; 0 disables it.
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "0"))
+PROFILE_SLOW_FOLLOWUPS = int(os.getenv("PROFILE_SLOW_FOLLOWUPS", "1"))
+# "sample" samples the stacks of all threads (handlers run their heavy parts in
+# worker threads); "cprofile" traces every call, but only on the event loop thread.
+PROFILER = os.getenv("PROFILER", "sample")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+# Long-lived or trivial endpoints that are never timed or profiled.
+PROFILE_EXCLUDE_PATHS = tuple(path for path in os.getenv("PROFILE_EXCLUDE_PATHS", "/sse,/metrics").split(",") if path)
+
+# Innermost frames of threads that are merely waiting; their samples are dropped
+IDLE_FRAMES = {("threading.py", "wait"), ("selectors.py", "select"), ("thread.py", "_worker"), ("queue.py", "get")}
+TOP_FRAMES = 25
+
+_annotations: ContextVar[Optional[Dict[str, Any]]] = ContextVar("profile_annotations", default=None)
+_gauges: List[Callable[[], Dict[str, Any]]] = []
+_counters: List[Callable[[], Dict[str, float]]] = []
+
+
+def annotate(**fields):
+    """Attach fields (e.g. query sizes) to the capture of the current request, if it is timed."""
+    annotations = _annotations.get()
+    if annotations is not None:
+        annotations.update(fields)
+
+
+def record_gauges(read: Callable[[], Dict[str, Any]]) -> Callable[[], Dict[str, Any]]:
+    """Record read()'s values, e.g. graph sizes, in every capture as of the end of the request.
+
+    Usable as a decorator.
+    """
+    _gauges.append(read)
+    return read
+
+
+def record_counters(read: Callable[[], Dict[str, float]]) -> Callable[[], Dict[str, float]]:
+    """Record how much read()'s counters, e.g. cache hits, grew during a profiled request.
+
+    The counters are process-wide, so concurrent requests are included. Slow
+    requests are only known to be slow at the end, so their captures have
+    none. Usable as a decorator.
+    """
+    _counters.append(read)
+    return read
+
+
+def _read(readers) -> Dict[str, Any]:
+    values = {}
+    for read in readers:
+        values.update(read())
+    return values
+
+
+class StackSampler:
+    """Samples the Python stacks of all other threads every ``interval`` seconds.
+
+    The result maps collapsed stacks (``thread;outer;...;inner``, the input
+    format of flame graph tools) to the number of samples they were seen in.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+class _Capture:
+    """One profiled or slow request, from the start of the handler (``start``, a perf_counter time) to its last byte.
+
+    Built when a profiled request starts, or when a request turns out slow.
+    """
+
+    def __init__(self, profiler: "RequestProfiler", scope: Dict[str, Any], trigger: Optional[str], start: float):
+        started_at = datetime.now(timezone.utc) - timedelta(seconds=time.perf_counter() - start)
+        # Sortable by start time, which rotation relies on
+        self.id = f"{started_at.strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        self.scope = scope
+        self.trigger = trigger
+        self.kind = profiler.profiler if trigger else None
+        self.status: Optional[int] = None
+        self.started_at = started_at.isoformat()
+        self.counters_before = _read(_counters) if trigger else None
+        self._sampler: Optional[StackSampler] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self.start = start
+
+    def start_profiler(self):
+        if self.kind == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif self.kind == "sample":
+            self._sampler = StackSampler()
+            self._sampler.start()
+
+    def stop_profiler(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+
+
+class RequestProfiler:
+    """ASGI middleware that profiles requests on demand and records slow ones.
+
+    A request is profiled when it carries ``header`` (and ``allow_header`` is
+    set), or when an earlier request to the same path took longer than
+    ``slow_seconds``; the slow request itself is recorded with its metadata
+    and no profile. Only one request is profiled at a time. Every capture is a
+    ``<id>.json`` metadata file plus the profile (``<id>.collapsed`` stack
+    samples or ``<id>.prof`` pstats), of which the newest ``max_captures``
+    are kept. A profiled response carries its capture id in ``X-Profile-Id``.
+
+    Requests that are not profiled only pay for a header lookup and, with a
+    slow threshold set, two clock reads and an empty annotations dict.
+    """
+
+    def __init__(self, app, directory: str = PROFILE_DIR, header: str = PROFILE_HEADER, allow_header: bool = PROFILE_ALLOW_HEADER,
+                 slow_seconds: float = PROFILE_SLOW_SECONDS, slow_followups: int = PROFILE_SLOW_FOLLOWUPS,
+                 profiler: str = PROFILER, max_captures: int = PROFILE_MAX_CAPTURES, exclude_paths=PROFILE_EXCLUDE_PATHS):
+        if profiler not in ("sample", "cprofile"):
+            raise ValueError(f"Unknown profiler {profiler!r}; expected 'sample' or 'cprofile'")
+        self.app = app
+        self.directory = directory
+        self.header = header.lower().encode("latin-1")
+        self.allow_header = allow_header
+        self.slow_seconds = slow_seconds
+        self.slow_followups = slow_followups
+        self.profiler = profiler
+        self.max_captures = max_captures
+        self.exclude_paths = tuple(exclude_paths)
+        self._armed: Dict[str, int] = {}
+        self._busy = False
+
+    def _trigger(self, scope) -> Optional[str]:
+        if self.allow_header and any(name == self.header for name, _ in scope["headers"]):
+            return "header"
+        if self._armed.get(scope["path"]):
+            self._armed[scope["path"]] -= 1
+            return "slow_followup"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            return await self.app(scope, receive, send)
+        trigger = self._trigger(scope)
+        if trigger is not None and self._busy:
+            trigger = None
+        if trigger is None and self.slow_seconds <= 0:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        capture = _Capture(self, scope, trigger, start) if trigger is not None else None
+        status: Optional[int] = None
+        token = _annotations.set({})
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if capture is not None:
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", capture.id.encode("latin-1"))]}
+            await send(message)
+
+        if capture is not None:
+            self._busy = True
+            capture.start_profiler()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            if capture is not None:
+                capture.stop_profiler()
+                self._busy = False
+            annotations = _annotations.get()
+            _annotations.reset(token)
+            slow = 0 < self.slow_seconds <= duration
+            if slow and capture is None:
+                if self.slow_followups > 0:
+                    self._armed[scope["path"]] = self.slow_followups
+                capture = _Capture(self, scope, None, start)
+            if capture is not None:
+                capture.status = status
+                await asyncio.to_thread(self._write, capture, duration, annotations, "slow" if capture.kind is None else capture.trigger)
+
+    def _write(self, capture: _Capture, duration: float, annotations: Dict[str, Any], trigger: str):
+        os.makedirs(self.directory, exist_ok=True)
+        scope = capture.scope
+        metadata = {
+            "id": capture.id,
+            "trigger": trigger,
+            "method": scope["method"],
+            "path": scope["path"],
+            "query_string": scope.get("query_string", b"").decode("latin-1"),
+            "status": capture.status,
+            "started_at": capture.started_at,
+            "duration_s": duration,
+            "request": annotations,
+            "state": _read(_gauges),
+            "counters": None if capture.counters_before is None else
+                        {name: value - capture.counters_before.get(name, 0) for name, value in _read(_counters).items()},
+            "profiler": capture.kind,
+            "profile": None,
+        }
+        base = os.path.join(self.directory, capture.id)
+        if capture._sampler is not None:
+            stacks = capture._sampler.stacks
+            metadata["profile"] = capture.id + ".collapsed"
+            metadata["samples"] = capture._sampler.samples
+            metadata["sample_interval_s"] = capture._sampler.interval
+            leaves = Counter()
+            for stack, count in stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            metadata["top_frames"] = [{"frame": frame, "samples": count} for frame, count in leaves.most_common(TOP_FRAMES)]
+            with open(base + ".collapsed", "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        elif capture._cprofile is not None:
+            metadata["profile"] = capture.id + ".prof"
+            capture._cprofile.dump_stats(base + ".prof")
+        with open(base + ".json", "w") as f:
+            json.dump(metadata, f, indent=2, default=str)
+        self._rotate()
+
+    def _rotate(self):
+        """Delete the oldest captures beyond max_captures."""
+        captures = sorted(name[:-len(".json")] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for stale in captures[:max(0, len(captures) - self.max_captures)]:
+            for suffix in (".json", ".collapsed", ".prof"):
+                try:
+                    os.remove(os.path.join(self.directory, stale + suffix))
+                except FileNotFoundError:
+                    pass
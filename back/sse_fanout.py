@@ -0,0 +1,164 @@
+import os
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Callable, Deque, Iterable, List, Optional, Tuple
+
+from models import SseMessage
+from metrics import REGISTRY, Counter, Gauge, Metric
+
+# --- Configuration ---
+# Events buffered per client before graph events are collapsed into one resync snapshot.
+SSE_CLIENT_BUFFER = int(os.getenv("SSE_CLIENT_BUFFER", "256"))
+# A client still this far behind after collapsing (e.g. only highlights queued) is disconnected.
+SSE_LAG_BUDGET = int(os.getenv("SSE_LAG_BUDGET", "1024"))
+
+# Events that carry graph state; a newer snapshot makes every queued one obsolete.
+GRAPH_EVENTS = ("graph_update", "graph_patch")
+# Status events where only the latest one queued matters.
+LATEST_ONLY_EVENTS = ("index_progress",)
+
+SSE_BROADCAST_SECONDS = REGISTRY.histogram("sse_broadcast_seconds", "Time to encode an event and queue it for every client", ("event",))
+
+
+def encode_sse(message: SseMessage) -> bytes:
+    """Wire format of a single SSE event."""
+    event_id = f"id: {message.id}\n" if message.id is not None else ""
+    return f"{event_id}event: {message.event}\ndata: {message.data}\n\n".encode("utf-8")
+
+
+class SseSubscriber:
+    """Bounded event buffer of one SSE client, consumed with ``async for``.
+
+    A new graph_update replaces any graph events still queued (latest wins),
+    as does a new index_progress for queued index_progress events;
+    highlight_update and graph_patch events keep their order. When more than
+    ``buffer_size`` events pile up, the queued graph events are dropped and the
+    client gets one fresh snapshot instead; beyond ``lag_budget`` it is closed.
+    """
+
+    def __init__(self, snapshot: Callable[[], SseMessage], buffer_size: int = SSE_CLIENT_BUFFER, lag_budget: int = SSE_LAG_BUDGET):
+        self._snapshot = snapshot
+        self.buffer_size = buffer_size
+        self.lag_budget = lag_budget
+        self._events: Deque[Tuple[Optional[str], bytes]] = deque()
+        self._wakeup = asyncio.Event()
+        self._resync = False
+        self.closed = False
+        self.dropped = 0
+        self.resyncs = 0
+        # Assigned by SseBroadcaster.subscribe; labels the client's metrics
+        self.client_id = 0
+
+    def __len__(self) -> int:
+        return len(self._events) + (1 if self._resync else 0)
+
+    def push(self, event: Optional[str], payload: bytes):
+        if self.closed:
+            return
+        if event == "graph_update":
+            self._drop_graph_events()
+            self._resync = False
+        elif event == "graph_patch" and self._resync:
+            # The pending snapshot will already include this change
+            self.dropped += 1
+            return
+        elif event in LATEST_ONLY_EVENTS:
+            kept = deque(item for item in self._events if item[0] != event)
+            self.dropped += len(self._events) - len(kept)
+            self._events = kept
+        self._events.append((event, payload))
+        if len(self._events) > self.buffer_size:
+            self._drop_graph_events()
+            self._resync = True
+            self.resyncs += 1
+            if len(self._events) > self.lag_budget:
+                self.close()
+        self._wakeup.set()
+
+    def _drop_graph_events(self):
+        kept = deque(item for item in self._events if item[0] not in GRAPH_EVENTS)
+        self.dropped += len(self._events) - len(kept)
+        self._events = kept
+
+    def close(self):
+        self.closed = True
+        self._events.clear()
+        self._wakeup.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        while True:
+            if self.closed:
+                raise StopAsyncIteration
+            if self._events:
+                return self._events.popleft()[1]
+            if self._resync:
+                self._resync = False
+                return encode_sse(self._snapshot())
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+
+class SseBroadcaster:
+    """Fans each message out to every subscriber, encoding it only once."""
+
+    def __init__(self, snapshot: Callable[[], SseMessage]):
+        self._snapshot = snapshot
+        self.subscribers: List[SseSubscriber] = []
+        self._client_ids = itertools.count(1)
+        # Totals of clients that are gone, so the exported counters never decrease
+        self._gone_dropped = 0
+        self._gone_resyncs = 0
+        self.lagging_disconnects = 0
+
+    def subscribe(self, initial: Iterable[SseMessage] = ()) -> SseSubscriber:
+        subscriber = SseSubscriber(self._snapshot)
+        subscriber.client_id = next(self._client_ids)
+        for message in initial:
+            subscriber.push(message.event, encode_sse(message))
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: SseSubscriber):
+        subscriber.close()
+        if subscriber in self.subscribers:
+            self._retire(subscriber)
+
+    def _retire(self, subscriber: SseSubscriber):
+        self.subscribers.remove(subscriber)
+        self._gone_dropped += subscriber.dropped
+        self._gone_resyncs += subscriber.resyncs
+
+    def publish(self, message: SseMessage):
+        """Queue message for every client without waiting on any of them."""
+        started = time.perf_counter()
+        payload = encode_sse(message)
+        for subscriber in list(self.subscribers):
+            subscriber.push(message.event, payload)
+            if subscriber.closed:
+                # Closed by push: over its lag budget
+                self.lagging_disconnects += 1
+                self._retire(subscriber)
+        SSE_BROADCAST_SECONDS.observe(time.perf_counter() - started, event=message.event or "message")
+
+    def metrics(self) -> List[Metric]:
+        """Per-client queue depths and drop counts, for MetricsRegistry.collector."""
+        clients = Gauge("sse_clients", "Connected SSE clients")
+        depth = Gauge("sse_client_queue_depth", "Events queued for an SSE client", ("client",))
+        client_dropped = Gauge("sse_client_dropped_messages", "Events dropped or collapsed for an SSE client so far", ("client",))
+        dropped = Counter("sse_dropped_messages_total", "Events dropped or collapsed across all SSE clients")
+        resyncs = Counter("sse_resyncs_total", "Times an SSE client fell behind and was sent a snapshot instead")
+        disconnects = Counter("sse_lagging_disconnects_total", "SSE clients disconnected for exceeding the lag budget")
+        subscribers = list(self.subscribers)
+        clients.set(len(subscribers))
+        for subscriber in subscribers:
+            depth.set(len(subscriber), client=subscriber.client_id)
+            client_dropped.set(subscriber.dropped, client=subscriber.client_id)
+        dropped.inc(self._gone_dropped + sum(subscriber.dropped for subscriber in subscribers))
+        resyncs.inc(self._gone_resyncs + sum(subscriber.resyncs for subscriber in subscribers))
+        disconnects.inc(self.lagging_disconnects)
+        return [clients, depth, client_dropped, dropped, resyncs, disconnects]
@@ -0,0 +1,84 @@
+import os
+from collections import deque
+from typing import Any, Collection, Dict, Iterable, Optional
+
+from adjacency import Adjacency
+from graph_records import NodeRecord
+
+# --- Configuration ---
+# Largest depth a /subgraph request may ask for, and the node limit applied
+# when it asks for none (or for more).
+SUBGRAPH_MAX_DEPTH = int(os.getenv("SUBGRAPH_MAX_DEPTH", "6"))
+SUBGRAPH_MAX_NODES = int(os.getenv("SUBGRAPH_MAX_NODES", "5000"))
+
+
+def k_hop_subgraph(adjacency: Adjacency, nodes: Dict[str, NodeRecord], seed_node_ids: Iterable[str] = (), seed_edge_ids: Iterable[str] = (),
+                   depth: int = 1, max_fanout: Optional[int] = None, max_nodes: Optional[int] = None, max_edges: Optional[int] = None,
+                   node_labels: Optional[Collection[str]] = None, edge_labels: Optional[Collection[str]] = None) -> Dict[str, Any]:
+    """Breadth-first k-hop neighborhood of the seeds.
+
+    Seed edges count as depth 0 together with their endpoints. From every node
+    closer than ``depth`` hops, up to ``max_fanout`` incident edges are
+    followed (in graph order) whose label is in ``edge_labels`` and whose
+    other end's label is in ``node_labels``; seeds are kept whatever their
+    labels. Edges leading back to nodes already reached are included as
+    well (and count towards the fan-out). Traversal stops adding nodes
+    at ``max_nodes`` and edges at ``max_edges``, and ``truncated`` tells
+    whether any limit cut it short. Unknown seed ids are returned in
+    ``missing``.
+    """
+    depths: Dict[str, int] = {}
+    edges: Dict[str, Any] = {}
+    missing = []
+    truncated = False
+    queue = deque()
+
+    def visit(node_id: str, node_depth: int) -> bool:
+        nonlocal truncated
+        if node_id in depths:
+            return True
+        if max_nodes is not None and len(depths) >= max_nodes:
+            truncated = True
+            return False
+        depths[node_id] = node_depth
+        queue.append(node_id)
+        return True
+
+    for node_id in seed_node_ids:
+        if node_id in nodes:
+            visit(node_id, 0)
+        else:
+            missing.append(node_id)
+    for edge_id in seed_edge_ids:
+        edge = adjacency.edge(edge_id)
+        if edge is None:
+            missing.append(edge_id)
+        elif visit(edge.source, 0) and visit(edge.target, 0):
+            edges[edge.id] = edge
+
+    while queue:
+        node_id = queue.popleft()
+        node_depth = depths[node_id]
+        if node_depth >= depth:
+            continue
+        followed = 0
+        for edge in adjacency.incident_edges(node_id):
+            if edge.id in edges or (edge_labels is not None and edge.label not in edge_labels):
+                continue
+            other = edge.target if edge.source == node_id else edge.source
+            if other not in depths and node_labels is not None and (other not in nodes or nodes[other].label not in node_labels):
+                continue
+            if (max_fanout is not None and followed >= max_fanout) or (max_edges is not None and len(edges) >= max_edges):
+                truncated = True
+                break
+            if visit(other, node_depth + 1):
+                edges[edge.id] = edge
+                followed += 1
+
+    return {
+        "nodes": [nodes[node_id] for node_id in depths if node_id in nodes],
+        "edges": list(edges.values()),
+        "depths": depths,
+        "truncated": truncated,
+        "missing": missing,
+    }
@@ -0,0 +1,17 @@
+from models import Edge
+from adjacency import Adjacency
+
+def test_incident_edges_keep_graph_order():
+    edges = [
+        Edge(source="1", target="2", label="a", id="e1"),
+        Edge(source="3", target="1", label="b", id="e2"),
+        Edge(source="2", target="3", label="c", id="e3"),
+        Edge(source="1", target="1", label="loop", id="e4"),
+    ]
+    adjacency = Adjacency(edges)
+
+    assert [e.id for e in adjacency.incident_edges("1")] == ["e1", "e2", "e4"]
+    assert adjacency.degree("3") == 2
+    assert adjacency.incident_edges("missing") == []
+    assert adjacency.edge("e3").target == "3"
+    assert adjacency.edge("missing") is None
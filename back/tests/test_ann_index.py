@@ -0,0 +1,134 @@
+import pytest
+import numpy as np
+from ann_index import IVFIndex, GraphSearchIndex
+from embedding_matrix import EmbeddingMatrix
+
+def random_vectors(count, dim=16, seed=1):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_small_index_is_exact():
+    vectors = random_vectors(50)
+    index = IVFIndex(exact_threshold=100)
+    matrix = EmbeddingMatrix.from_embeddings((str(i), v) for i, v in enumerate(vectors))
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector)
+
+    assert not index.trained
+    query = vectors[7]
+    assert [m[0] for m in index.top_k(query, 5, min_threshold=-1)] == [m[0] for m in matrix.top_k(query, 5, min_threshold=-1)]
+
+def test_trained_index_finds_exact_match():
+    vectors = random_vectors(400)
+    index = IVFIndex(exact_threshold=100, nprobe=4)
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector)
+
+    assert index.trained
+    hits = sum(index.best_match(vectors[i], min_threshold=0)[0] == str(i) for i in range(0, 400, 10))
+    assert hits >= 38
+
+def test_probing_every_list_matches_exact_scan():
+    vectors = random_vectors(300)
+    index = IVFIndex(exact_threshold=100, nprobe=10_000)
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector)
+    matrix = EmbeddingMatrix.from_embeddings((str(i), v) for i, v in enumerate(vectors))
+
+    query = random_vectors(1, seed=5)[0]
+    assert [m[0] for m in index.top_k(query, 10, -1)] == [m[0] for m in matrix.top_k(query, 10, -1)]
+
+def test_add_replace_and_remove():
+    index = IVFIndex()
+    index.add("a", [1.0, 0.0])
+    index.add("b", [0.0, 1.0])
+    index.add("a", [0.0, 0.5])
+    assert len(index) == 2
+    assert index.top_k([0.0, 1.0], 2, min_threshold=-1) == [("b", 1.0), ("a", 0.5)]
+    index.remove("b")
+    assert "b" not in index
+    assert index.best_match([0.0, 1.0], min_threshold=0) == ("a", 0.5)
+
+def test_repeated_updates_do_not_grow_storage():
+    vectors = random_vectors(300)
+    index = IVFIndex(exact_threshold=100, nprobe=64)
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector)
+    for _ in range(5):
+        for i, vector in enumerate(vectors):
+            index.add(str(i), vector)
+
+    assert len(index) == 300 and len(index._ids) <= 600
+    assert index.best_match(vectors[42], min_threshold=0)[0] == "42"
+
+def test_graph_search_index_applies_pending_texts():
+    search_index = GraphSearchIndex()
+    search_index.reset({"1": "1: one"}, {"e1": "1-2: link"})
+    search_index.set_node("2", "2: two")
+    search_index.remove_node("1")
+    assert sorted(search_index.pending_texts()) == ["1-2: link", "2: two"]
+
+    embedded = []
+    def embed_many(texts):
+        embedded.extend(texts)
+        return [[1.0, float(len(text))] for text in texts]
+    search_index.apply_pending(embed_many)
+
+    assert search_index.pending_texts() == []
+    assert "2" in search_index.nodes and "1" not in search_index.nodes
+    assert "e1" in search_index.edges
+
+    # Unchanged text is not re-embedded
+    search_index.set_node("2", "2: two")
+    assert search_index.pending_texts() == []
+
+def test_training_copy_catches_up_with_later_changes():
+    vectors = random_vectors(300)
+    index = IVFIndex(exact_threshold=100, auto_train=False)
+    for i, vector in enumerate(vectors[:200]):
+        index.add(str(i), vector)
+    assert index.needs_training and not index.trained
+
+    trained, rows = index.training_copy(), len(index._ids)
+    trained.train()
+    index.remove("0")
+    index.add("1", vectors[299])
+    for i in range(200, 250):
+        index.add(str(i), vectors[i])
+    trained.catch_up(index, rows)
+
+    assert trained.trained and len(trained) == 249 and "0" not in trained
+    assert trained.top_k_among(vectors[299], ["1"], 1, -1)[0][1] == pytest.approx(1.0)
+    assert trained.top_k_among(vectors[240], ["240"], 1, -1)[0][1] == pytest.approx(1.0)
+
+def test_graph_search_index_trains_without_holding_its_lock(monkeypatch):
+    search_index = GraphSearchIndex(exact_threshold=50)
+    search_index.reset({str(i): f"{i}: text" for i in range(60)})
+    train = IVFIndex.train
+    lock_free = []
+
+    def checked_train(index):
+        lock_free.append(search_index._lock.acquire(blocking=False))
+        search_index._lock.release()
+        search_index.remove_node("0")
+        train(index)
+    monkeypatch.setattr(IVFIndex, "train", checked_train)
+
+    vectors = random_vectors(60)
+    search_index.apply_pending(lambda texts: [vectors[int(text.split(":")[0])] for text in texts])
+    assert lock_free == [True]
+    assert search_index.nodes.trained
+    assert len(search_index.scorer("node")) == 59
+
+def test_top_k_among_is_exact_over_given_ids():
+    vectors = random_vectors(300)
+    index = IVFIndex(exact_threshold=100, nprobe=1)
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector)
+    matrix = EmbeddingMatrix.from_embeddings((str(i), v) for i, v in enumerate(vectors))
+
+    ids = [str(i) for i in range(0, 300, 7)]
+    query = random_vectors(1, seed=5)[0]
+    found, expected = index.top_k_among(query, ids, 5, -1), matrix.top_k_among(query, ids, 5, -1)
+    assert [m[0] for m in found] == [m[0] for m in expected]
+    assert [m[1] for m in found] == pytest.approx([m[1] for m in expected], abs=1e-5)
@@ -0,0 +1,28 @@
+import requests
+
+from benchmarks.compare import compare
+from benchmarks.fake_ollama import FakeOllamaServer, fake_embedding
+from benchmarks.generators import generate_graph, parse_size
+
+def test_generated_graph_is_deterministic_and_consistent():
+    graph = generate_graph(parse_size("1k"), seed=3)
+    assert graph == generate_graph(1000, seed=3)
+    assert len(graph["nodes"]) + len(graph["edges"]) == 1000
+    node_ids = {node["id"] for node in graph["nodes"]}
+    assert all(edge["source"] in node_ids and edge["target"] in node_ids for edge in graph["edges"])
+    assert set(graph["allValues"]) <= node_ids | {edge["id"] for edge in graph["edges"]}
+
+def test_fake_ollama_serves_deterministic_unit_vectors():
+    with FakeOllamaServer(dim=16) as server:
+        response = requests.post(f"{server.url}/api/embed", json={"model": "m", "input": ["order item", "user account"]})
+    embeddings = response.json()["embeddings"]
+    assert embeddings[0] == fake_embedding("order item", 16)
+    assert abs(sum(x * x for x in embeddings[1]) - 1) < 1e-9
+    assert server.requests == 1 and server.texts == 2
+
+def test_compare_flags_slowdowns_beyond_threshold():
+    baseline = {("search_all", "1k"): {"median_s": 0.010}, ("load_graph", "1k"): {"median_s": 0.010}}
+    current = {("search_all", "1k"): {"median_s": 0.0105}, ("load_graph", "1k"): {"median_s": 0.020}}
+    rows = {row["name"]: row for row in compare(baseline, current, threshold=0.1)}
+    assert not rows["search_all"]["regression"]
+    assert rows["load_graph"]["regression"] and rows["load_graph"]["ratio"] == 2
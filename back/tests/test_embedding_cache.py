@@ -0,0 +1,127 @@
+import hashlib
+import numpy as np
+from embedding_cache import DiskEmbeddingCache, cache_key
+
+def test_put_and_get(tmp_path):
+    cache = DiskEmbeddingCache(str(tmp_path), "test-model")
+    assert cache.get("1: Definition 1") is None
+    cache.put("1: Definition 1", [0.1, 0.2, 0.3])
+    np.testing.assert_allclose(cache.get("1: Definition 1"), [0.1, 0.2, 0.3], rtol=1e-6)
+    assert "1: Definition 1" in cache
+    assert cache.hits == 1 and cache.misses == 1
+
+def test_peek_leaves_counters_and_recency_alone(tmp_path):
+    cache = DiskEmbeddingCache(str(tmp_path), "test-model")
+    cache.put("a", [1.0, 2.0])
+    np.testing.assert_array_equal(cache.peek("a"), [1.0, 2.0])
+    assert cache.peek("b") is None
+    assert cache.hits == 0 and cache.misses == 0
+    assert cache._last_used == {0: 1}
+
+def test_survives_reload(tmp_path):
+    cache = DiskEmbeddingCache(str(tmp_path), "test-model")
+    cache.put("a", [1.0, 2.0])
+    cache.put("b", [3.0, 4.0])
+
+    reloaded = DiskEmbeddingCache(str(tmp_path), "test-model")
+    assert len(reloaded) == 2
+    np.testing.assert_array_equal(reloaded.get("b"), [3.0, 4.0])
+    reloaded.put("c", [5.0, 6.0])
+    np.testing.assert_array_equal(reloaded.get("c"), [5.0, 6.0])
+
+def test_key_includes_model(tmp_path):
+    assert cache_key("model-a", "text") != cache_key("model-b", "text")
+    DiskEmbeddingCache(str(tmp_path), "model-a").put("text", [1.0])
+    assert DiskEmbeddingCache(str(tmp_path), "model-b").get("text") is None
+
+def test_ignores_entries_keyed_without_the_vector_kind(tmp_path):
+    # Written by a version that cached unnormalized /api/embeddings vectors
+    cache = DiskEmbeddingCache(str(tmp_path), "test-model")
+    cache.put("other", [1.0, 0.0])
+    with open(cache._vectors_path, "ab") as f:
+        f.write(np.array([3.0, 4.0], dtype=np.float32).tobytes())
+    with open(cache._keys_path, "ab") as f:
+        f.write(hashlib.sha256("test-model\ntext".encode("utf-8")).digest())
+    assert DiskEmbeddingCache(str(tmp_path), "test-model").get("text") is None
+
+def test_evicts_least_recently_used(tmp_path):
+    # Room for 4 two-dim float32 vectors; eviction compacts down to 3.
+    cache = DiskEmbeddingCache(str(tmp_path), "test-model", max_bytes=32)
+    for i in range(4):
+        cache.put(f"text {i}", [float(i), 0.0])
+    cache.get("text 0")
+    cache.put("text 4", [4.0, 0.0])
+
+    assert len(cache) == 3
+    assert cache.size_bytes <= 32
+    np.testing.assert_array_equal(cache.get("text 0"), [0.0, 0.0])
+    assert cache.get("text 1") is None
+    assert len(DiskEmbeddingCache(str(tmp_path), "test-model")) == 3
+
+def test_instances_sharing_a_directory_see_each_others_rows(tmp_path):
+    # Stands in for two worker processes using the same cache files
+    first = DiskEmbeddingCache(str(tmp_path), "test-model")
+    second = DiskEmbeddingCache(str(tmp_path), "test-model")
+    first.put("a", [1.0, 2.0])
+    second.put("b", [3.0, 4.0])
+    np.testing.assert_array_equal(second.get("a"), [1.0, 2.0])
+    np.testing.assert_array_equal(first.get("b"), [3.0, 4.0])
+    assert len(DiskEmbeddingCache(str(tmp_path), "test-model")) == 2
+
+def test_reloads_after_another_instance_compacted(tmp_path):
+    writer = DiskEmbeddingCache(str(tmp_path), "test-model", max_bytes=32)
+    reader = DiskEmbeddingCache(str(tmp_path), "test-model", max_bytes=32)
+    for i in range(5):
+        writer.put(f"text {i}", [float(i), 0.0])
+    np.testing.assert_array_equal(reader.get("text 4"), [4.0, 0.0])
+    assert reader.get("text 0") is None
+
+def test_rows_read_after_another_instance_compacted(tmp_path):
+    writer = DiskEmbeddingCache(str(tmp_path), "test-model", max_bytes=32)
+    reader = DiskEmbeddingCache(str(tmp_path), "test-model", max_bytes=32)
+    # A row the reader appended itself and has not mapped yet
+    reader.put("own", [9.0, 9.0])
+    for i in range(5):
+        writer.put(f"text {i}", [float(i), 0.0])
+    # The compaction dropped "own" and moved every row it kept
+    assert reader.peek("own") is None
+    assert reader.get("own") is None
+    np.testing.assert_array_equal(reader.peek("text 4"), [4.0, 0.0])
+
+def test_reloads_when_a_rewrite_keeps_the_inode(tmp_path):
+    cache = DiskEmbeddingCache(str(tmp_path), "test-model")
+    for i in range(2):
+        cache.put(f"text {i}", [float(i), 0.0])
+    # Another process compacted into a file that reused the inode, then appended past the old size
+    rows = [("text 1", [1.0, 0.0]), ("text 2", [2.0, 0.0]), ("text 3", [3.0, 0.0])]
+    with open(cache._keys_path, "r+b") as f:
+        f.truncate()
+        f.write(b"".join(cache_key("test-model", text) for text, _ in rows))
+    with open(cache._vectors_path, "r+b") as f:
+        f.truncate()
+        f.write(np.array([vector for _, vector in rows], dtype=np.float32).tobytes())
+    np.testing.assert_array_equal(cache.get("text 1"), [1.0, 0.0])
+    np.testing.assert_array_equal(cache.get("text 3"), [3.0, 0.0])
+    assert cache.get("text 0") is None
+
+def test_torn_append_is_truncated(tmp_path):
+    cache = DiskEmbeddingCache(str(tmp_path), "test-model")
+    cache.put("a", [1.0, 0.0])
+    # A crash after the vector append but before the key append
+    with open(cache._vectors_path, "ab") as f:
+        f.write(np.array([9.0, 9.0], dtype=np.float32).tobytes())
+
+    reopened = DiskEmbeddingCache(str(tmp_path), "test-model")
+    reopened.put("b", [0.0, 1.0])
+    np.testing.assert_array_equal(reopened.get("b"), [0.0, 1.0])
+    np.testing.assert_array_equal(DiskEmbeddingCache(str(tmp_path), "test-model").get("b"), [0.0, 1.0])
+
+def test_torn_append_in_a_running_writer(tmp_path):
+    cache = DiskEmbeddingCache(str(tmp_path), "test-model")
+    cache.put("a", [1.0, 0.0])
+    # Another process crashed after appending only a key
+    with open(cache._keys_path, "ab") as f:
+        f.write(b"x" * 32)
+    cache.put("b", [0.0, 1.0])
+    np.testing.assert_array_equal(DiskEmbeddingCache(str(tmp_path), "test-model").get("b"), [0.0, 1.0])
+    np.testing.assert_array_equal(cache.get("b"), [0.0, 1.0])
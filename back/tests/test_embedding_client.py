@@ -0,0 +1,64 @@
+import json
+import asyncio
+import httpx
+import pytest
+from unittest.mock import MagicMock
+from fastapi import HTTPException
+from embedding_cache import DiskEmbeddingCache
+from embedding_client import EmbeddingClient
+
+def make_client(tmp_path, batch_size=2, concurrency=2):
+    client = EmbeddingClient(base_url="http://ollama:11434", model="test-model", batch_size=batch_size,
+                             concurrency=concurrency, cache=DiskEmbeddingCache(str(tmp_path), "test-model"))
+    client.session = MagicMock()
+
+    def post(url, json):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"embeddings": [[float(len(text)), 1.0] for text in json["input"]]}
+        return response
+    client.session.post.side_effect = post
+    return client
+
+def test_embed_many_batches_misses(tmp_path):
+    client = make_client(tmp_path)
+    result = client.embed_many(["a", "bb", "ccc", "a"])
+
+    assert result == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [1.0, 1.0]]
+    # Three unique texts with a batch size of two
+    assert client.session.post.call_count == 2
+    url = client.session.post.call_args_list[0].args[0]
+    assert url == "http://ollama:11434/api/embed"
+
+def test_embed_many_uses_cache(tmp_path):
+    client = make_client(tmp_path)
+    client.embed_many(["a", "bb"])
+    client.session.post.reset_mock()
+
+    assert client.embed("bb") == {"embedding": [2.0, 1.0]}
+    client.session.post.assert_not_called()
+
+def test_embed_many_raises_on_error(tmp_path):
+    client = make_client(tmp_path)
+    client.session.post.side_effect = None
+    client.session.post.return_value = MagicMock(status_code=500)
+
+    with pytest.raises(HTTPException):
+        client.embed_many(["a"])
+
+def test_aembed_many_batches_misses(tmp_path):
+    client = make_client(tmp_path, batch_size=2, concurrency=1)
+    requests_seen = []
+
+    def handler(request):
+        texts = json.loads(request.content)["input"]
+        requests_seen.append(texts)
+        return httpx.Response(200, json={"embeddings": [[float(len(text)), 1.0] for text in texts]})
+    client._async_client = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+
+    result = asyncio.run(client.aembed_many(["a", "bb", "ccc", "a"]))
+    assert result == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [1.0, 1.0]]
+    assert requests_seen == [["a", "bb"], ["ccc"]]
+
+    # Second call is served from the cache
+    asyncio.run(client.aembed_many(["ccc"]))
+    assert len(requests_seen) == 2
@@ -0,0 +1,41 @@
+import numpy as np
+from embedding_matrix import EmbeddingMatrix
+
+def make_matrix():
+    return EmbeddingMatrix.from_embeddings([
+        ("a", [1.0, 0.0]),
+        ("b", [0.0, 2.0]),
+        ("c", [1.0, 1.0]),
+    ])
+
+def test_best_match_above_threshold():
+    matrix = make_matrix()
+    assert matrix.best_match([1.0, 0.0], min_threshold=0) == ("a", 1.0)
+    assert matrix.best_match([0.0, 1.0], min_threshold=0) == ("b", 2.0)
+    assert matrix.best_match([1.0, 0.0], min_threshold=5) == (None, 0)
+
+def test_best_match_prefers_first_row_on_ties():
+    tied = EmbeddingMatrix.from_embeddings([("x", [1.0]), ("y", [1.0])])
+    assert tied.best_match([1.0], min_threshold=0) == ("x", 1.0)
+
+def test_best_matches_scores_all_queries_at_once():
+    matrix = make_matrix()
+    results = matrix.best_matches([[1.0, 0.0], [0.0, 1.0], [-1.0, -1.0]], min_threshold=0)
+    assert results == [("a", 1.0), ("b", 2.0), (None, 0)]
+
+def test_top_k_orders_by_score():
+    matrix = make_matrix()
+    assert matrix.top_k([1.0, 1.0], 2, min_threshold=0) == [("b", 2.0), ("c", 2.0)]
+    assert matrix.top_k([1.0, 1.0], 10, min_threshold=1.5) == [("b", 2.0), ("c", 2.0)]
+
+def test_empty_matrix():
+    matrix = EmbeddingMatrix.from_embeddings([])
+    assert len(matrix) == 0
+    assert matrix.best_match([1.0, 2.0], min_threshold=0) == (None, 0)
+    assert matrix.best_matches([[1.0, 2.0]], min_threshold=0) == [(None, 0)]
+    assert isinstance(matrix.vectors, np.ndarray)
+
+def test_top_k_among_scores_only_given_ids():
+    matrix = make_matrix()
+    assert matrix.top_k_among([1.0, 1.0], ["c", "a", "missing"], 2, min_threshold=0) == [("c", 2.0), ("a", 1.0)]
+    assert matrix.top_k_among([1.0, 1.0], [], 2, min_threshold=0) == []
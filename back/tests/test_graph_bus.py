@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+import graph_bus
+from graph_bus import GraphBus, GraphBusError
+from graph_store import GraphStore, DuplicateIdError
+from graph_records import NodeRecord
+
+class Replica:
+    """One worker's graph, wired to a bus the way main does it."""
+
+    def __init__(self, socket_path=""):
+        self.store = GraphStore()
+        self.published = []
+        self.bus = GraphBus(
+            appliers={"add_node": self.add_node},
+            publish_local=self.publish_local, snapshot=self.snapshot, restore=self.restore,
+            version=lambda: self.store.version, socket_path=socket_path, retry_seconds=0.01,
+        )
+
+    async def add_node(self, node):
+        return self.store.add_node(node)
+
+    async def publish_local(self, message):
+        self.published.append(message)
+
+    def snapshot(self):
+        return {"version": self.store.version, "nodes": [node.to_dict() for node in self.store.nodes.values()]}
+
+    async def restore(self, state):
+        self.store.load_records([NodeRecord.from_dict(n) for n in state["nodes"]], [], {}, version=state["version"])
+
+def node(node_id):
+    return {"id": node_id, "label": node_id}
+
+async def settle(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("replicas did not converge")
+
+def test_without_socket_applies_locally():
+    replica = Replica()
+    assert replica.bus.role == "single"
+
+    async def scenario():
+        await replica.bus.start()
+        assert await replica.bus.submit("add_node", node("a")) == 1
+        await replica.bus.publish({"event": "highlight_update"})
+
+    asyncio.run(scenario())
+    assert list(replica.store.nodes) == ["a"]
+    assert replica.published == [{"event": "highlight_update"}]
+
+def test_workers_share_mutations_in_one_order(tmp_path):
+    socket_path = str(tmp_path / "bus.sock")
+    hub, follower, late = Replica(socket_path), Replica(socket_path), Replica(socket_path)
+
+    async def scenario():
+        await hub.bus.start()
+        await hub.bus.submit("add_node", node("a"))
+        await follower.bus.start()
+        assert (hub.bus.role, follower.bus.role) == ("hub", "follower")
+        # A joining worker starts from the hub's snapshot
+        assert list(follower.store.nodes) == ["a"]
+
+        assert await follower.bus.submit("add_node", node("b")) == 2
+        with pytest.raises(DuplicateIdError):
+            await follower.bus.submit("add_node", node("a"))
+        await hub.bus.publish({"event": "highlight_update"})
+        await settle(lambda: len(follower.published) == 1)
+
+        await late.bus.start()
+        await hub.bus.submit("add_node", node("c"))
+        await settle(lambda: len(follower.store.nodes) == 3 and len(late.store.nodes) == 3)
+        for bus in (late.bus, follower.bus, hub.bus):
+            await bus.stop()
+
+    asyncio.run(scenario())
+    assert list(hub.store.nodes) == list(follower.store.nodes) == list(late.store.nodes) == ["a", "b", "c"]
+    assert hub.store.version == follower.store.version == late.store.version == 3
+    assert hub.published == follower.published == [{"event": "highlight_update"}]
+
+def test_follower_takes_over_when_hub_stops(tmp_path):
+    socket_path = str(tmp_path / "bus.sock")
+    hub, follower = Replica(socket_path), Replica(socket_path)
+
+    async def scenario():
+        await hub.bus.start()
+        await follower.bus.start()
+        await follower.bus.submit("add_node", node("a"))
+        await hub.bus.stop()
+        await settle(lambda: follower.bus.is_hub)
+        await follower.bus.submit("add_node", node("b"))
+        # The old hub rejoins behind the new one and catches up
+        await hub.bus.start()
+        assert hub.bus.role == "follower"
+        await follower.bus.stop()
+        await hub.bus.stop()
+
+    asyncio.run(scenario())
+    assert list(hub.store.nodes) == ["a", "b"] and hub.store.version == 2
+
+def test_default_socket_per_deployment(tmp_path, monkeypatch):
+    monkeypatch.setattr(graph_bus, "WEB_CONCURRENCY", 1)
+    assert graph_bus._default_socket() == ""
+    monkeypatch.setattr(graph_bus, "WEB_CONCURRENCY", 2)
+    first = graph_bus._default_socket()
+    monkeypatch.chdir(tmp_path)
+    assert first and graph_bus._default_socket() != first
+
+def test_failed_commit_hook_still_reaches_every_replica(tmp_path):
+    socket_path = str(tmp_path / "bus.sock")
+    hub, follower = Replica(socket_path), Replica(socket_path)
+
+    async def failing(method, args):
+        raise OSError("disk full")
+
+    async def scenario():
+        await hub.bus.start()
+        await follower.bus.start()
+        hub.bus.on_commit = failing
+        with pytest.raises(GraphBusError):
+            await follower.bus.submit("add_node", node("a"))
+        await follower.bus.stop()
+        await hub.bus.stop()
+
+    asyncio.run(scenario())
+    assert list(hub.store.nodes) == list(follower.store.nodes) == ["a"]
@@ -2,11 +2,14 @@ import pytest
 from unittest.mock import patch, MagicMock
 from typing import List, Dict, Any
 from models import GraphData, Node, Edge, Object, Relation
+from adjacency import Adjacency
 from graph_matching import (
     calculate_string_embedding,
     find_best_match_for_object,
     find_best_match_for_relation,
     get_neighbors,
+    iter_search_all,
+    relation_candidate_edges,
     search_all,
     MIN_DOT_PRODUCT_THRESHOLD
 )
@@ -117,8 +120,9 @@ def test_get_neighbors(mock_graph_data):
     assert neighbors == ["1", "2"]
 
 # Test search_all with objects
+@patch('graph_matching.build_node_matrix')
 @patch('graph_matching.find_best_match_for_object')
-def test_search_all_with_objects(mock_find_object, mock_graph_data, mock_object):
+def test_search_all_with_objects(mock_find_object, mock_build_matrix, mock_graph_data, mock_object):
     # Mock find_best_match_for_object to return a match
     mock_find_object.return_value = ("1", MIN_DOT_PRODUCT_THRESHOLD + 1)
 
@@ -131,8 +135,9 @@ def test_search_all_with_objects(mock_find_object, mock_graph_data, mock_object)
     assert result["links"][0]["neighbors"] == ["2"]
 
 # Test search_all with relations
+@patch('graph_matching.build_edge_matrix')
 @patch('graph_matching.find_best_match_for_relation')
-def test_search_all_with_relations(mock_find_relation, mock_graph_data, mock_relation):
+def test_search_all_with_relations(mock_find_relation, mock_build_matrix, mock_graph_data, mock_relation):
     # Mock find_best_match_for_relation to return a match
     mock_find_relation.return_value = ("e1", MIN_DOT_PRODUCT_THRESHOLD + 1)
 
@@ -145,9 +150,11 @@ def test_search_all_with_relations(mock_find_relation, mock_graph_data, mock_rel
     assert result["links"][0]["neighbors"] == ["1", "2"]
 
 # Test search_all with no matches
+@patch('graph_matching.build_node_matrix')
+@patch('graph_matching.build_edge_matrix')
 @patch('graph_matching.find_best_match_for_object')
 @patch('graph_matching.find_best_match_for_relation')
-def test_search_all_no_matches(mock_find_object, mock_find_relation, mock_graph_data, mock_object, mock_relation):
+def test_search_all_no_matches(mock_find_object, mock_find_relation, mock_build_edges, mock_build_nodes, mock_graph_data, mock_object, mock_relation):
     # Mock find_best_match_for_object and find_best_match_for_relation to return no matches
     mock_find_object.return_value = (None, 0)
     mock_find_relation.return_value = (None, 0)
@@ -158,10 +165,108 @@ def test_search_all_no_matches(mock_find_object, mock_find_relation, mock_graph_
     assert len(result["edges"]) == 0
     assert len(result["links"]) == 0
 
+# Test search_all with top_k candidates
+@patch('graph_matching.calculate_string_embedding')
+def test_search_all_top_k(mock_calculate_embedding, mock_graph_data, mock_object):
+    embeddings = {
+        "1: Definition 1": [0.05, 0.1, 0.15],
+        "2: Definition 2": [0.01, 0.02, 0.03],
+        "Test Object: Test definition": [0.1, 0.2, 0.3],
+    }
+    mock_calculate_embedding.side_effect = lambda entity_id, definition: {"embedding": embeddings[f"{entity_id}: {definition}"]}
+
+    result = search_all(mock_graph_data, [mock_object], [], min_threshold=0, top_k=2)
+    assert [node.id for node in result["nodes"]] == ["1"]
+    assert [candidate["id"] for candidate in result["links"][0]["candidates"]] == ["1", "2"]
+
 # Test search_all with empty input
 def test_search_all_empty_input(mock_graph_data):
     # Test with empty input
     result = search_all(mock_graph_data, [], [], min_threshold=0)
     assert len(result["nodes"]) == 0
     assert len(result["edges"]) == 0
-    assert len(result["links"]) == 0
\ No newline at end of file
+    assert len(result["links"]) == 0
+
+
+# Test get_neighbors with a prebuilt adjacency index on a hub node
+def test_get_neighbors_with_adjacency():
+    graph_data = GraphData(
+        nodes=[Node(id=str(i), label=f"Node {i}") for i in range(4)],
+        edges=[
+            Edge(source="0", target="1", label="a", id="e1"),
+            Edge(source="2", target="0", label="b", id="e2"),
+            Edge(source="0", target="1", label="c", id="e3"),
+            Edge(source="0", target="3", label="d", id="e4"),
+        ],
+        allValues={}
+    )
+    node_ids = {node.id for node in graph_data.nodes}
+    edge_ids = {edge.id for edge in graph_data.edges}
+    adjacency = Adjacency.from_graph(graph_data)
+
+    neighbors = get_neighbors("0", graph_data, {"3"}, node_ids, edge_ids, adjacency)
+    assert neighbors == ["1", "2"]
+
+@pytest.fixture
+def chain_graph():
+    # a - b - c - d, each edge with its own definition
+    return GraphData(
+        nodes=[Node(id=node_id, label=node_id) for node_id in "abcd"],
+        edges=[
+            Edge(source="a", target="b", label="ab", id="ab"),
+            Edge(source="b", target="c", label="bc", id="bc"),
+            Edge(source="c", target="d", label="cd", id="cd"),
+        ],
+        allValues={edge_id: {"definition": edge_id} for edge_id in ("ab", "bc", "cd")}
+    )
+
+def test_relation_candidate_edges_by_hops(chain_graph):
+    adjacency = Adjacency.from_graph(chain_graph)
+    assert relation_candidate_edges(["a"], adjacency, 1) == ["ab"]
+    assert relation_candidate_edges(["a"], adjacency, 2) == ["ab", "bc"]
+    assert relation_candidate_edges(["b", "d"], adjacency, 1) == ["ab", "bc", "cd"]
+
+# A relation anchored on a matched object only scores (and embeds) the edges around it
+@patch('graph_matching.calculate_string_embedding')
+def test_search_all_scores_relations_near_matched_objects(mock_calculate_embedding, chain_graph):
+    embeddings = {
+        "a: node a": [1.0, 0.0, 0.0],
+        "Cat: node a": [1.0, 0.0, 0.0],
+        "a-b: ab": [0.0, 0.6, 0.0],
+        "b-c: bc": [0.0, 0.7, 0.0],
+        "c-d: cd": [0.0, 0.9, 0.0],
+        "Cat-x: owns": [0.0, 1.0, 0.0],
+    }
+    chain_graph.allValues["a"] = {"definition": "node a"}
+    mock_calculate_embedding.side_effect = lambda entity_id, definition: {"embedding": embeddings[f"{entity_id}: {definition}"]} if definition else {}
+    objects = [{"name": "Cat", "definition": "node a"}]
+    relations = [{"source": "Cat", "target": "x", "definition": "owns"}]
+
+    prefetched = []
+    result = search_all(chain_graph, objects, relations, min_threshold=0, top_k=3, prefetch=prefetched.extend)
+    assert result["links"][1]["edge"] == "ab"
+    assert [candidate["id"] for candidate in result["links"][1]["candidates"]] == ["ab"]
+    assert prefetched == ["a-b: ab"]
+
+    # Unanchored relations, or relation_hops=0, fall back to the whole graph
+    assert search_all(chain_graph, [], relations, min_threshold=0)["links"][0]["edge"] == "cd"
+    assert search_all(chain_graph, objects, relations, min_threshold=0, relation_hops=0)["links"][1]["edge"] == "cd"
+
+# iter_search_all yields each link as soon as its object is scored
+@patch('graph_matching.calculate_string_embedding')
+def test_iter_search_all_yields_links_one_at_a_time(mock_calculate_embedding, chain_graph):
+    embedded = []
+    def embedding(entity_id, definition):
+        embedded.append(entity_id)
+        return {"embedding": [1.0, 0.0] if entity_id in ("a", "first") else [0.0, 1.0]} if definition else {}
+    mock_calculate_embedding.side_effect = embedding
+    chain_graph.allValues["a"] = {"definition": "node a"}
+    chain_graph.allValues["d"] = {"definition": "node d"}
+    objects = [{"name": "first", "definition": "x"}, {"name": "second", "definition": "y"}]
+
+    links = iter_search_all(chain_graph, objects, [], min_threshold=0)
+    assert next(links) == {"node": "a", "neighbors": ["b"]}
+    # The second object has not been embedded yet
+    assert "second" not in embedded
+    assert next(links) == {"node": "d", "neighbors": ["c"]}
+    assert next(links, None) is None
@@ -0,0 +1,59 @@
+from graph_patches import PatchLog, graph_patch, batch_patch
+from graph_store import GraphStore
+
+def test_graph_patch_shape():
+    patch = graph_patch(3, 4, added_nodes=[{"id": "1", "label": "Node 1"}], removed_edges=["e1"])
+    assert patch == {
+        "base_version": 3,
+        "version": 4,
+        "added": {"nodes": [{"id": "1", "label": "Node 1"}], "edges": []},
+        "updated": {"nodes": [], "edges": []},
+        "removed": {"nodes": [], "edges": ["e1"]},
+    }
+
+def test_since_replays_missing_patches():
+    log = PatchLog(maxlen=10)
+    for version in range(1, 5):
+        log.append(graph_patch(version, version + 1))
+
+    assert [p["version"] for p in log.since(2)] == [3, 4, 5]
+    assert log.since(5) == []
+    assert log.since(0) is None
+    assert log.since(9) is None
+
+def test_bounded_history_requires_snapshot():
+    log = PatchLog(maxlen=2)
+    for version in range(1, 5):
+        log.append(graph_patch(version, version + 1))
+
+    assert log.since(2) is None
+    assert [p["version"] for p in log.since(3)] == [4, 5]
+
+def test_gap_resets_history():
+    log = PatchLog()
+    log.append(graph_patch(1, 2))
+    log.append(graph_patch(5, 6))
+    assert len(log) == 1
+    assert log.since(1) is None
+
+def test_batch_patch_nets_out_transient_entities():
+    touched = {"nodes": {"1": True, "2": True, "3": False, "4": False}, "edges": {}, "allValues": {"2": True}}
+    nodes = {"1": {"id": "1", "label": "Renamed"}, "3": {"id": "3"}}
+    patch = batch_patch(4, 5, touched, nodes, {}, {})
+    assert patch["added"]["nodes"] == [{"id": "3"}]
+    assert patch["updated"]["nodes"] == [{"id": "1", "label": "Renamed"}]
+    assert patch["removed"]["nodes"] == ["2"]
+    assert patch["removed"]["allValues"] == ["2"]
+    assert "allValues" not in patch
+
+def test_batch_patch_sends_replaced_values_whole():
+    store = GraphStore()
+    base_version = store.load([{"id": "1", "label": "Node 1"}], [], {"1": {"kept": 1, "dropped": 2}})
+    # How an incremental Neo4j sync replaces the properties of an entity
+    version, touched = store.apply_batch([
+        {"op": "delete", "entity": "allValues", "id": "1"},
+        {"op": "create", "entity": "allValues", "id": "1", "data": {"kept": 3}},
+    ])
+    patch = batch_patch(base_version, version, touched, store.nodes, store.edges, store.all_values)
+    assert patch["allValues"] == {"1": {"kept": 3}}
+    assert "allValues" not in patch["removed"]
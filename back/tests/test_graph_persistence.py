@@ -0,0 +1,67 @@
+import asyncio
+import os
+import pytest
+from graph_records import NodeRecord, EdgeRecord
+from graph_persistence import GraphPersistence, GraphPersistenceError, read_snapshot, write_snapshot
+
+def sample_state(version=7):
+    nodes = [NodeRecord("a", "Äpfel"), NodeRecord("b", "b"), NodeRecord("", "empty id")]
+    edges = [EdgeRecord("a", "b", "likes", "e1"), EdgeRecord("b", "ghost", "dangling", "e2")]
+    return version, nodes, edges, {"a": {"definition": "fruit", "n": [1, 2]}, "e1": {"definition": "likes"}}
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "graph.snap")
+    assert read_snapshot(path) is None
+    write_snapshot(path, sample_state())
+    assert read_snapshot(path) == sample_state()
+
+def test_log_replays_entries_after_a_version_and_stops_at_a_torn_tail(tmp_path):
+    persistence = GraphPersistence(str(tmp_path))
+    persistence.open_log(3)
+    persistence.append(4, "add_node", [{"id": "c", "label": "c"}])
+    persistence.append(5, "delete_node", ["c"])
+    with open(persistence._log_path, "ab") as f:
+        f.write(b"\x10\x00\x00\x00partial")
+    assert list(persistence.read_log(3)) == [(4, "add_node", [{"id": "c", "label": "c"}]), (5, "delete_node", ["c"])]
+    assert list(persistence.read_log(4)) == [(5, "delete_node", ["c"])]
+
+def test_checkpoint_replaces_snapshot_and_older_logs(tmp_path):
+    persistence = GraphPersistence(str(tmp_path), snapshot_every=2)
+
+    async def scenario():
+        persistence.open_log(0)
+        persistence.append(1, "add_node", [{"id": "x", "label": "x"}])
+        assert not persistence.needs_checkpoint
+        persistence.append(2, "add_node", [{"id": "y", "label": "y"}])
+        assert persistence.needs_checkpoint
+        await persistence.checkpoint(sample_state(version=2))
+        persistence.append(3, "delete_node", ["b"])
+        await persistence.close()
+
+    asyncio.run(scenario())
+    assert sorted(os.listdir(tmp_path)) == ["graph.snap", "log-2.bin"]
+    assert persistence.read_snapshot()[0] == 2
+    assert list(persistence.read_log(2)) == [(3, "delete_node", ["b"])]
+
+def test_failed_append_needs_a_snapshot_before_more_logging(tmp_path):
+    persistence = GraphPersistence(str(tmp_path))
+
+    async def scenario():
+        persistence.open_log(0)
+        persistence.append(1, "add_node", [{"id": "x", "label": "x"}])
+        persistence._log.close()
+        with pytest.raises(ValueError):
+            persistence.append(2, "add_node", [{"id": "y", "label": "y"}])
+        assert persistence.log_damaged and persistence.needs_checkpoint
+
+        os.mkdir(persistence.snapshot_path)
+        with pytest.raises(GraphPersistenceError):
+            await persistence.checkpoint(sample_state(version=2))
+        assert persistence.log_damaged
+        os.rmdir(persistence.snapshot_path)
+        await persistence.checkpoint(sample_state(version=2))
+        await persistence.close()
+
+    asyncio.run(scenario())
+    assert not persistence.log_damaged
+    assert sorted(os.listdir(tmp_path)) == ["graph.snap", "log-2.bin"]
@@ -0,0 +1,35 @@
+import gc
+import pytest
+from graph_records import EdgeRecord, GraphPayloadError, NodeRecord, gc_paused, parse_graph_payload
+
+def test_parse_builds_interned_records():
+    payload = {
+        "nodes": [{"id": "n" + "1", "label": "Node", "x": 10}],
+        "edges": [{"source": "".join(["n", "1"]), "target": "n1", "label": "self", "id": "e1"}],
+        "allValues": {"n1": {"definition": "D"}},
+    }
+    nodes, edges, all_values = parse_graph_payload(payload)
+    assert nodes == [NodeRecord("n1", "Node")]
+    assert edges == [EdgeRecord("n1", "n1", "self", "e1")]
+    assert edges[0].source is nodes[0].id
+    assert all_values == {"n1": {"definition": "D"}}
+    assert edges[0].to_dict() == payload["edges"][0]
+
+def test_parse_reports_pydantic_style_errors():
+    with pytest.raises(GraphPayloadError) as excinfo:
+        parse_graph_payload({"nodes": [{"id": 1, "label": "x"}, "bad"], "edges": [{"id": "e"}]})
+    locs = [error["loc"] for error in excinfo.value.errors]
+    assert ["body", "nodes", 0, "id"] in locs
+    assert ["body", "nodes", 1] in locs
+    assert ["body", "edges", 0, "source"] in locs
+    assert ["body", "allValues"] in locs
+
+def test_overlapping_gc_pauses_enable_gc_after_the_last_one():
+    assert gc.isenabled()
+    first, second = gc_paused(), gc_paused()
+    first.__enter__()
+    second.__enter__()
+    first.__exit__(None, None, None)
+    assert not gc.isenabled()
+    second.__exit__(None, None, None)
+    assert gc.isenabled()
@@ -0,0 +1,105 @@
+import pytest
+from graph_store import GraphStore, DuplicateIdError, EntityNotFoundError, InvalidOperationError
+
+@pytest.fixture
+def store():
+    graph_store = GraphStore()
+    graph_store.load(
+        [{"id": "1", "label": "Node 1"}, {"id": "2", "label": "Node 2"}, {"id": "3", "label": "Node 3"}],
+        [{"source": "1", "target": "2", "label": "Edge 1", "id": "e1"},
+         {"source": "2", "target": "3", "label": "Edge 2", "id": "e2"}],
+        {"1": {"definition": "Definition 1"}}
+    )
+    return graph_store
+
+def test_load_and_to_dict(store):
+    graph = store.to_dict()
+    assert [n["id"] for n in graph["nodes"]] == ["1", "2", "3"]
+    assert [e["id"] for e in graph["edges"]] == ["e1", "e2"]
+    assert graph["allValues"] == {"1": {"definition": "Definition 1"}}
+    assert store.version == 1
+
+def test_delete_node_cascades_to_incident_edges(store):
+    version, removed = store.delete_node("2")
+    assert sorted(removed) == ["e1", "e2"]
+    assert store.edges == {}
+    assert store.incident == {}
+    assert version == 2
+
+def test_duplicate_ids_are_rejected(store):
+    with pytest.raises(DuplicateIdError):
+        store.add_node({"id": "1", "label": "Again"})
+    with pytest.raises(DuplicateIdError):
+        store.add_edge({"source": "1", "target": "3", "label": "Again", "id": "e2"})
+    with pytest.raises(DuplicateIdError):
+        store.update_node("1", {"id": "2", "label": "Clash"})
+    assert store.version == 1
+
+def test_missing_ids_raise(store):
+    with pytest.raises(EntityNotFoundError):
+        store.update_node("missing", {"id": "missing", "label": "x"})
+    with pytest.raises(EntityNotFoundError):
+        store.delete_edge("missing")
+
+def test_update_edge_moves_incidence_and_keeps_order(store):
+    store.update_edge("e1", {"source": "1", "target": "3", "label": "Moved", "id": "e1"})
+    assert [e.id for e in store.incident_edges("3")] in (["e1", "e2"], ["e2", "e1"])
+    assert "2" in store.incident and store.incident["2"] == {"e2"}
+    assert [e["id"] for e in store.to_dict()["edges"]] == ["e1", "e2"]
+
+def test_version_increases_on_every_mutation(store):
+    store.add_node({"id": "4", "label": "Node 4"})
+    store.add_edge({"source": "4", "target": "1", "label": "Edge 3", "id": "e3"})
+    store.delete_edge("e3")
+    assert store.version == 4
+
+def test_batch_is_atomic(store):
+    operations = [
+        {"op": "create", "entity": "node", "data": {"id": "4", "label": "Node 4"}},
+        {"op": "delete", "entity": "edge", "id": "missing"},
+    ]
+    with pytest.raises(EntityNotFoundError, match="Operation 1"):
+        store.apply_batch(operations)
+    assert "4" not in store.nodes
+    assert store.version == 1
+    with pytest.raises(InvalidOperationError):
+        store.apply_batch([{"op": "rename", "entity": "node", "id": "1"}])
+
+def test_batch_rejects_nodes_and_edges_without_their_fields(store):
+    with pytest.raises(InvalidOperationError, match="needs id, label"):
+        store.apply_batch([{"op": "create", "entity": "node", "data": {"label_": "x"}}])
+    with pytest.raises(InvalidOperationError, match="needs source, target"):
+        store.apply_batch([{"op": "create", "entity": "edge", "data": {"id": "e9", "label": "x", "colour": "red"}}])
+    assert "e9" not in store.edges
+    assert store.version == 1
+
+def test_batch_rejects_value_updates_that_can_not_merge(store):
+    store.apply_batch([{"op": "create", "entity": "allValues", "id": "list", "data": [1, 2]}])
+    with pytest.raises(InvalidOperationError, match="needs a dict"):
+        store.apply_batch([
+            {"op": "create", "entity": "node", "data": {"id": "9", "label": "Node 9"}},
+            {"op": "update", "entity": "allValues", "id": "list", "data": {"note": "x"}},
+        ])
+    with pytest.raises(InvalidOperationError, match="needs a dict"):
+        store.apply_batch([
+            {"op": "create", "entity": "allValues", "id": "9", "data": "text"},
+            {"op": "update", "entity": "allValues", "id": "9", "data": {"note": "x"}},
+        ])
+    assert "9" not in store.nodes and "9" not in store.all_values
+    assert store.all_values["list"] == [1, 2]
+
+def test_batch_bumps_version_once_and_reports_net_changes(store):
+    version, touched = store.apply_batch([
+        {"op": "create", "entity": "node", "data": {"id": "4", "label": "Node 4"}},
+        {"op": "create", "entity": "edge", "data": {"source": "4", "target": "1", "label": "Edge 3", "id": "e3"}},
+        {"op": "delete", "entity": "node", "id": "2"},
+        {"op": "update", "entity": "allValues", "id": "1", "data": {"note": "x"}},
+        {"op": "create", "entity": "node", "data": {"id": "5", "label": "Temporary"}},
+        {"op": "delete", "entity": "node", "id": "5"},
+    ])
+    assert version == 2
+    assert touched["nodes"] == {"4": False, "2": True, "5": False}
+    assert touched["edges"] == {"e3": False, "e1": True, "e2": True}
+    assert list(store.edges) == ["e3"]
+    assert store.all_values["1"] == {"definition": "Definition 1", "note": "x"}
+    assert "5" not in store.nodes
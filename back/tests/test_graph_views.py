@@ -0,0 +1,30 @@
+import pytest
+from graph_views import GraphViewCache, parse_graph_ref, graph_etag
+from graph_records import NodeRecord, EdgeRecord
+
+NODES = [NodeRecord("1", "Node 1"), NodeRecord("2", "Node 2")]
+EDGES = [EdgeRecord("1", "2", "Edge 1", "e1")]
+ALL_VALUES = {"1": {"definition": "Definition 1"}, "e1": {"note": "no definition"}}
+
+def test_parse_graph_ref():
+    assert parse_graph_ref(None) is None
+    assert parse_graph_ref("current") is None
+    assert parse_graph_ref("7") == (None, 7)
+    assert parse_graph_ref(graph_etag("a1b2", 7)) == ("a1b2", 7)
+    assert parse_graph_ref('W/"a1b2-7"') == ("a1b2", 7)
+    with pytest.raises(ValueError):
+        parse_graph_ref("latest")
+
+def test_view_is_built_once_per_version():
+    cache = GraphViewCache()
+    assert cache.cached("a", 1) is None
+    view = cache.build("a", 1, NODES, EDGES, ALL_VALUES)
+    assert cache.cached("a", 1) is view
+    assert cache.build("a", 1, [], [], {}) is view
+    assert view.etag == '"a-1"'
+    assert view.node_ids == {"1", "2"}
+    assert [edge.id for edge in view.adjacency.incident_edges("2")] == ["e1"]
+
+    assert cache.cached("a", 2) is None
+    assert cache.cached("b", 1) is None
+    assert cache.build("a", 2, NODES, [], ALL_VALUES) is not view
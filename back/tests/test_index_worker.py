@@ -0,0 +1,57 @@
+import asyncio
+from ann_index import GraphSearchIndex
+from index_worker import IndexWorker
+
+def embed(texts):
+    return [[1.0, float(len(text))] for text in texts]
+
+def test_drain_indexes_in_batches_and_reports_progress():
+    search_index = GraphSearchIndex()
+    search_index.reset({"1": "1: one", "2": "2: two"}, {"e1": "1-2: link"}, {"1": "1: one"})
+    reports, batches = [], []
+
+    async def embed_many(texts):
+        batches.append(len(texts))
+        return embed(texts)
+
+    async def on_progress(status):
+        reports.append(status)
+
+    worker = IndexWorker(search_index, embed_many, on_progress=on_progress, batch_size=3)
+    asyncio.run(worker.drain())
+
+    assert batches == [3, 1]
+    assert worker.complete and worker.state == "idle"
+    assert reports[-1]["pending"] == 0 and reports[-1]["indexed_nodes"] == 2
+    assert "1" in search_index.definitions
+
+def test_changes_made_while_embedding_win():
+    search_index = GraphSearchIndex()
+    search_index.reset({"1": "1: old"})
+    items = search_index.take_pending()
+    search_index.set_node("1", "1: new")
+    search_index.insert(items, embed([text for _, _, text in items]))
+    assert "1" not in search_index.nodes
+    assert search_index.pending_texts() == ["1: new"]
+
+def test_worker_wakes_on_graph_changes():
+    search_index = GraphSearchIndex()
+
+    async def embed_many(texts):
+        return embed(texts)
+
+    async def scenario():
+        worker = IndexWorker(search_index, embed_many)
+        search_index.on_pending = worker.notify
+        worker.start()
+        search_index.set_node("1", "1: one")
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if worker.complete:
+                break
+        await worker.stop()
+        return worker
+
+    worker = asyncio.run(scenario())
+    assert worker.complete
+    assert "1" in search_index.nodes
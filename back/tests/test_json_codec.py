@@ -0,0 +1,38 @@
+import json
+import datetime
+import pytest
+import json_codec
+from json_codec import VersionedCache, to_jsonable
+
+neo4j_time = pytest.importorskip("neo4j.time")
+neo4j_spatial = pytest.importorskip("neo4j.spatial")
+
+def test_neo4j_values_are_encoded():
+    value = {
+        "at": neo4j_time.DateTime(2020, 1, 2, 3, 4, 5),
+        "on": neo4j_time.Date(2020, 1, 2),
+        "for": neo4j_time.Duration(days=1, seconds=5),
+        "native": datetime.date(2020, 1, 2),
+    }
+    assert json.loads(json_codec.dumps(value)) == {
+        "at": "2020-01-02T03:04:05.000000000",
+        "on": "2020-01-02",
+        "for": "P1DT5S",
+        "native": "2020-01-02",
+    }
+
+def test_point_hook():
+    point = neo4j_spatial.CartesianPoint((1.0, 2.0))
+    assert to_jsonable(point) == {"srid": 7203, "x": 1.0, "y": 2.0}
+
+def test_stdlib_fallback_matches():
+    value = {"name": "café", "at": neo4j_time.Date(2020, 1, 2), "n": [1, 2.5, None]}
+    assert json.loads(json_codec._stdlib_dumps(value)) == json.loads(json_codec.dumps(value))
+
+def test_versioned_cache_rebuilds_only_on_new_version():
+    builds = []
+    cache = VersionedCache(lambda: builds.append(1) or len(builds))
+    assert cache.get(1) == 1
+    assert cache.get(1) == 1
+    assert cache.get(2) == 2
+    assert len(builds) == 2
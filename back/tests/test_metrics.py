@@ -0,0 +1,46 @@
+import pytest
+from metrics import MetricsRegistry, Gauge
+
+def test_render_counters_and_labels():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("path",))
+    requests.inc(path="/a")
+    requests.inc(2, path='/"b"')
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{path="/a"} 1' in text
+    assert 'requests_total{path="/\\"b\\""} 2' in text
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value)
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_sum 4.25" in lines
+    assert "latency_seconds_count 4" in lines
+
+def test_collectors_run_at_scrape_time():
+    registry = MetricsRegistry()
+    size = {"value": 1}
+
+    @registry.collector
+    def collect():
+        gauge = Gauge("graph_size", "Size")
+        gauge.set(size["value"])
+        return [gauge]
+
+    size["value"] = 7
+    assert "graph_size 7" in registry.render()
+
+def test_labels_and_registration_are_checked():
+    registry = MetricsRegistry()
+    counter = registry.counter("events_total", "Events", ("kind",))
+    assert registry.counter("events_total", "Events", ("kind",)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "Events", ("kind",))
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from connectors import neo4j as connector
+
+NODE_RECORDS = [
+    {"element_id": "4:x:0", "node_id": "a", "name": "Alpha", "labels": ["Thing"], "properties": {"uuid": "a", "name": "Alpha"}},
+    {"element_id": "4:x:1", "node_id": None, "name": "", "labels": ["Thing"], "properties": {}},
+    {"element_id": "4:x:2", "node_id": "c", "name": None, "labels": [], "properties": {"uuid": "c"}},
+]
+RELATIONSHIP_RECORDS = [
+    {"element_id": "5:x:0", "type": "KNOWS", "properties": {"since": 2020}, "source": "a", "target": "4:x:1"},
+]
+
+class FakeResult:
+    def __init__(self, records):
+        self._records = records
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for record in self._records:
+            await asyncio.sleep(0)
+            yield record
+
+class FakeSession:
+    def __init__(self, driver, fetch_size):
+        self.driver = driver
+        self.fetch_size = fetch_size
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, **parameters):
+        self.driver.queries.append((query, parameters, self.fetch_size))
+        return FakeResult(NODE_RECORDS if query is connector.NODES_QUERY else RELATIONSHIP_RECORDS)
+
+class FakeDriver:
+    def __init__(self):
+        self.queries = []
+
+    def session(self, fetch_size=None):
+        return FakeSession(self, fetch_size)
+
+@pytest.fixture
+def driver(monkeypatch):
+    fake = FakeDriver()
+    monkeypatch.setattr(connector, "_driver", fake)
+    return fake
+
+def test_stream_nodes_in_chunks(driver):
+    async def collect():
+        return [chunk async for chunk in connector.stream_nodes(chunk_size=2)]
+
+    chunks = asyncio.run(collect())
+    assert [len(nodes) for nodes, _ in chunks] == [2, 1]
+    assert driver.queries[0][2] == 2
+    nodes = [node for chunk_nodes, _ in chunks for node in chunk_nodes]
+    assert nodes == [
+        {"id": "a", "label": "Alpha"},
+        {"id": "4:x:1", "label": "Thing"},
+        {"id": "c", "label": "DefaultNodeLabel"},
+    ]
+
+def test_get_graph_reads_nodes_and_relationships(driver):
+    (nodes, node_values), (edges, edge_values) = asyncio.run(connector.get_graph_async())
+    assert len(nodes) == 3
+    assert node_values["a"] == {"uuid": "a", "name": "Alpha"}
+    assert edges == [{"id": "5:x:0", "source": "a", "target": "4:x:1", "label": "KNOWS"}]
+    assert edge_values == {"5:x:0": {"since": 2020}}
+    assert {parameters["id_property"] for _, parameters, _ in driver.queries} == {connector.NEO4J_ID_PROPERTY}
+
+def test_incremental_sync_reports_changed_and_removed(driver, monkeypatch):
+    (nodes, node_values), (edges, edge_values) = asyncio.run(connector.get_graph_async())
+    sync = connector.IncrementalSync(updated_at_property="")
+    sync.seed(nodes, edges, {**node_values, **edge_values})
+
+    changed_nodes = [dict(NODE_RECORDS[0], name="Renamed"), NODE_RECORDS[2]]
+    monkeypatch.setitem(globals(), "NODE_RECORDS", changed_nodes)
+    delta = asyncio.run(sync.changes())
+    assert delta["nodes"]["items"] == [{"id": "a", "label": "Renamed"}]
+    assert delta["nodes"]["removed"] == ["4:x:1"]
+    assert delta["edges"]["items"] == [] and delta["edges"]["removed"] == []
+
+    sync.commit(delta)
+    assert set(sync.hashes["nodes"]) == {"a", "c"}
+    again = asyncio.run(sync.changes())
+    assert again["nodes"]["items"] == [] and again["nodes"]["removed"] == []
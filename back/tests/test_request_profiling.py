@@ -0,0 +1,65 @@
+import json
+import os
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import request_profiling
+from request_profiling import RequestProfiler, annotate
+
+def make_client(directory, **options):
+    app = FastAPI()
+
+    @app.get("/work")
+    def work(delay: float = 0):
+        annotate(objects=3)
+        time.sleep(delay)
+        return {"ok": True}
+
+    app.add_middleware(RequestProfiler, directory=str(directory), **options)
+    return TestClient(app)
+
+def captures(directory):
+    if not os.path.exists(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+
+def test_requests_are_not_captured_unless_triggered(tmp_path):
+    client = make_client(tmp_path, allow_header=True)
+    response = client.get("/work")
+    assert "x-profile-id" not in response.headers
+    assert captures(tmp_path) == []
+
+def test_header_profiles_request_with_metadata(tmp_path):
+    client = make_client(tmp_path, allow_header=True, profiler="sample")
+    response = client.get("/work", params={"delay": 0.05}, headers={"X-Profile": "1"})
+    capture_id = response.headers["x-profile-id"]
+    with open(tmp_path / f"{capture_id}.json") as f:
+        metadata = json.load(f)
+    assert metadata["trigger"] == "header"
+    assert metadata["status"] == 200 and metadata["path"] == "/work"
+    assert metadata["request"] == {"objects": 3}
+    assert os.path.exists(tmp_path / metadata["profile"])
+
+def test_header_is_ignored_unless_allowed(tmp_path):
+    client = make_client(tmp_path)
+    assert "x-profile-id" not in client.get("/work", headers={"X-Profile": "1"}).headers
+
+def test_slow_request_is_recorded_and_profiles_the_next_one(tmp_path, monkeypatch):
+    reads = []
+    monkeypatch.setattr(request_profiling, "_counters", [lambda: reads.append(1) or {}])
+    client = make_client(tmp_path, slow_seconds=0.02, profiler="cprofile")
+    client.get("/work", params={"delay": 0.03})
+    [slow] = captures(tmp_path)
+    with open(tmp_path / slow) as f:
+        metadata = json.load(f)
+    assert (metadata["trigger"], metadata["status"], metadata["counters"]) == ("slow", 200, None)
+    # Requests that are not profiled never read the counters
+    assert reads == []
+    response = client.get("/work")
+    assert os.path.exists(tmp_path / f"{response.headers['x-profile-id']}.prof")
+    assert "x-profile-id" not in client.get("/work").headers
+
+def test_old_captures_are_rotated(tmp_path):
+    client = make_client(tmp_path, allow_header=True, max_captures=2)
+    ids = [client.get("/work", headers={"X-Profile": "1"}).headers["x-profile-id"] for _ in range(3)]
+    assert captures(tmp_path) == [f"{capture_id}.json" for capture_id in ids[1:]]
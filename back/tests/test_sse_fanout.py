@@ -0,0 +1,69 @@
+import asyncio
+from models import SseMessage
+from sse_fanout import SseBroadcaster, SseSubscriber, encode_sse
+
+def snapshot():
+    return SseMessage(data="snapshot", event="graph_update", id="9")
+
+def drain(subscriber):
+    async def collect():
+        events = []
+        while len(subscriber):
+            events.append(await subscriber.__anext__())
+        return events
+    return asyncio.run(collect())
+
+def test_encode_sse():
+    assert encode_sse(SseMessage(data="{}", event="graph_patch", id="3")) == b"id: 3\nevent: graph_patch\ndata: {}\n\n"
+    assert encode_sse(SseMessage(data="{}", event="highlight_update")) == b"event: highlight_update\ndata: {}\n\n"
+
+def test_publish_shares_encoded_bytes():
+    broadcaster = SseBroadcaster(snapshot)
+    first, second = broadcaster.subscribe(), broadcaster.subscribe()
+    broadcaster.publish(SseMessage(data="h", event="highlight_update"))
+    assert drain(first)[0] is drain(second)[0]
+
+def test_graph_update_supersedes_queued_graph_events():
+    subscriber = SseSubscriber(snapshot)
+    subscriber.push("graph_update", b"u1")
+    subscriber.push("highlight_update", b"h1")
+    subscriber.push("graph_patch", b"p1")
+    subscriber.push("graph_update", b"u2")
+    subscriber.push("highlight_update", b"h2")
+    assert drain(subscriber) == [b"h1", b"u2", b"h2"]
+    assert subscriber.dropped == 2
+
+def test_overflow_collapses_into_one_snapshot():
+    subscriber = SseSubscriber(snapshot, buffer_size=3, lag_budget=10)
+    for i in range(5):
+        subscriber.push("graph_patch", f"p{i}".encode())
+    subscriber.push("highlight_update", b"h")
+    assert drain(subscriber) == [b"h", encode_sse(snapshot())]
+    assert subscriber.resyncs == 1
+
+def test_client_over_lag_budget_is_disconnected():
+    broadcaster = SseBroadcaster(snapshot)
+    subscriber = broadcaster.subscribe()
+    subscriber.buffer_size, subscriber.lag_budget = 2, 3
+    for i in range(5):
+        broadcaster.publish(SseMessage(data=str(i), event="highlight_update"))
+    assert subscriber.closed
+    assert broadcaster.subscribers == []
+
+def test_only_latest_index_progress_is_kept():
+    subscriber = SseSubscriber(snapshot)
+    subscriber.push("index_progress", b"i1")
+    subscriber.push("graph_patch", b"p1")
+    subscriber.push("index_progress", b"i2")
+    assert drain(subscriber) == [b"p1", b"i2"]
+
+def test_metrics_report_queue_depth_and_drops_of_gone_clients():
+    broadcaster = SseBroadcaster(snapshot)
+    first, second = broadcaster.subscribe(), broadcaster.subscribe()
+    broadcaster.publish(SseMessage(data="p", event="graph_patch"))
+    broadcaster.publish(SseMessage(data="u", event="graph_update"))
+    broadcaster.unsubscribe(first)
+    metrics = {metric.name: metric.samples() for metric in broadcaster.metrics()}
+    assert metrics["sse_clients"] == [("sse_clients", {}, 1)]
+    assert metrics["sse_client_queue_depth"] == [("sse_client_queue_depth", {"client": str(second.client_id)}, 1)]
+    assert metrics["sse_dropped_messages_total"] == [("sse_dropped_messages_total", {}, 2)]
@@ -0,0 +1,41 @@
+from adjacency import Adjacency
+from graph_records import NodeRecord, EdgeRecord
+from subgraph import k_hop_subgraph
+
+def make_graph():
+    # hub "h" with spokes a..d, a chain a - x - y, and a "person" node p on d
+    nodes = {node_id: NodeRecord(node_id, "person" if node_id == "p" else "thing") for node_id in ["h", "a", "b", "c", "d", "x", "y", "p"]}
+    edges = [EdgeRecord("h", spoke, "spoke", f"h{spoke}") for spoke in "abcd"]
+    edges += [EdgeRecord("a", "x", "link", "ax"), EdgeRecord("x", "y", "link", "xy"), EdgeRecord("d", "p", "owner", "dp")]
+    return Adjacency(edges), nodes
+
+def ids(records):
+    return [record.id for record in records]
+
+def test_depth_limits_hops():
+    adjacency, nodes = make_graph()
+    result = k_hop_subgraph(adjacency, nodes, ["a"], depth=2)
+    assert result["depths"] == {"a": 0, "h": 1, "x": 1, "b": 2, "c": 2, "d": 2, "y": 2}
+    assert ids(result["edges"]) == ["ha", "ax", "hb", "hc", "hd", "xy"]
+    assert not result["truncated"]
+    assert k_hop_subgraph(adjacency, nodes, ["a"], depth=0)["depths"] == {"a": 0}
+
+def test_seed_edges_and_missing_ids():
+    adjacency, nodes = make_graph()
+    result = k_hop_subgraph(adjacency, nodes, ["nope"], ["xy", "gone"], depth=0)
+    assert ids(result["nodes"]) == ["x", "y"] and ids(result["edges"]) == ["xy"]
+    assert result["missing"] == ["nope", "gone"]
+
+def test_fanout_and_size_limits_truncate():
+    adjacency, nodes = make_graph()
+    result = k_hop_subgraph(adjacency, nodes, ["h"], depth=1, max_fanout=2)
+    assert ids(result["nodes"]) == ["h", "a", "b"] and result["truncated"]
+    result = k_hop_subgraph(adjacency, nodes, ["h"], depth=3, max_nodes=4)
+    assert len(result["nodes"]) == 4 and result["truncated"]
+
+def test_label_filters():
+    adjacency, nodes = make_graph()
+    result = k_hop_subgraph(adjacency, nodes, ["a"], depth=3, edge_labels={"spoke", "owner"})
+    assert ids(result["nodes"]) == ["a", "h", "b", "c", "d", "p"]
+    result = k_hop_subgraph(adjacency, nodes, ["h"], depth=3, node_labels={"thing"})
+    assert "p" not in result["depths"] and "y" in result["depths"]
@@ -0,0 +1,68 @@
+import tracemalloc
+import numpy as np
+import pytest
+from vector_store import QuantizedVectors
+from ann_index import IVFIndex
+
+def random_vectors(count, dim=32, seed=1):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 1e-6), ("float16", 1e-2), ("int8", 2e-2)])
+def test_scores_close_to_full_precision(dtype, tolerance):
+    vectors = random_vectors(100)
+    store = QuantizedVectors(32, dtype)
+    for row, vector in enumerate(vectors):
+        if row == store.capacity:
+            store.grow()
+        store.set(row, vector)
+    query = random_vectors(1, seed=2)[0]
+    rows = np.arange(100)
+    assert np.allclose(store.scores(rows, query), vectors @ query, atol=tolerance)
+    assert np.allclose(store.dequantize(rows), vectors, atol=tolerance)
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_scores_sparse_and_dense_rows(dtype):
+    vectors = random_vectors(100)
+    store = QuantizedVectors(32, dtype, capacity=128)
+    for row, vector in enumerate(vectors):
+        store.set(row, vector)
+    query = random_vectors(1, seed=2)[0]
+    for rows in (np.array([90, 3, 41]), np.delete(np.arange(100), [7, 50])):
+        assert np.allclose(store.scores(rows, query), vectors[rows] @ query, atol=2e-2)
+
+def test_exact_scan_does_not_copy_the_rows():
+    store = QuantizedVectors(256, "float32", capacity=20000)
+    store.rows[:] = 1
+    rows = np.delete(np.arange(20000), [5, 500])
+    query = np.ones(256, dtype=np.float32)
+    tracemalloc.start()
+    try:
+        scores = store.scores(rows, query)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert np.all(scores == 256)
+    # A gathered copy of the candidates would take about store.nbytes
+    assert peak < store.nbytes / 10
+
+def test_int8_takes_a_quarter_of_the_memory():
+    assert QuantizedVectors(768, "int8", capacity=1000).nbytes == 1000 * (768 + 4)
+    assert QuantizedVectors(768, "float32", capacity=1000).nbytes == 1000 * 768 * 4
+    with pytest.raises(ValueError):
+        QuantizedVectors(768, "float8")
+
+def test_quantized_index_reranks_with_full_precision():
+    vectors = {str(i): vector for i, vector in enumerate(random_vectors(500))}
+    exact = IVFIndex(dtype="float32")
+    quantized = IVFIndex(dtype="int8", rerank_factor=4, full_precision=vectors.get)
+    for entity_id, vector in vectors.items():
+        exact.add(entity_id, vector)
+        quantized.add(entity_id, vector)
+    assert quantized.nbytes < exact.nbytes / 3
+
+    query = random_vectors(1, seed=3)[0]
+    expected = exact.top_k(query, 5, -1)
+    found = quantized.top_k(query, 5, -1)
+    assert [m[0] for m in found] == [m[0] for m in expected]
+    assert [m[1] for m in found] == pytest.approx([m[1] for m in expected], abs=1e-6)
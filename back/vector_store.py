@@ -0,0 +1,113 @@
+import os
+import numpy as np
+from typing import Optional, Sequence
+
+# --- Configuration ---
+# Precision the search indexes keep their vectors in: "float32", "float16"
+# (half the memory) or "int8" (a quarter, plus a float32 scale per vector).
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float32")
+# With a lossy dtype, queries re-score this many times k of the best quantized
+# candidates with full-precision vectors (when the index has a source for
+# them); 0 returns the quantized scores as they are.
+EMBEDDING_RERANK_FACTOR = int(os.getenv("EMBEDDING_RERANK_FACTOR", "4"))
+
+DTYPES = ("float32", "float16", "int8")
+# Rows converted to float32 at a time while scoring quantized vectors
+SCORE_CHUNK_ROWS = 65536
+
+
+class QuantizedVectors:
+    """Growable array of embedding rows stored as float32, float16 or int8.
+
+    int8 rows are scaled per vector (``row * scale`` restores the vector), so
+    a 768-dim embedding takes 772 bytes instead of 3 KB. ``scores`` computes
+    dot products straight from the stored rows, a chunk at a time, without
+    materializing a float32 copy of the whole array.
+    """
+
+    def __init__(self, dim: int, dtype: str = EMBEDDING_STORE_DTYPE, capacity: int = 16):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown embedding store dtype {dtype!r}; expected one of {DTYPES}")
+        self.dim = dim
+        self.dtype = dtype
+        self.rows = np.empty((capacity, dim), dtype=np.dtype(dtype))
+        self.scales = np.ones(capacity, dtype=np.float32) if dtype == "int8" else None
+
+    @property
+    def lossy(self) -> bool:
+        return self.dtype != "float32"
+
+    @property
+    def capacity(self) -> int:
+        return self.rows.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def grow(self):
+        """Double the capacity."""
+        self.rows = np.concatenate([self.rows, np.empty_like(self.rows)])
+        if self.scales is not None:
+            self.scales = np.concatenate([self.scales, np.ones_like(self.scales)])
+
+    def set(self, row: int, vector: Sequence[float]):
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.scales is None:
+            self.rows[row] = vector
+            return
+        peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = peak / 127 if peak else 1.0
+        self.rows[row] = np.round(vector / scale)
+        self.scales[row] = scale
+
+    def take(self, rows: np.ndarray) -> "QuantizedVectors":
+        """A compact copy holding just the given rows, in that order."""
+        taken = QuantizedVectors(self.dim, self.dtype, capacity=0)
+        taken.rows = np.array(self.rows[rows])
+        if self.scales is not None:
+            taken.scales = np.array(self.scales[rows])
+        return taken
+
+    def dequantize(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """The stored vectors of rows (all rows by default) as float32."""
+        if rows is None:
+            rows = slice(None)
+        vectors = self.rows[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows][:, None]
+        return vectors
+
+    def scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Dot products of the given rows with a float32 query.
+
+        When the rows cover most of the array (an exact scan) the leading rows
+        are scored in place and the wanted scores picked afterwards, instead of
+        gathering a copy of every candidate row first.
+        """
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.float32)
+        span = int(rows.max()) + 1
+        if len(rows) * 2 >= span:
+            return self._leading_scores(span, query)[rows]
+        if self.dtype == "float32":
+            return self.rows[rows] @ query
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_CHUNK_ROWS):
+            chunk = rows[start:start + SCORE_CHUNK_ROWS]
+            scores[start:start + len(chunk)] = self.rows[chunk].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales[rows]
+        return scores
+
+    def _leading_scores(self, count: int, query: np.ndarray) -> np.ndarray:
+        """Dot products of the first count rows, scored from views of the array."""
+        if self.dtype == "float32":
+            return self.rows[:count] @ query
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_CHUNK_ROWS):
+            stop = min(start + SCORE_CHUNK_ROWS, count)
+            scores[start:stop] = self.rows[start:stop].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales[:count]
+        return scores
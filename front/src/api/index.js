@@ -16,6 +16,15 @@ export const syncNeo4j = () => {
   return apiClient.post('/sync-neo4j');
 };
 
+/**
+ * Fetches the graph currently held by the backend.
+ * The X-Graph-Version response header identifies the snapshot's version.
+ * @returns {Promise} A promise that resolves with the server graph.
+ */
+export const getGraph = () => {
+  return apiClient.get('/graph');
+};
+
 /**
  * Performs a semantic search for a single most relevant node.
  * @param {Object} graph_data - The current graph data from the frontend.
@@ -11,7 +11,8 @@ import {
 } from '@/effects';
 import findByEmbeddingEffect from '@/effects/findByEmbedding';
 import findAllEffect from '@/effects/findAll';
-import { initializeGraph, highlightGraphElements, clearPreviousHighlights } from '@/utils/graphUtil';
+import { initializeGraph, highlightGraphElements, clearPreviousHighlights, applyGraphPatch } from '@/utils/graphUtil';
+import { getGraph } from '@/api';
 import {
   API_BASE_URL,
   HIGHLIGHT_STYLE,
@@ -26,6 +27,7 @@ export function App() {
   const graphRef = useRef(null);
   const graphDataRef = useRef({ nodes: [], edges: [] });
   const allValuesRef = useRef({});
+  const graphVersionRef = useRef(null);
   const highlitedRef = useRef({ nodes: [], edges: [] });
 
   const [selectedElementValues, setSelectedElementValues] = useState({});
@@ -43,10 +45,10 @@ export function App() {
       // Default message handler
     };
 
-    eventSource.addEventListener('graph_update', (event) => {
-      const parsedData = JSON.parse(event.data);
-      graphDataRef.current = { nodes: parsedData.nodes, edges: parsedData.edges };
-      allValuesRef.current = parsedData.allValues;
+    const applySnapshot = (snapshot, version) => {
+      graphDataRef.current = { nodes: snapshot.nodes, edges: snapshot.edges };
+      allValuesRef.current = snapshot.allValues;
+      graphVersionRef.current = version;
 
       if (graphRef.current) {
         // Using initializeGraph instead of changeData forces a full re-layout,
@@ -54,6 +56,62 @@ export function App() {
         // The final 'true' argument ensures the GForce layout is applied.
         initializeGraph(graphRef.current, graphDataRef.current, null, true);
       }
+    };
+
+    const resync = async () => {
+      try {
+        const response = await getGraph();
+        const version = Number(response.headers['x-graph-version']);
+        // Patches handled while it was in flight may already be ahead of it
+        if (graphVersionRef.current !== null && version < graphVersionRef.current) {
+          return;
+        }
+        applySnapshot(response.data, version);
+      } catch (error) {
+        console.error('Failed to resync graph after a missed patch:', error);
+      }
+    };
+
+    // Graph events are handled one at a time, resyncs included, so a snapshot
+    // fetched for one patch can not land on top of later ones.
+    let graphEvents = Promise.resolve();
+    const handleInOrder = (handler) => {
+      graphEvents = graphEvents.then(handler).catch(error => console.error('Failed to apply a graph event:', error));
+    };
+
+    eventSource.addEventListener('graph_update', (event) => {
+      handleInOrder(() => {
+        const parsedData = JSON.parse(event.data);
+        applySnapshot(parsedData, parsedData.version ?? null);
+      });
+    });
+
+    eventSource.addEventListener('graph_patch', (event) => {
+      handleInOrder(async () => {
+        const patch = JSON.parse(event.data);
+        if (graphVersionRef.current !== null && patch.version <= graphVersionRef.current) {
+          // Already part of the snapshot a resync fetched
+          return;
+        }
+
+        const updated = graphVersionRef.current === patch.base_version
+          ? applyGraphPatch(graphDataRef.current, allValuesRef.current, patch)
+          : null;
+        if (updated === null) {
+          // We missed an update (or never had the server graph), or the patch
+          // does not fit what we have: resync from a snapshot.
+          await resync();
+          return;
+        }
+        graphDataRef.current = { nodes: updated.nodes, edges: updated.edges };
+        allValuesRef.current = updated.allValues;
+        graphVersionRef.current = patch.version;
+
+        if (graphRef.current) {
+          // Keep the existing layout; only the patched items changed.
+          initializeGraph(graphRef.current, graphDataRef.current, null, false);
+        }
+      });
     });
 
     eventSource.addEventListener('highlight_update', (event) => {
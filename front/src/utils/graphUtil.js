@@ -334,3 +334,53 @@ export function applyGraphChanges(currentGraphData, currentAllValues, changes) {
     allValues: newAllValues,
   };
 }
+
+/**
+ * Applies a server graph_patch event the way the server applied the mutations
+ * (GraphStore), so that a client at the patch's base version ends up at its version.
+ *
+ * Only the listed ids are removed: deleting a node does not drop its edges
+ * (the server lists those in removed.edges) nor its allValues (listed in
+ * removed.allValues when they were deleted). allValues entries in the patch
+ * are complete and replace the client's entry.
+ *
+ * @param {Object} currentGraphData - The current graph data {nodes, edges}.
+ * @param {Object} currentAllValues - The current allValues object.
+ * @param {Object} patch - The graph_patch payload.
+ * @returns {Object|null} The new {nodes, edges, allValues}, or null when the
+ *   patch does not fit the current graph (e.g. an edge to an unknown node)
+ *   and the client should resync from a snapshot instead.
+ */
+export function applyGraphPatch(currentGraphData, currentAllValues, patch) {
+  const removedNodes = new Set(patch.removed.nodes || []);
+  const removedEdges = new Set(patch.removed.edges || []);
+  const nodeMap = new Map((currentGraphData.nodes || [])
+    .filter(node => !removedNodes.has(node.id))
+    .map(node => [node.id, node]));
+  const edgeMap = new Map((currentGraphData.edges || [])
+    .filter(edge => !removedEdges.has(edge.id))
+    .map(edge => [edge.id, edge]));
+
+  [...(patch.added.nodes || []), ...(patch.updated.nodes || [])].forEach(node => {
+    nodeMap.set(node.id, { ...nodeMap.get(node.id), ...node });
+  });
+  for (const edge of [...(patch.added.edges || []), ...(patch.updated.edges || [])]) {
+    if (!nodeMap.has(edge.source) || !nodeMap.has(edge.target)) {
+      console.warn(`Edge "${edge.id}" of patch ${patch.version} joins nodes this client does not have; resyncing.`);
+      return null;
+    }
+    edgeMap.set(edge.id, { ...edgeMap.get(edge.id), ...edge });
+  }
+
+  const newAllValues = { ...(currentAllValues || {}) };
+  (patch.removed.allValues || []).forEach(entityId => delete newAllValues[entityId]);
+  for (const entityId in (patch.allValues || {})) {
+    newAllValues[entityId] = JSON.parse(JSON.stringify(patch.allValues[entityId]));
+  }
+
+  return {
+    nodes: Array.from(nodeMap.values()),
+    edges: Array.from(edgeMap.values()),
+    allValues: newAllValues,
+  };
+}
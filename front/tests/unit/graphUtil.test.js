@@ -1,4 +1,4 @@
-import { generateRandomGraph, initializeGraph, applyGraphChanges } from '../../src/utils/graphUtil';
+import { generateRandomGraph, initializeGraph, applyGraphChanges, applyGraphPatch } from '../../src/utils/graphUtil';
 import G6 from '@antv/g6';
 import { GRAPH_LAYOUT_OPTIONS, GRAPH_LAYOUT_OPTIONS_NO_GFORCE } from '../../src/constants/appConstants';
 
@@ -224,4 +224,63 @@ describe('graphUtil', () => {
       );
     });
   });
+
+  describe('applyGraphPatch', () => {
+    const graphData = {
+      nodes: [{ id: 'node1', label: 'Node 1' }, { id: 'node2', label: 'Node 2' }],
+      edges: [{ id: 'edge1', source: 'node1', target: 'node2', label: 'Edge 1' }],
+    };
+    const allValues = {
+      node1: { key1: 'value1', key2: 'value2' },
+      node2: { key1: 'value1' },
+    };
+    const patch = (changes) => ({
+      base_version: 1,
+      version: 2,
+      added: { nodes: [], edges: [] },
+      updated: { nodes: [], edges: [] },
+      removed: { nodes: [], edges: [] },
+      ...changes,
+    });
+
+    test('replaces allValues entries instead of merging them', () => {
+      const result = applyGraphPatch(graphData, allValues, patch({ allValues: { node1: { key2: 'new' } } }));
+      expect(result.allValues.node1).toEqual({ key2: 'new' });
+      expect(result.allValues.node2).toEqual({ key1: 'value1' });
+    });
+
+    test('removes only the listed ids', () => {
+      const result = applyGraphPatch(graphData, allValues, patch({
+        removed: { nodes: ['node2'], edges: ['edge1'] },
+      }));
+      expect(result.nodes.map(node => node.id)).toEqual(['node1']);
+      expect(result.edges).toHaveLength(0);
+      // Values are only dropped when the patch says so
+      expect(result.allValues.node2).toEqual({ key1: 'value1' });
+
+      const withValues = applyGraphPatch(graphData, allValues, patch({
+        removed: { nodes: ['node2'], edges: ['edge1'], allValues: ['node2'] },
+      }));
+      expect(withValues.allValues.node2).toBeUndefined();
+    });
+
+    test('adds and updates nodes and edges', () => {
+      const result = applyGraphPatch(graphData, allValues, patch({
+        added: { nodes: [{ id: 'node3', label: 'Node 3' }], edges: [{ id: 'edge2', source: 'node1', target: 'node3' }] },
+        updated: { nodes: [{ id: 'node1', label: 'Renamed' }], edges: [] },
+      }));
+      expect(result.nodes).toContainEqual({ id: 'node1', label: 'Renamed' });
+      expect(result.nodes).toContainEqual({ id: 'node3', label: 'Node 3' });
+      expect(result.edges).toContainEqual({ id: 'edge2', source: 'node1', target: 'node3' });
+    });
+
+    test('returns null for an edge to a node the client does not have', () => {
+      console.warn = jest.fn();
+      const result = applyGraphPatch(graphData, allValues, patch({
+        added: { nodes: [], edges: [{ id: 'edge2', source: 'node1', target: 'node99' }] },
+      }));
+      expect(result).toBeNull();
+      expect(console.warn).toHaveBeenCalled();
+    });
+  });
 });
\ No newline at end of file